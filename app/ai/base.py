@@ -0,0 +1,217 @@
+import logging
+from types import SimpleNamespace
+
+from app.ai.llm_client import current_task, get_async_llm_client, get_llm_client
+from app.ai.model_router import model_router
+from app.ai.output_parser import OutputParseError, build_repair_request, merge_repair
+from app.ai import resilience, telemetry
+from app.ai.scheduler import estimate_request_tokens, llm_scheduler
+from app.ai.response_cache import make_cache_key, response_cache
+from app.config import settings
+from app.utils.metrics import metrics
+
+DEFAULT_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_output_repairs_total", "Targeted repair calls for malformed LLM output, by task and result")
+
+
+def _cached_response(content: str):
+    """Wrap cached completion text in the same shape as a chat completion response."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _failed_generation(exc: Exception) -> str | None:
+    """Text the model produced when JSON mode rejected it (Groq `json_validate_failed` errors)."""
+    body = getattr(exc, "body", None)
+    if isinstance(body, dict):
+        error = body.get("error", body)
+        if isinstance(error, dict) and error.get("code") == "json_validate_failed":
+            return error.get("failed_generation") or None
+    return None
+
+
+class LLMAssistant:
+    """Common plumbing for the LLM-backed assistants in `app/ai/`.
+
+    Subclasses build their request kwargs and parse the reply; every chat completion goes
+    through `_create` (sync) or `_acreate` (async) so shared behaviour lives in one place,
+    including the deadline/retry/circuit-breaker policy from `app/ai/resilience.py`.
+    Both clients default to the process-wide pooled instances and can be injected for tests.
+    """
+
+    # Task name used for per-task configuration (e.g. "diet", "exercise_detect")
+    task = ""
+    # Pydantic model the reply must match (app/schemas/llm_schema.py). When set, requests use
+    # JSON mode and output that fails to parse gets a targeted repair call.
+    output_schema = None
+
+    def __init__(self, client=None, async_client=None):
+        self.client = client or get_llm_client()
+        self.async_client = async_client or get_async_llm_client()
+        self.model_name = DEFAULT_MODEL
+
+    # Each attempt waits for a scheduler slot (app/ai/scheduler.py) inside the resilience
+    # deadline; queue time is taken off the request timeout. Streams release their slot once
+    # the response has started. Every call is timed and its usage recorded (app/ai/telemetry.py).
+    # The model (and max_tokens, except for repair calls) comes from the task's route in
+    # app/ai/model_router.py, which learns from the latencies telemetry records. `routed=True`
+    # means the caller already routed the request (see `_run`).
+
+    def _create(self, keep_max_tokens: bool = False, routed: bool = False, **kwargs):
+        if not routed:
+            kwargs = model_router.route(self.task, kwargs, keep_max_tokens)
+        model = kwargs.get("model") or self.model_name
+        tokens = estimate_request_tokens(kwargs)
+
+        def attempt(timeout):
+            with llm_scheduler.slot(model, self.task, tokens, timeout) as waited:
+                return self.client.chat.completions.create(**kwargs, timeout=max(0.0, timeout - waited))
+
+        record = telemetry.start(self.task, model)
+        task_token = current_task.set(self.task)
+        try:
+            response = resilience.call(attempt, self.task, resilience.breakers.get(model))
+        except Exception as e:
+            telemetry.failed(record, e)
+            raise
+        finally:
+            current_task.reset(task_token)
+        if kwargs.get("stream"):
+            return telemetry.wrap_stream(record, response)
+        telemetry.succeeded(record, response)
+        return response
+
+    async def _acreate(self, keep_max_tokens: bool = False, routed: bool = False, **kwargs):
+        if not routed:
+            kwargs = model_router.route(self.task, kwargs, keep_max_tokens)
+        model = kwargs.get("model") or self.model_name
+        tokens = estimate_request_tokens(kwargs)
+
+        async def attempt(timeout):
+            async with llm_scheduler.aslot(model, self.task, tokens, timeout) as waited:
+                return await self.async_client.chat.completions.create(**kwargs, timeout=max(0.0, timeout - waited))
+
+        record = telemetry.start(self.task, model)
+        task_token = current_task.set(self.task)
+        try:
+            response = await resilience.acall(
+                attempt, self.task, resilience.breakers.get(model), hedge=not kwargs.get("stream"),
+            )
+        except Exception as e:
+            telemetry.failed(record, e)
+            raise
+        finally:
+            current_task.reset(task_token)
+        if kwargs.get("stream"):
+            return telemetry.awrap_stream(record, response)
+        telemetry.succeeded(record, response)
+        return response
+
+    def _cache_ttl(self) -> float:
+        return settings.LLM_CACHE_TTLS.get(self.task, 0)
+
+    def _prepare(self, request: dict) -> dict:
+        if self.output_schema is not None and settings.LLM_JSON_MODE and not request.get("stream"):
+            request = {**request, "response_format": {"type": "json_object"}}
+        return request
+
+    def _repair_request(self, error: OutputParseError) -> dict:
+        if not (settings.LLM_OUTPUT_REPAIR and error.repairable):
+            raise error
+        logger.info("Repairing %s output: %s", self.task, error)
+        return build_repair_request(self.model_name, error, self.output_schema)
+
+    def _merge_repair(self, error: OutputParseError, response) -> str:
+        try:
+            fixed = merge_repair(error, response.choices[0].message.content, self.output_schema)
+        except Exception as e:
+            metrics.inc("llm_output_repairs_total", {"task": self.task, "result": "failed"})
+            raise error from e
+        metrics.inc("llm_output_repairs_total", {"task": self.task, "result": "repaired"})
+        return fixed
+
+    def _complete(self, request: dict, parse):
+        """Call the model with the (already routed) request and parse the reply, repairing only
+        the broken part if parsing fails.
+
+        Returns (content, result) where content is the (possibly repaired) reply text.
+        """
+        with telemetry.parse_scope(self.task) as scope:
+            try:
+                response = self._create(routed=True, **request)
+            except Exception as e:
+                failed = _failed_generation(e)
+                if failed is None:
+                    raise
+                response = _cached_response(failed)
+            try:
+                result = parse(response)
+                scope.result = "ok"
+                return response.choices[0].message.content, result
+            except OutputParseError as error:
+                scope.result = "failed"
+                fixed = self._merge_repair(error, self._create(keep_max_tokens=True, **self._repair_request(error)))
+                result = parse(_cached_response(fixed))
+                scope.result = "repaired"
+                return fixed, result
+
+    async def _acomplete(self, request: dict, parse):
+        """Async variant of `_complete`."""
+        with telemetry.parse_scope(self.task) as scope:
+            try:
+                response = await self._acreate(routed=True, **request)
+            except Exception as e:
+                failed = _failed_generation(e)
+                if failed is None:
+                    raise
+                response = _cached_response(failed)
+            try:
+                result = parse(response)
+                scope.result = "ok"
+                return response.choices[0].message.content, result
+            except OutputParseError as error:
+                scope.result = "failed"
+                fixed = self._merge_repair(error, await self._acreate(keep_max_tokens=True, **self._repair_request(error)))
+                result = parse(_cached_response(fixed))
+                scope.result = "repaired"
+                return fixed, result
+
+    def _run(self, request: dict, parse):
+        """Execute `request` and return `parse(response)`, going through the response cache.
+
+        The cache is only consulted when the task has a TTL in LLM_CACHE_TTLS, and a reply is
+        only stored after it parsed successfully so malformed output is never replayed. The
+        request is routed first and keyed with the model and max_tokens that will answer it,
+        so a fallback model's reply is never served once the primary is back.
+        """
+        request = model_router.route(self.task, self._prepare(request))
+        ttl = self._cache_ttl()
+        if ttl <= 0:
+            return self._complete(request, parse)[1]
+
+        key = make_cache_key(request)
+        cached = response_cache.get(key, self.task)
+        if cached is not None:
+            return parse(_cached_response(cached))
+
+        content, result = self._complete(request, parse)
+        response_cache.set(key, content, ttl, self.task, request.get("model"))
+        return result
+
+    async def _arun(self, request: dict, parse):
+        """Async variant of `_run`."""
+        request = model_router.route(self.task, self._prepare(request))
+        ttl = self._cache_ttl()
+        if ttl <= 0:
+            return (await self._acomplete(request, parse))[1]
+
+        key = make_cache_key(request)
+        cached = await response_cache.aget(key, self.task)
+        if cached is not None:
+            return parse(_cached_response(cached))
+
+        content, result = await self._acomplete(request, parse)
+        await response_cache.aset(key, content, ttl, self.task, request.get("model"))
+        return result
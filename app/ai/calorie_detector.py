@@ -1,40 +1,35 @@
+import asyncio
 import base64
-import json
-import os
-import re
-from groq import Groq
-from app.config import settings
+from app.ai.base import LLMAssistant
+from app.ai.image_prep import prepare_image
+from app.ai.output_parser import parse_json_output
+from app.ai.prompt_registry import prompts
+from app.schemas.llm_schema import CalorieOutput
 
-class CalorieDetector:
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        # Using the vision-capable model
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct" 
+# Sent verbatim (contains a literal JSON example)
+prompts.register("calorie_detect")
 
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
+class CalorieDetector(LLMAssistant):
+    # Using the vision-capable model (LLMAssistant default)
+    task = "calorie_detect"
+    output_schema = CalorieOutput
+
+    def encode_image(self, image: str | bytes):
+        # Uploads arrive as bytes already in memory; a path is read from disk
+        if isinstance(image, bytes):
+            return base64.b64encode(image).decode('utf-8')
+        with open(image, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
 
-    def detect_calories(self, image_path: str) -> dict:
-        """
-        Analyze food image and return nutritional info.
-        """
-        
-        # Read prompt from file
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "calorie_detect.txt")
-        
-        try:
-            with open(prompt_path, "r") as f:
-                system_prompt = f.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Prompt file not found at {prompt_path}")
+    def _build_request(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        system_prompt = prompts.get("calorie_detect").text
 
-        # Encode image
-        base64_image = self.encode_image(image_path)
-        data_url = f"data:image/jpeg;base64,{base64_image}"
+        # Downscaled and re-encoded for the model; may change the MIME type
+        content, mime_type = prepare_image(image, mime_type, self.task)
+        base64_image = self.encode_image(content)
+        data_url = f"data:{mime_type};base64,{base64_image}"
 
-        response = self.client.chat.completions.create(
+        return dict(
             model=self.model_name,
             messages=[
                 {
@@ -57,24 +52,17 @@ class CalorieDetector:
             stop=None,
         )
 
-        raw_output = response.choices[0].message.content
-        if not raw_output:
-             raise ValueError("LLM returned empty content")
-        
-        # Cleaning and Parsing Logic
-        cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
-        
-        if match:
-            json_data = match.group()
-        else:
-             # Fallback if no clear JSON block found but content looks like JSON
-            if cleaned.startswith("{") and cleaned.endswith("}"):
-                json_data = cleaned
-            else:
-                raise ValueError(f"No JSON found in AI output: {raw_output}")
+    def _parse(self, response) -> dict:
+        return parse_json_output(response.choices[0].message.content, CalorieOutput)
+
+    def detect_calories(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        """
+        Analyze food image (a file path or the image bytes) and return nutritional info.
+        """
+        return self._run(self._build_request(image, mime_type), self._parse)
 
-        try:
-            return json.loads(json_data)
-        except json.JSONDecodeError:
-             raise ValueError("Failed to parse AI output as JSON")
+    async def detect_calories_async(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        """Async variant of `detect_calories`."""
+        # Image preparation is CPU-bound: keep it off the event loop
+        request = await asyncio.to_thread(self._build_request, image, mime_type)
+        return await self._arun(request, self._parse)
@@ -0,0 +1,177 @@
+"""Token-budgeted context for the chatbot prompt.
+
+Plans are serialised as compact JSON and cut down to the parts the question is about (today's
+meals, or the workout for the day being asked about). Chat history is then added newest-first
+until the token budget runs out. Token counts are estimates (about 4 characters per token);
+this is close enough to keep prompt size steady without depending on a provider tokenizer.
+"""
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from app.config import settings
+from app.utils.dates import WEEKDAYS
+
+CHARS_PER_TOKEN = 4
+TRUNCATED = "...[truncated]"
+OMITTED = "(not needed for this question; ask about it to see it)"
+
+MEALS = ["breakfast", "lunch", "dinner", "snack", "snacks"]
+
+DIET_WORDS = {
+    "eat", "eating", "ate", "meal", "meals", "food", "foods", "diet", "breakfast", "lunch",
+    "dinner", "snack", "snacks", "calorie", "calories", "kcal", "protein", "carbs", "carb", "fat",
+    "hungry", "recipe", "drink", "nutrition", "macros",
+}
+WORKOUT_WORDS = {
+    "workout", "workouts", "exercise", "exercises", "gym", "train", "training", "sets", "reps",
+    "rest", "cardio", "muscle", "muscles", "lift", "lifting", "run", "running", "stretch",
+    "warmup", "routine", "legs", "chest", "back", "arms", "shoulders", "abs", "core",
+}
+WEEK_WORDS = {"week", "weekly", "schedule", "all"}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def compact_json(value) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return str(value)
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - len(TRUNCATED), 0)] + TRUNCATED
+
+
+def _words(question: str) -> set[str]:
+    return set(re.findall(r"[a-z]+", question.lower()))
+
+
+def question_topics(question: str) -> set[str]:
+    """"diet" and/or "workout"; both when the question doesn't clearly pick one."""
+    words = _words(question)
+    topics = set()
+    if words & DIET_WORDS:
+        topics.add("diet")
+    if words & WORKOUT_WORDS:
+        topics.add("workout")
+    return topics or {"diet", "workout"}
+
+
+def select_diet(plan, question: str):
+    """Only the meals named in the question, or the whole (single-day) plan."""
+    if not isinstance(plan, dict):
+        return plan
+    words = _words(question)
+    named = {k: v for k, v in plan.items() if k.lower() in words and k.lower() in MEALS}
+    return named or plan
+
+
+def select_workout(plan, question: str, today: date):
+    """Days named in the question ("tomorrow" included), the whole week if asked, else today."""
+    if not isinstance(plan, dict):
+        return plan
+    words = _words(question)
+    if words & WEEK_WORDS:
+        return plan
+    days = [d for d in WEEKDAYS if d in words]
+    if "tomorrow" in words:
+        days.append(WEEKDAYS[(today + timedelta(days=1)).weekday()])
+    if "yesterday" in words:
+        days.append(WEEKDAYS[(today - timedelta(days=1)).weekday()])
+    if not days:
+        days = [WEEKDAYS[today.weekday()]]
+    by_day = {k.lower(): (k, v) for k, v in plan.items()}
+    return {
+        day: by_day[day][1] if day in by_day else "Rest day (no workout scheduled)"
+        for day in dict.fromkeys(days)
+    }
+
+
+@dataclass
+class ChatContext:
+    today_diet: str
+    current_workout: str
+    history: str
+    summary: str = ""
+    # Plan sections that made it into the prompt, e.g. ["diet:lunch", "workout:monday"]
+    sections: list = field(default_factory=list)
+    history_messages: int = 0
+    context_tokens: int = 0
+    prompt_tokens: int = 0
+
+
+def build_chat_context(
+    question: str,
+    diet_plan,
+    workout_plan,
+    history: list,
+    today: date,
+    no_diet_note: str,
+    no_workout_note: str,
+    budget: int | None = None,
+    summary: str = "",
+) -> ChatContext:
+    """Pick the context sections for one chat turn within `budget` estimated tokens.
+
+    `diet_plan` / `workout_plan` are the current plans (None when there isn't one, in which case
+    the matching `no_*_note` instruction is used). `history` is a chronological list of
+    (role_label, content) pairs; the newest messages that fit after the plans are kept.
+    `summary` is the rolling summary of older messages, kept ahead of the raw history.
+    """
+    budget = settings.CHAT_CONTEXT_TOKEN_BUDGET if budget is None else budget
+    topics = question_topics(question)
+    sections = []
+
+    if diet_plan is None:
+        diet_text = no_diet_note
+    elif "diet" in topics:
+        selected = select_diet(diet_plan, question)
+        diet_text = compact_json(selected)
+        sections += [f"diet:{k}" for k in selected] if isinstance(selected, dict) else ["diet"]
+    else:
+        diet_text = OMITTED
+
+    if workout_plan is None:
+        workout_text = no_workout_note
+    elif "workout" in topics:
+        selected = select_workout(workout_plan, question, today)
+        workout_text = compact_json(selected)
+        sections += [f"workout:{k}" for k in selected] if isinstance(selected, dict) else ["workout"]
+    else:
+        workout_text = OMITTED
+
+    # Plans may use at most 60% of the budget between them; history gets the rest
+    plan_cap = int(budget * 0.6) // 2
+    diet_text = clip_to_tokens(diet_text, plan_cap)
+    workout_text = clip_to_tokens(workout_text, plan_cap)
+    # The rolling summary of older turns may use up to 20%
+    summary = clip_to_tokens(summary, int(budget * 0.2))
+    used = estimate_tokens(diet_text) + estimate_tokens(workout_text) + estimate_tokens(summary)
+
+    kept = []
+    for role_label, content in reversed(history):
+        line = f"{role_label}: {content}\n"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+
+    return ChatContext(
+        today_diet=diet_text,
+        current_workout=workout_text,
+        history="".join(kept),
+        summary=summary,
+        sections=sections,
+        history_messages=len(kept),
+        context_tokens=used,
+    )
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.ai.base import LLMAssistant
+from app.ai.prompt_registry import prompts
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ChatHistory, ChatSummary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT_KEYS = {"previous_summary", "new_messages"}
+prompts.register("chat_summary_prompt", SUMMARY_PROMPT_KEYS)
+
+# Users whose summary refresh is running in this process, and the tasks doing it. The lock
+# guards `_refreshing`, which the sync chat path updates from request threads.
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+_tasks: set[asyncio.Task] = set()
+
+
+def load_summary(db: Session, user_email: str) -> ChatSummary | None:
+    return db.query(ChatSummary).filter(ChatSummary.user_email == user_email).first()
+
+
+def _format_messages(rows) -> str:
+    return "\n".join(
+        f"{'User' if str(msg.role) == 'user' else 'Assistant'}: {msg.content}" for msg in rows
+    )
+
+
+class ChatSummarizer(LLMAssistant):
+    """Folds older ChatHistory rows into a per-user rolling summary.
+
+    The newest `CHAT_SUMMARY_KEEP_RECENT` messages are always left out of the summary because
+    the chatbot sends them verbatim; a refresh only runs once at least
+    `CHAT_SUMMARY_EVERY_TURNS` further turns have accumulated beyond them.
+    """
+
+    task = "chat_summary"
+
+    def pending_messages(self, db: Session, user_email: str) -> list:
+        """Messages that are due to be folded into the summary (empty when not due yet)."""
+        summary = load_summary(db, user_email)
+        boundary = summary.last_message_id if summary else 0
+        rows = db.query(ChatHistory).filter(
+            ChatHistory.user_email == user_email,
+            ChatHistory.id > boundary,
+        ).order_by(ChatHistory.id.asc()).all()
+
+        keep = settings.CHAT_SUMMARY_KEEP_RECENT
+        if len(rows) < keep + 2 * settings.CHAT_SUMMARY_EVERY_TURNS:
+            return []
+        return rows[:len(rows) - keep] if keep else rows
+
+    def _build_request(self, previous_summary: str, rows: list) -> dict:
+        prompt = prompts.render(
+            "chat_summary_prompt",
+            previous_summary=previous_summary or "None yet.",
+            new_messages=_format_messages(rows),
+        )
+        return dict(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=300,
+            temperature=0.2
+        )
+
+    def _store(self, db: Session, user_email: str, text: str, last_message_id: int) -> None:
+        summary = load_summary(db, user_email)
+        if summary is None:
+            summary = ChatSummary(user_email=user_email)
+            db.add(summary)
+        summary.summary = text
+        summary.last_message_id = last_message_id
+        db.commit()
+
+    def _pending_request(self, db: Session, user_email: str) -> tuple[dict, int] | None:
+        """(summary request, id of the last message it covers), or None when no refresh is due.
+
+        The read is ended before returning, so no connection is held during the LLM call.
+        """
+        rows = self.pending_messages(db, user_email)
+        if not rows:
+            db.rollback()
+            return None
+        summary = load_summary(db, user_email)
+        pending = self._build_request(summary.summary if summary else "", rows), rows[-1].id
+        db.rollback()
+        return pending
+
+    def _store_reply(self, db: Session, user_email: str, response, last_message_id: int) -> bool:
+        text = (response.choices[0].message.content or "").strip()
+        if not text:
+            return False
+        self._store(db, user_email, text, last_message_id)
+        return True
+
+    def refresh(self, db: Session, user_email: str) -> bool:
+        """Fold due messages into the summary. Returns True when the summary changed."""
+        pending = self._pending_request(db, user_email)
+        if pending is None:
+            return False
+        request, last_message_id = pending
+        return self._store_reply(db, user_email, self._create(**request), last_message_id)
+
+    async def refresh_async(self, db: Session, user_email: str) -> bool:
+        """Async variant of `refresh`. The reads and the write run in worker threads."""
+        pending = await asyncio.to_thread(self._pending_request, db, user_email)
+        if pending is None:
+            return False
+        request, last_message_id = pending
+        response = await self._acreate(**request)
+        return await asyncio.to_thread(self._store_reply, db, user_email, response, last_message_id)
+
+
+def _release(user_email: str) -> None:
+    with _refreshing_lock:
+        _refreshing.discard(user_email)
+
+
+async def _refresh(user_email: str, session_factory) -> None:
+    try:
+        with session_factory() as db:
+            await ChatSummarizer().refresh_async(db, user_email)
+    except Exception as e:
+        # The next turn will try again; chat itself never depends on the refresh
+        logger.warning("Chat summary refresh failed for %s: %s", user_email, e)
+    finally:
+        _release(user_email)
+
+
+def _refresh_sync(user_email: str, session_factory) -> None:
+    try:
+        with session_factory() as db:
+            ChatSummarizer().refresh(db, user_email)
+    except Exception as e:
+        logger.warning("Chat summary refresh failed for %s: %s", user_email, e)
+    finally:
+        _release(user_email)
+
+
+def schedule_summary_refresh(user_email: str, session_factory=SessionLocal) -> asyncio.Task | threading.Thread | None:
+    """Refresh the user's summary in the background, off the request path.
+
+    At most one refresh per user runs at a time in this process. Inside an event loop the
+    refresh is a task; outside one (the sync chat methods) it runs in a daemon thread.
+    """
+    if not settings.CHAT_SUMMARY_ENABLED:
+        return None
+    with _refreshing_lock:
+        if user_email in _refreshing:
+            return None
+        _refreshing.add(user_email)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        thread = threading.Thread(
+            target=_refresh_sync, args=(user_email, session_factory), name="chat-summary-refresh", daemon=True
+        )
+        thread.start()
+        return thread
+    task = loop.create_task(_refresh(user_email, session_factory))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
@@ -1,27 +1,65 @@
-import os
-import json
-from datetime import date, datetime
+import asyncio
+import logging
+from typing import AsyncIterator, Iterator
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from groq import Groq
+from app.ai.base import LLMAssistant
+from app.ai.chat_context import ChatContext, build_chat_context, estimate_tokens
+from app.ai.chat_memory import load_summary, schedule_summary_refresh
+from app.ai.prompt_registry import prompts
 from app.config import settings
+from app.utils.dates import app_now
+from app.utils.metrics import metrics
 from app.models import UserProfile, UserDiet, UserWorkout, UserFoodLog, ChatHistory
 
-class ChatbotAssistant:
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct"
+CHAT_PROMPT_KEYS = {
+    "name", "age", "gender", "height", "weight", "goal", "activity_level", "diet_type",
+    "food_allergies", "medical_conditions", "exercise_type", "wake_up_time", "sleep_time",
+    "sleep_pattern", "breakfast_time", "current_date", "current_time", "time_of_day",
+    "today_diet", "current_workout", "recent_calories", "conversation_summary", "history",
+    "user_question",
+}
+prompts.register("chatbot_prompt", CHAT_PROMPT_KEYS)
 
-    def get_chat_response(self, user_email: str, question: str, db: Session) -> str:
+NO_PROFILE_MESSAGE = "I couldn't find your profile. Please set up your profile first."
+EMPTY_ANSWER_MESSAGE = "I apologize, but I was unable to generate a response."
+
+NO_DIET_NOTE = (
+    "No diet plan generated for this week. "
+    "If the user asks for today's diet plan, strictly reply: "
+    "'I haven't generated a diet plan for this week yet. You can generate one using the diet suggestion feature.' "
+    "Do NOT provide any meal suggestions. Keep the response short."
+)
+NO_WORKOUT_NOTE = (
+    "No workout plan generated for this week. "
+    "If the user asks for today's workout, strictly reply: "
+    "'I haven't generated a workout plan for this week yet. You can generate one using the workout suggestion feature.' "
+    "Do NOT provide any exercise suggestions. Keep the response short."
+)
+
+PROMPT_TOKEN_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+logger = logging.getLogger(__name__)
+metrics.describe("chat_prompt_tokens", "Estimated size of the assembled chat prompt in tokens")
+
+
+class ChatbotAssistant(LLMAssistant):
+    task = "chat"
+
+    # Context chosen for the most recent prompt (sizes and sections), for logging and tests
+    last_context: ChatContext | None = None
+
+    def build_prompt(self, user_email: str, question: str, db: Session) -> str | None:
+        """Assemble the user-specific chat prompt. Returns None when the user has no profile."""
         # 1. Fetch User Profile
         profile = db.query(UserProfile).filter(UserProfile.email == user_email).first()
         if not profile:
-            return "I couldn't find your profile. Please set up your profile first."
+            return None
 
         # 2. Fetch Context (Diet, Workout, Logs)
-        today = date.today()
+        now = app_now()
+        today = now.date()
         today_str = today.strftime("%A, %Y-%m-%d") # e.g., "Tuesday, 2025-11-25"
-        now = datetime.now()
         current_time = now.strftime("%H:%M")
         
         # Determine Time of Day
@@ -55,97 +93,64 @@ class ChatbotAssistant:
              for log in recent_logs if log.food_analysis is not None]
         ) if recent_logs else "No recent logs"
 
-        # 3. Fetch Chat History (Last 10 messages)
+        # 3. Fetch Chat History not yet folded into the rolling summary
+        # (trimmed to the token budget below)
+        summary = load_summary(db, user_email)
         history_records = db.query(ChatHistory).filter(
-            ChatHistory.user_email == user_email
-        ).order_by(ChatHistory.timestamp.desc()).limit(10).all()
-        
+            ChatHistory.user_email == user_email,
+            ChatHistory.id > (summary.last_message_id if summary else 0)
+        ).order_by(ChatHistory.id.desc()).limit(settings.CHAT_HISTORY_MAX_MESSAGES).all()
+
         # Reverse to chronological order
         history_records.reverse()
-        
-        history_text = ""
-        for msg in history_records:
-            role_label = "User" if str(msg.role) == "user" else "Assistant"
-
-            history_text += f"{role_label}: {msg.content}\n"
+        history = [
+            ("User" if str(msg.role) == "user" else "Assistant", msg.content)
+            for msg in history_records
+        ]
 
-        # 4. Load Prompt Template
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "chatbot_prompt.txt")
-        
-        try:
-            with open(prompt_path, "r") as f:
-                prompt_template = f.read()
-        except FileNotFoundError:
-            return "Error: Prompt file missing."
-
-        # 5. Format Prompt
-        # Safe handling of JSON fields
-        diet_plan_summary = "No active plan"
-        
-        # Determine if we have a valid plan for today (Diet)
-        has_today_plan = False
-        
+        # 4. Pick the plans that are current
+        diet_plan = None
         if latest_diet is not None and latest_diet.created_at is not None:
             # Relaxed check: Is the diet plan from within the last 7 days?
             days_diff = (today - latest_diet.created_at.date()).days
             if 0 <= days_diff <= 7:
-                 if latest_diet.diet_plan is not None:
-                    has_today_plan = True
-                    if isinstance(latest_diet.diet_plan, (dict, list)):
-                        diet_plan_summary = json.dumps(latest_diet.diet_plan, indent=2)
-                    else:
-                        diet_plan_summary = str(latest_diet.diet_plan)
-
-        if not has_today_plan:
-            # If no plan for today, instruct the AI
-            diet_plan_summary = (
-                "No diet plan generated for this week. "
-                "If the user asks for today's diet plan, strictly reply: "
-                "'I haven't generated a diet plan for this week yet. You can generate one using the diet suggestion feature.' "
-                "Do NOT provide any meal suggestions. Keep the response short."
-            )
-            
-        # Determine if we have a valid workout for today
-        has_today_workout = False
-        workout_summary = "No active workout"
+                diet_plan = latest_diet.diet_plan
 
+        # Determine if we have a valid workout for today
+        workout_plan = None
         if latest_workout is not None:
-             # Check 1: Use week_start and week_end if available
-             if latest_workout.week_start is not None and latest_workout.week_end is not None:
-                 # Break down comparison to avoid Pylance confusion
-                 start_valid = latest_workout.week_start <= today
-                 end_valid = today <= latest_workout.week_end
-                 if start_valid and end_valid:  # type: ignore
-                     has_today_workout = True
-             
-             # Check 2: Fallback to created_at within last 7 days if no week_start
-             elif latest_workout.created_at is not None:
-                 days_diff = (today - latest_workout.created_at.date()).days
-                 if 0 <= days_diff <= 7:
-                     has_today_workout = True
-
-             if has_today_workout and latest_workout.workout_plan is not None:
-                 if isinstance(latest_workout.workout_plan, (dict, list)):
-                     workout_summary = json.dumps(latest_workout.workout_plan, indent=2)
-                 else:
-                     workout_summary = str(latest_workout.workout_plan)
-        
-        if not has_today_workout:
-             workout_summary = (
-                 "No workout plan generated for this week. "
-                 "If the user asks for today's workout, strictly reply: "
-                 "'I haven't generated a workout plan for this week yet. You can generate one using the workout suggestion feature.' "
-                 "Do NOT provide any exercise suggestions. Keep the response short."
-             )
-
-        # Truncate only if extremely large (e.g. > 6000 chars) to fit context
-        if len(diet_plan_summary) > 6000:
-            diet_plan_summary = diet_plan_summary[:6000] + "...[truncated]"
-        if len(workout_summary) > 6000:
-            workout_summary = workout_summary[:6000] + "...[truncated]"
-
-        prompt = prompt_template.format(
+            has_today_workout = False
+            # Check 1: Use week_start and week_end if available
+            if latest_workout.week_start is not None and latest_workout.week_end is not None:
+                # Break down comparison to avoid Pylance confusion
+                start_valid = latest_workout.week_start <= today
+                end_valid = today <= latest_workout.week_end
+                if start_valid and end_valid:  # type: ignore
+                    has_today_workout = True
+
+            # Check 2: Fallback to created_at within last 7 days if no week_start
+            elif latest_workout.created_at is not None:
+                days_diff = (today - latest_workout.created_at.date()).days
+                if 0 <= days_diff <= 7:
+                    has_today_workout = True
+
+            if has_today_workout:
+                workout_plan = latest_workout.workout_plan
+
+        # 5. Compact, question-relevant sections and history within the token budget
+        context = build_chat_context(
+            question,
+            diet_plan,
+            workout_plan,
+            history,
+            today,
+            no_diet_note=NO_DIET_NOTE,
+            no_workout_note=NO_WORKOUT_NOTE,
+            summary=summary.summary if summary else "",
+        )
+
+        prompt = prompts.render(
+            "chatbot_prompt",
             name=profile.name,
             age=profile.age,
             gender=profile.gender,
@@ -165,35 +170,138 @@ class ChatbotAssistant:
             current_date=today_str,
             current_time=current_time,
             time_of_day=time_of_day,
-            today_diet=diet_plan_summary,
-            current_workout=workout_summary,
+            today_diet=context.today_diet,
+            current_workout=context.current_workout,
             recent_calories=recent_calories,
-            history=history_text,
+            conversation_summary=context.summary or "Nothing earlier.",
+            history=context.history,
             user_question=question
         )
 
-        # 6. Call Groq AI
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful fitness assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            answer = response.choices[0].message.content
-            if not answer:
-                answer = "I apologize, but I was unable to generate a response."
-        except Exception as e:
-            return f"AI Service Error: {str(e)}"
+        context.prompt_tokens = estimate_tokens(prompt)
+        self.last_context = context
+        metrics.observe("chat_prompt_tokens", context.prompt_tokens, buckets=PROMPT_TOKEN_BUCKETS)
+        logger.info(
+            "Chat prompt for %s: ~%d tokens (context %d, sections %s, %d history messages)",
+            user_email, context.prompt_tokens, context.context_tokens,
+            ",".join(context.sections) or "-", context.history_messages,
+        )
+        return prompt
+
+    def _messages(self, prompt: str) -> list:
+        return [
+            {"role": "system", "content": "You are a helpful fitness assistant."},
+            {"role": "user", "content": prompt}
+        ]
 
-        # 7. Save Interaction to DB
+    def save_turn(self, user_email: str, question: str, answer: str, db: Session) -> None:
         # User message
         db.add(ChatHistory(user_email=user_email, role="user", content=question))
         # Assistant message
         db.add(ChatHistory(user_email=user_email, role="assistant", content=answer))
         db.commit()
 
+    def _build_request(self, prompt: str, stream: bool = False) -> dict:
+        request = dict(
+            model=self.model_name,
+            messages=self._messages(prompt),
+            max_tokens=1000,
+            temperature=0.7
+        )
+        if stream:
+            request["stream"] = True
+        return request
+
+    def get_chat_response(self, user_email: str, question: str, db: Session) -> str:
+        prompt = self.build_prompt(user_email, question, db)
+        if prompt is None:
+            return NO_PROFILE_MESSAGE
+
+        # 5. Call Groq AI
+        try:
+            response = self._create(**self._build_request(prompt))
+            answer = response.choices[0].message.content
+            if not answer:
+                answer = EMPTY_ANSWER_MESSAGE
+        except Exception as e:
+            return f"AI Service Error: {str(e)}"
+
+        # 6. Save Interaction to DB
+        self.save_turn(user_email, question, answer, db)
+        schedule_summary_refresh(user_email)
+
         return answer
+
+    def stream_chat_response(self, user_email: str, question: str, db: Session) -> Iterator[str]:
+        """Yield answer text chunks as the model produces them.
+
+        The full answer is persisted to ChatHistory once the stream completes. Errors from the
+        AI service propagate to the caller and nothing is saved for that turn.
+        """
+        prompt = self.build_prompt(user_email, question, db)
+        if prompt is None:
+            yield NO_PROFILE_MESSAGE
+            return
+
+        stream = self._create(**self._build_request(prompt, stream=True))
+
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        answer = "".join(parts)
+        if not answer:
+            answer = EMPTY_ANSWER_MESSAGE
+            yield answer
+
+        self.save_turn(user_email, question, answer, db)
+        schedule_summary_refresh(user_email)
+
+    async def get_chat_response_async(self, user_email: str, question: str, db: Session) -> str:
+        """Async variant of `get_chat_response`. The DB work runs in worker threads."""
+        prompt = await asyncio.to_thread(self.build_prompt, user_email, question, db)
+        if prompt is None:
+            return NO_PROFILE_MESSAGE
+
+        try:
+            response = await self._acreate(**self._build_request(prompt))
+            answer = response.choices[0].message.content
+            if not answer:
+                answer = EMPTY_ANSWER_MESSAGE
+        except Exception as e:
+            return f"AI Service Error: {str(e)}"
+
+        await asyncio.to_thread(self.save_turn, user_email, question, answer, db)
+        schedule_summary_refresh(user_email)
+        return answer
+
+    async def stream_chat_response_async(self, user_email: str, question: str, db: Session) -> AsyncIterator[str]:
+        """Async variant of `stream_chat_response`. The DB work runs in worker threads."""
+        prompt = await asyncio.to_thread(self.build_prompt, user_email, question, db)
+        if prompt is None:
+            yield NO_PROFILE_MESSAGE
+            return
+
+        stream = await self._acreate(**self._build_request(prompt, stream=True))
+
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        answer = "".join(parts)
+        if not answer:
+            answer = EMPTY_ANSWER_MESSAGE
+            yield answer
+
+        await asyncio.to_thread(self.save_turn, user_email, question, answer, db)
+        schedule_summary_refresh(user_email)
@@ -1,33 +1,29 @@
-import os
-import re
-import json
 from datetime import date
-from groq import Groq
-from app.config import settings
+from app.ai.base import LLMAssistant
+from app.ai.output_parser import parse_json_output
+from app.ai.prompt_registry import prompts
+from app.schemas.llm_schema import CustomDietOutput
+from app.utils.dates import app_today
 
+CUSTOM_DIET_PROMPT_KEYS = {
+    "current_date", "age", "gender", "height", "weight", "goal", "activity_level",
+    "diet_type", "food_allergies", "food_dislikes", "previous_date", "yesterday_plan", "ingredients",
+}
+prompts.register("custom_diet_prompt", CUSTOM_DIET_PROMPT_KEYS)
 
-class CustomDietAssistant:
+
+class CustomDietAssistant(LLMAssistant):
     """Generate a custom ingredient-driven diet plan using a dedicated prompt file.
     This mirrors the parsing logic used by DietAssistant but uses a special prompt that
     prioritizes available ingredients and returns deterministic output for a date.
     """
 
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct"
+    task = "custom_diet"
+    output_schema = CustomDietOutput
 
-    def get_custom_plan(self, user_data: dict, ingredients, current_date: date | None = None) -> dict:
+    def _build_request(self, user_data: dict, ingredients, current_date: date | None) -> dict:
         if current_date is None:
-            current_date = date.today()
-
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "custom_diet_prompt.txt")
-
-        try:
-            with open(prompt_path, "r") as f:
-                prompt_template = f.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Prompt file not found at {prompt_path}")
+            current_date = app_today()
 
         # Ensure ingredients passed to prompt is a human-readable list string
         raw_ings = ingredients or user_data.get('ingredients', 'None')
@@ -52,9 +48,9 @@ class CustomDietAssistant:
             "ingredients": ingredients_for_prompt,
         }
 
-        prompt = prompt_template.format(**format_data)
+        prompt = prompts.render("custom_diet_prompt", **format_data)
 
-        response = self.client.chat.completions.create(
+        return dict(
             model=self.model_name,
             messages=[
                 {"role": "system", "content": "You are a fitness and nutrition AI assistant."},
@@ -64,23 +60,8 @@ class CustomDietAssistant:
             temperature=0.3,
         )
 
-        raw_output = response.choices[0].message.content
-
-        if not raw_output or not isinstance(raw_output, str):
-            raise ValueError("LLM returned empty or invalid content")
-
-        cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
-        if not match:
-            raise ValueError("No JSON found in LLM output")
-
-        json_data = match.group()
-        json_data = json_data.replace("'", '"')
-
-        try:
-            parsed = json.loads(json_data)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse AI output as JSON: {e}")
+    def _parse(self, response) -> dict:
+        parsed = parse_json_output(response.choices[0].message.content, CustomDietOutput)
 
         # Ensure the structure is normalized, convert date to string and
         # explicitly remove any top-level 'ingredients' key so the caller
@@ -93,3 +74,10 @@ class CustomDietAssistant:
                 parsed.pop("ingredients", None)
 
         return parsed
+
+    def get_custom_plan(self, user_data: dict, ingredients, current_date: date | None = None) -> dict:
+        return self._run(self._build_request(user_data, ingredients, current_date), self._parse)
+
+    async def get_custom_plan_async(self, user_data: dict, ingredients, current_date: date | None = None) -> dict:
+        """Async variant of `get_custom_plan`."""
+        return await self._arun(self._build_request(user_data, ingredients, current_date), self._parse)
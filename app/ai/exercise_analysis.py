@@ -1,32 +1,20 @@
 import json
-import os
-from groq import Groq
-from app.config import settings
+from app.ai.base import LLMAssistant
+from app.ai.output_parser import OutputParseError, parse_json_output, strip_fences
+from app.ai.prompt_registry import prompts
+from app.ai.resilience import LLMUnavailableError
+from app.schemas.llm_schema import WeeklyAnalysisOutput
 
+# Sent verbatim as the system prompt (contains literal JSON examples)
+prompts.register("exercise_analysis")
 
-class ExerciseAnalysis:
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct"
 
-    def analyze_week(self, profile: dict, week_summary: dict) -> dict:
-        """Send a prompt to the AI to provide advice for a weekly summary.
-
-        The method expects `profile` to contain user profile fields and `week_summary` a dict
-        with week_start, week_end and daily_stats (list of objects).
-
-        Returns a dict parsed from the model's JSON output, expected to include at least "advice".
-        """
-
-        # Load prompt
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "exercise_analysis.txt")
+class ExerciseAnalysis(LLMAssistant):
+    task = "weekly_analysis"
+    output_schema = WeeklyAnalysisOutput
 
-        try:
-            with open(prompt_path, "r") as fh:
-                system_prompt = fh.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
+    def _build_request(self, profile: dict, week_summary: dict) -> dict:
+        system_prompt = prompts.get("exercise_analysis").text
 
         # Build user context to pass in the user content slot.
         content = {
@@ -34,55 +22,74 @@ class ExerciseAnalysis:
             "week_summary": week_summary
         }
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": json.dumps(content)}
-                ],
-                temperature=0.4,
-                max_tokens=512
-            )
-
-            raw = response.choices[0].message.content
-            if not raw:
-                raise ValueError("AI returned empty content")
-
-            cleaned = raw.replace("```json", "").replace("```", "").strip()
+        return dict(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": json.dumps(content)}
+            ],
+            temperature=0.4,
+            max_tokens=512
+        )
+
+    def _fallback(self, raw: str, week_summary: dict) -> dict:
+        """Return a safe object the caller expects, using the raw content as advice."""
+        # Keep the advice reasonably sized
+        advice_text = strip_fences(raw or "")
+        if len(advice_text) > 2000:
+            advice_text = advice_text[:2000] + "...[truncated]"
+
+        return {"advice": advice_text, "week_start": week_summary.get("week_start"), "week_end": week_summary.get("week_end"), "daily_stats": week_summary.get("daily_stats")}
+
+    def _parse(self, response, week_summary: dict) -> dict:
+        raw = response.choices[0].message.content
+        if not raw:
+            raise ValueError("AI returned empty content")
 
-            # find JSON in the response
-            try:
-                parsed = json.loads(cleaned)
-                # If parsed JSON does not contain required top-level keys, try to fill
-                if not (isinstance(parsed, dict) and ("daily_stats" in parsed or "advice" in parsed)):
-                    # If the model returned a simple string or a different object, wrap into advice
-                    parsed = {"advice": cleaned}
-                return parsed
-            except json.JSONDecodeError:
-                # Try to locate JSON block within text
-                import re
+        try:
+            parsed = parse_json_output(raw, WeeklyAnalysisOutput)
+        except OutputParseError as e:
+            # Partly broken JSON goes to the targeted repair; plain prose becomes the advice
+            if e.repairable:
+                raise
+            return self._fallback(raw, week_summary)
+
+        # If the model returned a simple string or a different object, wrap into advice
+        if not (isinstance(parsed, dict) and ("daily_stats" in parsed or "advice" in parsed)):
+            return {"advice": strip_fences(raw)}
+        return parsed
 
-                m = re.search(r"\{.*\}", cleaned, re.DOTALL)
-                if m:
-                    try:
-                        parsed = json.loads(m.group())
-                        # Ensure parsed has required shape; otherwise return as-is
-                        if not (isinstance(parsed, dict) and ("daily_stats" in parsed or "advice" in parsed)):
-                            return {"advice": cleaned}
-                        return parsed
-                    except json.JSONDecodeError:
-                        # If we found a JSON-like block but still can't decode, fall through
-                        pass
+    def analyze_week(self, profile: dict, week_summary: dict) -> dict:
+        """Send a prompt to the AI to provide advice for a weekly summary.
 
-                # No JSON could be decoded — fallback: return the raw cleaned text as advice
-                # Keep the advice reasonably sized
-                advice_text = cleaned
-                if len(advice_text) > 2000:
-                    advice_text = advice_text[:2000] + "...[truncated]"
+        The method expects `profile` to contain user profile fields and `week_summary` a dict
+        with week_start, week_end and daily_stats (list of objects).
 
-                # Return a safe JSON object the caller expects, using the raw content as advice
-                return {"advice": advice_text, "week_start": week_summary.get("week_start"), "week_end": week_summary.get("week_end"), "daily_stats": week_summary.get("daily_stats")}
+        Returns a dict parsed from the model's JSON output, expected to include at least "advice".
+        """
+        try:
+            return self._run(
+                self._build_request(profile, week_summary),
+                lambda response: self._parse(response, week_summary),
+            )
+        except OutputParseError as e:
+            # Repair didn't help: fall back to the raw text as advice
+            return self._fallback(e.raw, week_summary)
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"AI analysis failed: {e}")
 
+    async def analyze_week_async(self, profile: dict, week_summary: dict) -> dict:
+        """Async variant of `analyze_week`."""
+        try:
+            return await self._arun(
+                self._build_request(profile, week_summary),
+                lambda response: self._parse(response, week_summary),
+            )
+        except OutputParseError as e:
+            return self._fallback(e.raw, week_summary)
+        except LLMUnavailableError:
+            raise
         except Exception as e:
             raise RuntimeError(f"AI analysis failed: {e}")
@@ -1,12 +1,16 @@
+import asyncio
 import base64
-import json
-import os
-import re
-from groq import Groq 
-from app.config import settings
+from app.ai.base import LLMAssistant
+from app.ai.image_prep import prepare_image
+from app.ai.output_parser import parse_json_output
+from app.ai.prompt_registry import prompts
+from app.schemas.llm_schema import ExerciseDetectOutput
 
+# Sent verbatim (contains a literal JSON example)
+prompts.register("exercise_detect")
 
-class ExerciseDetector:
+
+class ExerciseDetector(LLMAssistant):
     """Use Groq vision-capable model to decide whether an image depicts exercise.
 
     The model is asked to return only valid JSON in the following format:
@@ -18,35 +22,26 @@ class ExerciseDetector:
     }
     """
 
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct"
+    task = "exercise_detect"
+    output_schema = ExerciseDetectOutput
 
-    def encode_image(self, image_path: str) -> str:
-        with open(image_path, "rb") as f:
+    def encode_image(self, image: str | bytes) -> str:
+        # Uploads arrive as bytes already in memory; a path is read from disk
+        if isinstance(image, bytes):
+            return base64.b64encode(image).decode("utf-8")
+        with open(image, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
 
-    def validate_image(self, image_path: str) -> dict:
-        """Return parsed JSON with keys: is_exercise, confidence, label, explanation.
-
-        Raises ValueError when LLM output cannot be parsed.
-        """
-
-        # Load prompt
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "exercise_detect.txt")
-
-        try:
-            with open(prompt_path, "r") as fh:
-                system_prompt = fh.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Prompt file not found at {prompt_path}")
+    def _build_request(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        system_prompt = prompts.get("exercise_detect").text
 
         # Encode image into data URL so the multimodal LLM can inspect it
-        base64_image = self.encode_image(image_path)
-        data_url = f"data:image/jpeg;base64,{base64_image}"
+        # Downscaled and re-encoded for the model; may change the MIME type
+        content, mime_type = prepare_image(image, mime_type, self.task)
+        base64_image = self.encode_image(content)
+        data_url = f"data:{mime_type};base64,{base64_image}"
 
-        response = self.client.chat.completions.create(
+        return dict(
             model=self.model_name,
             messages=[
                 {
@@ -66,34 +61,8 @@ class ExerciseDetector:
             stream=False,
         )
 
-        raw_output = response.choices[0].message.content
-        if not raw_output:
-            raise ValueError("LLM returned empty content")
-
-        # Strip markdown fences and search for JSON
-        cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
-
-        if match:
-            json_text = match.group()
-        else:
-            if cleaned.startswith("{") and cleaned.endswith("}"):
-                json_text = cleaned
-            else:
-                raise ValueError(f"No JSON found in AI output: {raw_output}")
-
-        try:
-            parsed = json.loads(json_text)
-        except json.JSONDecodeError:
-            raise ValueError("Failed to parse AI output as JSON")
-
-        # Normalise result and ensure required keys exist
-        if not isinstance(parsed, dict):
-            raise ValueError("Parsed AI output is not a JSON object")
-
-        # Set defaults and validate expected keys
-        if "is_exercise" not in parsed:
-            raise ValueError("AI output missing 'is_exercise' key")
+    def _parse(self, response) -> dict:
+        parsed = parse_json_output(response.choices[0].message.content, ExerciseDetectOutput)
 
         # Provide a safe return object with normalized types
         return {
@@ -103,3 +72,16 @@ class ExerciseDetector:
             "explanation": str(parsed.get("explanation", "")),
             "raw": parsed,
         }
+
+    def validate_image(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        """Return parsed JSON with keys: is_exercise, confidence, label, explanation.
+
+        `image` is a file path or the image bytes. Raises ValueError when LLM output cannot be parsed.
+        """
+        return self._run(self._build_request(image, mime_type), self._parse)
+
+    async def validate_image_async(self, image: str | bytes, mime_type: str = "image/jpeg") -> dict:
+        """Async variant of `validate_image`."""
+        # Image preparation is CPU-bound: keep it off the event loop
+        request = await asyncio.to_thread(self._build_request, image, mime_type)
+        return await self._arun(request, self._parse)
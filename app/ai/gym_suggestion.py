@@ -1,6 +1,8 @@
 import csv
 from datetime import date
 
+from app.utils.dates import app_today
+
 class GymAssistant:
     def __init__(self, csv_file="gyms.csv"):
         """
@@ -29,7 +31,7 @@ class GymAssistant:
         Return gyms matching city and optional pincode.
         """
         if current_date is None:
-            current_date = date.today()
+            current_date = app_today()
 
         city = user_data.get("location", "").strip().lower()
         pincode = str(user_data.get("pincode", "")).strip()
@@ -0,0 +1,88 @@
+"""Downscaling of photos before they are sent to a vision model.
+
+Phone photos are often 4-12 MB, and base64 makes them a third larger again. The model doesn't
+need that resolution to recognise a dish or an exercise. `prepare_image` decodes the photo,
+applies its EXIF orientation and shrinks it so the longest edge is at most
+`VISION_IMAGE_MAX_EDGE`. It then re-encodes the result as JPEG at `VISION_IMAGE_QUALITY`.
+The original is sent instead when it needs neither rotating nor shrinking and is already
+smaller, or when Pillow can't decode it (e.g. HEIC without a plugin).
+
+Bytes before and after (`vision_image_bytes`), bytes saved and the time spent preparing are
+recorded per task. The effect on call latency shows in `llm_call_seconds` for the same task.
+"""
+import io
+import logging
+import time
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("vision_image_bytes", "Size of images for vision calls, before (original) and after (sent) preparation")
+metrics.describe("vision_image_bytes_saved_total", "Bytes removed from vision-call images by downscaling and re-encoding")
+metrics.describe("vision_image_prep_seconds", "Time spent decoding, downscaling and re-encoding an image for a vision call")
+metrics.describe("vision_image_prep_total", "Images prepared for vision calls, by outcome (resized or rotated, reencoded, original, undecodable)")
+
+SIZE_BUCKETS = (50_000, 100_000, 200_000, 400_000, 800_000, 1_500_000, 3_000_000, 6_000_000, 12_000_000)
+PREP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _reencode(content: bytes, max_edge: int, quality: int) -> tuple[bytes, bool]:
+    """(JPEG bytes, whether the image had to be rotated or shrunk)."""
+    with Image.open(io.BytesIO(content)) as image:
+        # Lets the JPEG decoder skip straight to a reduced scale instead of decoding every pixel
+        image.draft("RGB", (max_edge, max_edge))
+        changed = image.getexif().get(0x0112, 1) != 1  # EXIF orientation tag
+        oriented = ImageOps.exif_transpose(image)
+        if max(oriented.size) > max_edge:
+            oriented.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            changed = True
+        if oriented.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha: flatten transparent areas onto white
+            rgba = oriented.convert("RGBA")
+            flat = Image.new("RGB", rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+            oriented = flat
+        out = io.BytesIO()
+        oriented.convert("RGB").save(out, "JPEG", quality=quality, optimize=True)
+        return out.getvalue(), changed
+
+
+def prepare_image(image: str | bytes, mime_type: str = "image/jpeg", task: str = "vision") -> tuple[bytes, str]:
+    """The (bytes, mime type) to send to the model for `image` (a file path or the image bytes)."""
+    if not isinstance(image, bytes):
+        with open(image, "rb") as f:
+            image = f.read()
+    if not settings.VISION_IMAGE_PREP_ENABLED:
+        return image, mime_type
+
+    start = time.perf_counter()
+    try:
+        prepared, changed = _reencode(image, settings.VISION_IMAGE_MAX_EDGE, settings.VISION_IMAGE_QUALITY)
+    except Exception as e:
+        logger.info("Sending %s image as uploaded, could not prepare it: %s", task, e)
+        prepared, changed = None, False
+    elapsed = time.perf_counter() - start
+
+    if prepared is None:
+        outcome = "undecodable"
+    elif changed:
+        outcome = "resized"
+    elif len(prepared) < len(image):
+        outcome = "reencoded"
+    else:
+        outcome = "original"
+    if outcome in ("undecodable", "original"):
+        prepared = image
+    else:
+        mime_type = "image/jpeg"
+
+    metrics.inc("vision_image_prep_total", {"task": task, "outcome": outcome})
+    metrics.observe("vision_image_prep_seconds", elapsed, {"task": task}, buckets=PREP_BUCKETS)
+    metrics.observe("vision_image_bytes", len(image), {"task": task, "stage": "original"}, buckets=SIZE_BUCKETS)
+    metrics.observe("vision_image_bytes", len(prepared), {"task": task, "stage": "sent"}, buckets=SIZE_BUCKETS)
+    metrics.inc("vision_image_bytes_saved_total", {"task": task}, len(image) - len(prepared))
+    return prepared, mime_type
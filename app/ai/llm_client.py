@@ -0,0 +1,159 @@
+import threading
+from contextvars import ContextVar
+
+import httpx
+from groq import AsyncGroq, Groq
+
+from app.config import settings
+
+# Task of the assistant making the current completion call (set by LLMAssistant). Providers that
+# answer by task, like the offline stub, read it; real providers ignore it.
+current_task: ContextVar[str] = ContextVar("llm_current_task", default="")
+
+
+class LLMProvider:
+    """Builds the chat-completions clients the assistants talk to.
+
+    A client only needs what `LLMAssistant` uses: `chat.completions.create(**request)` returning
+    an OpenAI-style completion (or a chunk iterator when `stream=True`), and `close()`. The
+    async client mirrors it with coroutines.
+    """
+
+    name = ""
+
+    def build_client(self):
+        raise NotImplementedError
+
+    def build_async_client(self):
+        raise NotImplementedError
+
+
+class GroqProvider(LLMProvider):
+    """Groq API over pooled, keep-alive HTTP transports (the default)."""
+
+    name = "groq"
+
+    def _build_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        )
+
+    def _build_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+    def build_client(self) -> Groq:
+        http_client = httpx.Client(limits=self._build_limits(), timeout=self._build_timeout())
+        return Groq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=http_client,
+            timeout=self._build_timeout(),
+            max_retries=settings.LLM_MAX_RETRIES,
+        )
+
+    def build_async_client(self) -> AsyncGroq:
+        http_client = httpx.AsyncClient(limits=self._build_limits(), timeout=self._build_timeout())
+        return AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=http_client,
+            timeout=self._build_timeout(),
+            max_retries=settings.LLM_MAX_RETRIES,
+        )
+
+
+class StubProvider(LLMProvider):
+    """Offline canned replies for load testing (see app/ai/stub_provider.py)."""
+
+    name = "stub"
+
+    def __init__(self):
+        self._backend = None
+
+    def _shared_backend(self):
+        from app.ai.stub_provider import _StubBackend
+
+        if self._backend is None:
+            self._backend = _StubBackend()
+        return self._backend
+
+    def build_client(self):
+        from app.ai.stub_provider import StubClient
+        return StubClient(self._shared_backend())
+
+    def build_async_client(self):
+        from app.ai.stub_provider import AsyncStubClient
+        return AsyncStubClient(self._shared_backend())
+
+
+PROVIDERS = {provider.name: provider for provider in (GroqProvider, StubProvider)}
+
+
+def get_provider(name: str | None = None) -> LLMProvider:
+    name = (name or settings.LLM_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+class LLMClientManager:
+    """Own the process-wide LLM clients and their pooled HTTP transports.
+
+    Every assistant in `app/ai/` used to build its own `Groq(...)` client per request, which
+    meant a fresh connection pool (and TLS handshake) on every call. The manager builds one
+    sync and one async client lazily from the configured provider (LLM_PROVIDER), keeps
+    connections alive between requests and is closed from the app lifespan.
+    """
+
+    def __init__(self, provider: LLMProvider | None = None):
+        self._lock = threading.Lock()
+        self._provider = provider
+        self._client = None
+        self._async_client = None
+
+    @property
+    def provider(self) -> LLMProvider:
+        if self._provider is None:
+            self._provider = get_provider()
+        return self._provider
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.provider.build_client()
+        return self._client
+
+    def get_async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = self.provider.build_async_client()
+        return self._async_client
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close both clients (used by the app lifespan)."""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.close()
+        self.close()
+
+
+llm_clients = LLMClientManager()
+
+
+def get_llm_client():
+    """Return the shared sync client (created on first use)."""
+    return llm_clients.get_client()
+
+
+def get_async_llm_client():
+    """Return the shared async client (created on first use)."""
+    return llm_clients.get_async_client()
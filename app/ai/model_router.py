@@ -0,0 +1,130 @@
+"""Per-task model routing with latency-based fallback.
+
+Each task maps to an ordered list of routes (model + max_tokens): the primary first, then
+fallbacks. Calls go to the first route whose model is healthy: its circuit breaker is not open,
+and its observed p95 latency for the task (over the last LLM_ROUTE_WINDOW seconds, once
+LLM_ROUTE_MIN_SAMPLES calls were seen) is within the task's SLO (LLM_LATENCY_SLOS). When every
+route breaks the SLO the fastest one is used. Samples age out of the window, so a primary that
+was skipped gets traffic again once its slow samples have expired.
+
+The defaults below keep the previous behaviour (one model, the assistants' old max_tokens) as
+the primary; LLM_MODEL_ROUTES (JSON) replaces the routes of any task it lists.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from app.ai import resilience
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_route_selected_total", "Model chosen by the router, by task and model")
+metrics.describe("llm_route_p95_seconds", "Observed p95 latency per task and model used for routing")
+
+SCOUT = "meta-llama/llama-4-scout-17b-16e-instruct"
+MAVERICK = "meta-llama/llama-4-maverick-17b-128e-instruct"
+INSTANT = "llama-3.1-8b-instant"
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    model: str
+    max_tokens: int | None = None
+
+
+# Vision tasks (images in the prompt) may only fall back to vision-capable models
+DEFAULT_ROUTES = {
+    "exercise_detect": [ModelRoute(SCOUT, 256), ModelRoute(MAVERICK, 256)],
+    "calorie_detect": [ModelRoute(SCOUT, 1024), ModelRoute(MAVERICK, 1024)],
+    "chat": [ModelRoute(SCOUT, 1000), ModelRoute(INSTANT, 800)],
+    "chat_summary": [ModelRoute(SCOUT, 300), ModelRoute(INSTANT, 300)],
+    "diet": [ModelRoute(SCOUT, 3000), ModelRoute(INSTANT, 3000)],
+    "custom_diet": [ModelRoute(SCOUT, 3000), ModelRoute(INSTANT, 3000)],
+    "workout": [ModelRoute(SCOUT, 3000), ModelRoute(INSTANT, 3000)],
+    "weekly_analysis": [ModelRoute(SCOUT, 512), ModelRoute(INSTANT, 512)],
+}
+
+
+def load_routes(overrides: dict | None = None) -> dict[str, list[ModelRoute]]:
+    """Default routes with LLM_MODEL_ROUTES applied, e.g.
+    {"chat": [{"model": "llama-3.3-70b-versatile", "max_tokens": 800}, {"model": "llama-3.1-8b-instant"}]}
+    """
+    routes = dict(DEFAULT_ROUTES)
+    for task, entries in (settings.LLM_MODEL_ROUTES if overrides is None else overrides).items():
+        routes[task] = [ModelRoute(e["model"], e.get("max_tokens")) for e in entries]
+    return routes
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct * len(ordered)) - 1)]
+
+
+class ModelRouter:
+    def __init__(self, routes: dict | None = None, slos: dict | None = None, window: float | None = None,
+                 min_samples: int | None = None, clock=time.monotonic):
+        self.routes = load_routes() if routes is None else routes
+        self.slos = settings.LLM_LATENCY_SLOS if slos is None else slos
+        self.window = settings.LLM_ROUTE_WINDOW if window is None else window
+        self.min_samples = settings.LLM_ROUTE_MIN_SAMPLES if min_samples is None else min_samples
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples: dict[tuple[str, str], deque] = {}
+        self._current: dict[str, str] = {}
+
+    def observe(self, task: str, model: str, latency: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((task, model), deque(maxlen=1000))
+            samples.append((self._clock(), latency))
+
+    def p95(self, task: str, model: str) -> float | None:
+        """p95 latency within the window, or None while there are too few samples to judge."""
+        with self._lock:
+            samples = self._samples.get((task, model))
+            if not samples:
+                return None
+            cutoff = self._clock() - self.window
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            if len(samples) < max(1, self.min_samples):
+                return None
+            value = percentile([latency for _, latency in samples], 0.95)
+        metrics.set_gauge("llm_route_p95_seconds", value, {"task": task, "model": model})
+        return value
+
+    def choose(self, task: str) -> ModelRoute | None:
+        routes = self.routes.get(task)
+        if not routes:
+            return None
+        candidates = [r for r in routes if resilience.breakers.get(r.model).available()] or routes
+        slo = self.slos.get(task)
+        choice = candidates[0]
+        if slo is not None:
+            observed = [(r, self.p95(task, r.model)) for r in candidates]
+            within = [r for r, p in observed if p is None or p <= slo]
+            choice = within[0] if within else min(observed, key=lambda item: item[1])[0]
+
+        if self._current.get(task) != choice.model:
+            if task in self._current:
+                logger.warning("Routing %s: %s -> %s", task, self._current[task], choice.model)
+            self._current[task] = choice.model
+        metrics.inc("llm_route_selected_total", {"task": task, "model": choice.model})
+        return choice
+
+    def route(self, task: str, request: dict, keep_max_tokens: bool = False) -> dict:
+        """Return `request` pointed at the chosen model (and its max_tokens unless `keep_max_tokens`)."""
+        choice = self.choose(task)
+        if choice is None:
+            return request
+        routed = {**request, "model": choice.model}
+        if choice.max_tokens and not keep_max_tokens:
+            routed["max_tokens"] = choice.max_tokens
+        return routed
+
+
+model_router = ModelRouter()
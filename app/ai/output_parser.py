@@ -0,0 +1,289 @@
+"""Shared parsing of JSON output from the LLM.
+
+`parse_json_output` pulls the JSON object out of a reply and validates it against a pydantic
+schema from app/schemas/llm_schema.py. It handles markdown fences, leading/trailing prose,
+Python-style quoting, trailing commas and output cut off by max_tokens. Apostrophes inside
+strings ("chef's salad") are left alone. The object is decoded member by member, so when
+part of it is broken the error says which members parsed and which raw text did not. The
+assistant can then ask the model to repair only that part (`build_repair_request`) and
+splice the answer back in (`merge_repair`).
+"""
+import json
+import re
+
+from pydantic import BaseModel, ValidationError
+
+_decoder = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json|JSON)?")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+REPAIR_SYSTEM_PROMPT = (
+    "You fix malformed JSON produced by another model. Reply with one valid JSON object only, "
+    "no markdown and no commentary. Keep every value the fragment already contains; only fix "
+    "syntax and fill required fields that are missing or have the wrong type."
+)
+
+
+class OutputParseError(ValueError):
+    """LLM output could not be turned into the expected JSON object.
+
+    `good` holds the top-level members that parsed and validated; `broken` is the raw text (or
+    JSON) of the part that did not. `repairable` is False when there is nothing to salvage
+    (e.g. no JSON object at all), in which case only a full regeneration helps.
+    """
+
+    def __init__(self, message: str, raw: str = "", good: dict | None = None, broken: str = "",
+                 repairable: bool = False):
+        super().__init__(message)
+        self.raw = raw
+        self.good = good or {}
+        self.broken = broken
+        self.repairable = repairable
+
+
+def strip_fences(text: str) -> str:
+    return _FENCE_RE.sub("", text).strip()
+
+
+def _normalise_fragment(text: str):
+    """Best-effort decode of a single JSON value that strict json rejected."""
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", text).strip()
+    try:
+        return _decoder.raw_decode(candidate)[0]
+    except json.JSONDecodeError:
+        pass
+    # Python repr style ({'a': "chef's", 'b': True})
+    return _decoder.raw_decode(_requote(candidate))[0]
+
+
+def _requote(text: str) -> str:
+    """Turn single-quoted strings and Python literals into JSON without touching apostrophes
+    inside double-quoted strings (a blanket replace("'", '"') would corrupt "chef's salad")."""
+    out = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            quote = ch
+            j = i + 1
+            chars = []
+            while j < len(text) and text[j] != quote:
+                if text[j] == "\\" and j + 1 < len(text):
+                    nxt = text[j + 1]
+                    chars.append(nxt if nxt == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' and quote == "'" else text[j])
+                j += 1
+            out.append('"' + "".join(chars) + '"')
+            i = j + 1
+            continue
+        word = re.match(r"True|False|None", text[i:])
+        if word and (i == 0 or not text[i - 1].isalnum()):
+            out.append(_PY_LITERALS[word.group()])
+            i += len(word.group())
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def close_truncated(text: str) -> str:
+    """Close strings and brackets left open when the reply was cut off (finish_reason=length)."""
+    stack = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r"[,:\s]+$", "", text)
+    # A dangling key without a value ("key") can't be completed; drop it
+    text = re.sub(r',\s*"[^"]*"$', "", text)
+    return text + "".join(reversed(stack))
+
+
+def _skip_ws(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def _scan_value_end(text: str, i: int) -> int:
+    """Index just past the top-level value starting at `i` (bracket/string aware, never raises)."""
+    depth = 0
+    in_string = escaped = False
+    quote = None
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                in_string = False
+        elif ch in "\"'":
+            in_string, quote = True, ch
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            if depth == 0:
+                return i
+            depth -= 1
+        elif ch == "," and depth == 0:
+            return i
+        i += 1
+    return i
+
+
+def parse_members(text: str) -> tuple[dict, str]:
+    """Decode a JSON object one top-level member at a time.
+
+    Returns (members that decoded, raw text of the members that did not). The second value is
+    empty when the whole object parsed.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise OutputParseError("No JSON object found in AI output", raw=text)
+
+    members: dict = {}
+    broken: list[str] = []
+    i = _skip_ws(text, start + 1)
+    while i < len(text) and text[i] != "}":
+        member_start = i
+        value_end = _scan_value_end(text, i)
+        chunk = text[member_start:value_end]
+        try:
+            key_match = re.match(r"""\s*(["'])(.*?)(?<!\\)\1\s*:\s*""", chunk, re.DOTALL)
+            if not key_match:
+                raise ValueError("missing key")
+            key = json.loads(f'"{key_match.group(2)}"') if key_match.group(1) == '"' else key_match.group(2)
+            value_text = chunk[key_match.end():]
+            members[key] = _normalise_fragment(value_text)
+        except ValueError:
+            if chunk.strip():
+                broken.append(chunk.strip())
+        i = _skip_ws(text, value_end + 1) if value_end < len(text) and text[value_end] == "," else value_end
+    return members, ",\n".join(broken)
+
+
+def extract_json(text: str):
+    """Return the JSON value in `text`, tolerating prose around it and common model mistakes."""
+    if not text or not isinstance(text, str):
+        raise OutputParseError("LLM returned empty or invalid content", raw=text or "")
+    cleaned = strip_fences(text)
+    start = min((p for p in (cleaned.find("{"), cleaned.find("[")) if p >= 0), default=-1)
+    if start < 0:
+        raise OutputParseError("No JSON found in AI output", raw=text)
+    body = cleaned[start:]
+    try:
+        return _decoder.raw_decode(body)[0]
+    except json.JSONDecodeError:
+        pass
+    try:
+        return _normalise_fragment(body)
+    except ValueError:
+        pass
+    try:
+        return _normalise_fragment(close_truncated(body))
+    except ValueError:
+        raise OutputParseError("Failed to parse AI output as JSON", raw=text)
+
+
+def _validate(schema: type[BaseModel], value):
+    model = schema.model_validate(value)
+    return model.model_dump(mode="json", exclude_unset=True)
+
+
+def parse_json_output(text: str, schema: type[BaseModel] | None = None):
+    """Extract and (optionally) validate a JSON object from an LLM reply.
+
+    Raises OutputParseError. When only some members are broken or fail validation the error is
+    `repairable`, carrying the good members and the broken fragment.
+    """
+    try:
+        value = extract_json(text)
+    except OutputParseError:
+        cleaned = strip_fences(text or "")
+        if "{" not in cleaned:
+            raise
+        good, broken = parse_members(close_truncated(cleaned[cleaned.find("{"):]))
+        raise OutputParseError(
+            "Failed to parse AI output as JSON", raw=text, good=good, broken=broken,
+            repairable=bool(broken),
+        )
+
+    if schema is None:
+        return value
+    try:
+        return _validate(schema, value)
+    except ValidationError as e:
+        if not isinstance(value, dict):
+            raise OutputParseError(f"AI output does not match the expected format: {e}", raw=text)
+        # Top-level members named in the errors are the broken part (all of it for root errors)
+        bad_keys = {err["loc"][0] for err in e.errors() if err["loc"] and err["loc"][0] in value}
+        missing = {err["loc"][0] for err in e.errors() if err["loc"] and err["type"] == "missing"}
+        if not bad_keys and not missing:
+            raise OutputParseError(f"AI output does not match the expected format: {e}", raw=text)
+        good = {k: v for k, v in value.items() if k not in bad_keys}
+        broken = json.dumps({k: value[k] for k in bad_keys}, ensure_ascii=False)
+        problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        raise OutputParseError(
+            f"AI output does not match the expected format: {problems}", raw=text, good=good,
+            broken=broken, repairable=True,
+        )
+
+
+def schema_hint(schema: type[BaseModel]) -> str:
+    return json.dumps(schema.model_json_schema(), separators=(",", ":"))
+
+
+def build_repair_request(model: str, error: OutputParseError, schema: type[BaseModel] | None) -> dict:
+    """A small completion request that asks only for the broken members to be fixed."""
+    lines = [
+        f"Problem: {error}",
+        "The broken part of a larger JSON object is below. Return a JSON object containing only "
+        "these members, fixed. Use the same keys.",
+    ]
+    if error.good:
+        lines.append(f"Members that are already fine (do not return them): {', '.join(map(str, error.good))}")
+    if schema is not None:
+        lines.append(f"JSON schema of the full object: {schema_hint(schema)}")
+    lines.append(f"Broken part:\n{error.broken}")
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n\n".join(lines)},
+        ],
+        temperature=0,
+        # Roughly twice the fragment's size in tokens (~4 chars/token), within sane bounds
+        max_tokens=max(256, min(3000, len(error.broken) // 2)),
+    )
+
+
+def merge_repair(error: OutputParseError, repaired_text: str, schema: type[BaseModel] | None) -> str:
+    """Splice the repaired members into the good ones and return the full, valid JSON text."""
+    repaired = extract_json(repaired_text)
+    if not isinstance(repaired, dict):
+        raise OutputParseError("Repair did not return a JSON object", raw=repaired_text)
+    merged = {**error.good, **repaired}
+    if schema is not None:
+        try:
+            _validate(schema, merged)
+        except ValidationError as e:
+            raise OutputParseError(f"Repaired output still invalid: {e}", raw=repaired_text)
+    return json.dumps(merged, ensure_ascii=False)
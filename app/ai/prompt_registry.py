@@ -0,0 +1,168 @@
+import logging
+import os
+import string
+import threading
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompt")
+
+
+class PromptValidationError(ValueError):
+    """Raised when a prompt template uses placeholders its assistant does not supply."""
+
+
+class PromptTemplate:
+    """An immutable, pre-parsed prompt file.
+
+    `fields` holds the top-level `str.format` placeholders, or None when the text is not a
+    valid format string. Raw prompts that embed literal JSON examples are registered without
+    keys and sent verbatim, so their `fields` are never used.
+    """
+
+    def __init__(self, name: str, path: str, text: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+        self.fields = self._parse_fields(text)
+
+    @staticmethod
+    def _parse_fields(text: str):
+        try:
+            parsed = string.Formatter().parse(text)
+            fields = set()
+            for _, field_name, _, _ in parsed:
+                if field_name is None:
+                    continue
+                # "profile.name" / "items[0]" -> root key passed to format()
+                fields.add(field_name.split(".", 1)[0].split("[", 1)[0])
+            return frozenset(fields)
+        except ValueError:
+            return None
+
+    def render(self, **kwargs) -> str:
+        return self.text.format(**kwargs)
+
+
+class PromptRegistry:
+    """Load every `app/prompt/*.txt` once and hand out parsed templates.
+
+    Assistants register the prompt they use together with the format keys they pass
+    (`keys=None` for prompts sent verbatim). Registration validates the template immediately,
+    so a missing placeholder fails at import/boot time instead of on the first user request.
+
+    `get()` stats the file at most once every `reload_interval` seconds and swaps in the new
+    template when its mtime changes. A reloaded template that fails validation is rejected and
+    the previous version keeps serving.
+    """
+
+    def __init__(self, prompt_dir: str = PROMPT_DIR, reload_interval: float | None = None):
+        self.prompt_dir = prompt_dir
+        self.reload_interval = settings.PROMPT_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._lock = threading.Lock()
+        self._templates: dict[str, PromptTemplate] = {}
+        self._keys: dict[str, frozenset | None] = {}
+        self._last_check: dict[str, float] = {}
+        # mtime of the last file version we looked at, accepted or not
+        self._seen_mtime: dict[str, float] = {}
+        self.load_all()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.prompt_dir, f"{name}.txt")
+
+    def _read(self, name: str) -> PromptTemplate:
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "r") as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt file not found at {path}")
+        return PromptTemplate(name, path, text, mtime)
+
+    def _store(self, template: PromptTemplate) -> None:
+        # Callers hold self._lock
+        self._templates[template.name] = template
+        self._seen_mtime[template.name] = template.mtime
+        self._last_check[template.name] = time.monotonic()
+
+    def _validate(self, template: PromptTemplate, keys) -> None:
+        if keys is None:
+            return
+        if template.fields is None:
+            raise PromptValidationError(f"Prompt '{template.name}' is not a valid format template")
+        missing = template.fields - keys
+        if missing:
+            raise PromptValidationError(
+                f"Prompt '{template.name}' uses placeholders not supplied by its assistant: {sorted(missing)}"
+            )
+
+    def load_all(self) -> None:
+        if not os.path.isdir(self.prompt_dir):
+            return
+        with self._lock:
+            for filename in sorted(os.listdir(self.prompt_dir)):
+                if filename.endswith(".txt"):
+                    self._store(self._read(filename[:-4]))
+
+    def register(self, name: str, keys=None) -> PromptTemplate:
+        """Declare the format keys an assistant passes for `name` and validate the template."""
+        frozen = frozenset(keys) if keys is not None else None
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                template = self._read(name)
+                self._store(template)
+            self._validate(template, frozen)
+            self._keys[name] = frozen
+        return template
+
+    def _maybe_reload(self, name: str, current: PromptTemplate) -> PromptTemplate:
+        now = time.monotonic()
+        if now - self._last_check.get(name, 0.0) < self.reload_interval:
+            return current
+        self._last_check[name] = now
+        try:
+            mtime = os.stat(current.path).st_mtime
+        except FileNotFoundError:
+            logger.error("Prompt file %s disappeared; keeping the loaded version", current.path)
+            return current
+        if mtime == self._seen_mtime.get(name):
+            return current
+
+        try:
+            fresh = self._read(name)
+            self._validate(fresh, self._keys.get(name))
+        except (OSError, PromptValidationError) as e:
+            logger.error("Rejected reload of prompt '%s': %s", name, e)
+            # Don't re-read the broken file on every call; wait for the next change
+            self._seen_mtime[name] = mtime
+            return current
+
+        with self._lock:
+            self._store(fresh)
+        logger.info("Reloaded prompt '%s'", name)
+        return fresh
+
+    def get(self, name: str) -> PromptTemplate:
+        template = self._templates.get(name)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(name)
+                if template is None:
+                    template = self._read(name)
+                    self._store(template)
+            return template
+        if self.reload_interval >= 0:
+            template = self._maybe_reload(name, template)
+        return template
+
+    def render(self, prompt_name: str, /, **kwargs) -> str:
+        return self.get(prompt_name).render(**kwargs)
+
+
+prompts = PromptRegistry()
@@ -0,0 +1,309 @@
+"""Deadlines, retries, hedging and circuit breaking for LLM calls.
+
+Every chat completion made through `LLMAssistant` runs inside `call` (sync) or `acall`
+(async). A call gets one overall deadline per task (LLM_DEADLINES); attempts that fail with a
+retryable error (timeouts, connection errors, 408/409/429/5xx) are retried with full-jitter
+exponential backoff as long as the deadline allows. Tasks listed in LLM_HEDGE_AFTER get a
+second, hedged request when the first has not answered in time (async only), and whichever
+finishes first wins. A per-model circuit breaker fails fast with `LLMUnavailableError` while the
+provider keeps failing, then lets a single probe through after LLM_BREAKER_RESET_TIMEOUT.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from groq import APIConnectionError
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_retries_total", "LLM call retries by task and reason")
+metrics.describe("llm_deadline_exceeded_total", "LLM calls abandoned because the task deadline ran out")
+metrics.describe("llm_hedges_total", "Hedged LLM requests by task and result (launched, won)")
+metrics.describe("llm_circuit_state", "Circuit breaker state per breaker (0 closed, 1 half-open, 2 open)")
+metrics.describe("llm_circuit_transitions_total", "Circuit breaker state transitions")
+metrics.describe("llm_circuit_rejections_total", "LLM calls rejected while the circuit was open")
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class LLMUnavailableError(RuntimeError):
+    """The provider is degraded: the breaker is open, or retries/deadline ran out.
+
+    `retry_after` (seconds) is a hint for clients; the app maps this error to a 503.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, APIConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS or (isinstance(status, int) and status >= 500)
+
+
+def _reason(exc: BaseException) -> str:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return str(status)
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    return "connection"
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Seconds from the provider's Retry-After header, when it sent a numeric one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given zero-based retry number."""
+    cap = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def task_deadline(task: str) -> float:
+    return settings.LLM_DEADLINES.get(task, settings.LLM_TIMEOUT)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; open -> half-open after
+    `reset_timeout`; half-open lets one probe through and closes on success, re-opens on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int | None = None, reset_timeout: float | None = None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = (settings.LLM_BREAKER_FAILURE_THRESHOLD
+                                  if failure_threshold is None else failure_threshold)
+        self.reset_timeout = settings.LLM_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set_gauge("llm_circuit_state", 0, {"breaker": name})
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("LLM circuit %s: %s -> %s", self.name, self.state, state)
+        metrics.inc("llm_circuit_transitions_total", {"breaker": self.name, "from": self.state, "to": state})
+        metrics.set_gauge("llm_circuit_state", _STATE_VALUES[state], {"breaker": self.name})
+        self.state = state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe slot when half-open)."""
+        with self._lock:
+            if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+        metrics.inc("llm_circuit_rejections_total", {"breaker": self.name})
+        return False
+
+    def available(self) -> bool:
+        """False while open and still inside the reset timeout (used by the model router)."""
+        with self._lock:
+            return not (self.state == OPEN and self._clock() - self._opened_at < self.reset_timeout)
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 1.0
+            return max(1.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """Give back a half-open probe slot whose call was cancelled without an outcome."""
+        with self._lock:
+            self._probing = False
+
+
+class BreakerRegistry:
+    """One breaker per model, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name)
+            return breaker
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+breakers = BreakerRegistry()
+
+
+def _open_error(breaker: CircuitBreaker) -> LLMUnavailableError:
+    return LLMUnavailableError(
+        f"AI provider temporarily unavailable (circuit {breaker.name} open)", breaker.retry_after(),
+    )
+
+
+def _next_delay(exc: BaseException, task: str, breaker: CircuitBreaker, attempt: int, deadline: float):
+    """Record a failed attempt and return how long to wait before retrying.
+
+    Returns None for non-retryable errors (the caller re-raises them as-is) and raises
+    LLMUnavailableError when the retry budget or the deadline is exhausted.
+    """
+    if isinstance(exc, LLMUnavailableError):
+        # Rejected before reaching the provider (e.g. scheduler queue): not a provider failure
+        breaker.release()
+        return None
+    if not is_retryable(exc):
+        # The provider answered; a bad request says nothing about its health
+        breaker.record_success()
+        return None
+    breaker.record_failure()
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        metrics.inc("llm_deadline_exceeded_total", {"task": task})
+        raise LLMUnavailableError(f"AI request for {task} exceeded its {task_deadline(task):g}s deadline") from exc
+    if attempt + 1 >= settings.LLM_RETRY_ATTEMPTS:
+        raise LLMUnavailableError(
+            f"AI provider unavailable after {attempt + 1} attempts: {exc}", retry_after(exc),
+        ) from exc
+
+    delay = max(backoff_delay(attempt), retry_after(exc) or 0.0)
+    if delay >= remaining:
+        metrics.inc("llm_deadline_exceeded_total", {"task": task})
+        raise LLMUnavailableError(f"AI provider unavailable: {exc}", retry_after(exc)) from exc
+    metrics.inc("llm_retries_total", {"task": task, "reason": _reason(exc)})
+    logger.info("Retrying %s in %.2fs after %s", task, delay, exc)
+    return delay
+
+
+def call(fn, task: str, breaker: CircuitBreaker):
+    """Run `fn(timeout)` with the task's deadline, retries and circuit breaker.
+
+    `fn` receives the seconds left before the deadline and should pass them on as the
+    request timeout.
+    """
+    deadline = time.monotonic() + task_deadline(task)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise _open_error(breaker)
+        try:
+            result = fn(max(0.0, deadline - time.monotonic()))
+        except Exception as exc:
+            delay = _next_delay(exc, task, breaker, attempt, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def _hedged(fn, timeout: float, hedge_after: float, task: str):
+    """Await `fn`, starting a second identical request if the first is still running after
+    `hedge_after` seconds; the first successful result wins and the other is cancelled."""
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    primary = asyncio.ensure_future(fn(timeout))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        metrics.inc("llm_hedges_total", {"task": task, "result": "launched"})
+        backup = asyncio.ensure_future(fn(max(0.0, end - loop.time())))
+        tasks.append(backup)
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, end - loop.time()), return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for finished in done:
+                if finished.exception() is None:
+                    if finished is backup:
+                        metrics.inc("llm_hedges_total", {"task": task, "result": "won"})
+                    return finished.result()
+                error = finished.exception()
+        raise error
+    finally:
+        for pending_task in tasks:
+            if not pending_task.done():
+                pending_task.cancel()
+
+
+async def acall(fn, task: str, breaker: CircuitBreaker, hedge: bool = True):
+    """Async variant of `call`; `fn(timeout)` returns an awaitable.
+
+    Each attempt is also bounded with `asyncio.wait_for`, and the first attempt of tasks in
+    LLM_HEDGE_AFTER is hedged unless `hedge` is False (e.g. streaming requests).
+    """
+    deadline = time.monotonic() + task_deadline(task)
+    hedge_after = settings.LLM_HEDGE_AFTER.get(task) if hedge else None
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise _open_error(breaker)
+        remaining = max(0.0, deadline - time.monotonic())
+        try:
+            if attempt == 0 and hedge_after and hedge_after < remaining and breaker.state == CLOSED:
+                result = await _hedged(fn, remaining, hedge_after, task)
+            else:
+                result = await asyncio.wait_for(fn(remaining), remaining)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as exc:
+            delay = _next_delay(exc, task, breaker, attempt, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_cache_requests_total", "LLM response cache lookups by task and result")
+
+
+def make_cache_key(request: dict) -> str:
+    """Content-address a completion request by model, rendered messages, temperature and max_tokens."""
+    material = {
+        "model": request.get("model"),
+        "messages": request.get("messages"),
+        "temperature": request.get("temperature"),
+        "max_tokens": request.get("max_tokens"),
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of raw LLM completion text.
+
+    Tier 1 is an in-process LRU with per-entry TTL. Tier 2 (optional) is the
+    `llm_response_cache` table so entries survive restarts and are shared between workers.
+    Only the completion text is stored; callers re-run their normal parsing on a hit.
+    Persistent-tier failures are logged and treated as misses, never surfaced to users.
+    """
+
+    def __init__(self, max_entries: int | None = None, persistent: bool | None = None, session_factory=None):
+        self.max_entries = settings.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.persistent = settings.LLM_CACHE_PERSISTENT if persistent is None else persistent
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    def _record(self, task: str, result: str) -> None:
+        if result == "miss":
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.inc("llm_cache_requests_total", {"task": task, "result": result})
+
+    # -- tier 1 -------------------------------------------------------------------------
+
+    def _get_memory(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, content = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content
+
+    def _set_memory(self, key: str, content: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # -- tier 2 -------------------------------------------------------------------------
+
+    def _get_persistent(self, key: str) -> tuple[str, float] | None:
+        from app.models import LLMResponseCacheEntry
+
+        now = datetime.now(timezone.utc)
+        try:
+            with self._sessions()() as db:
+                row = db.query(LLMResponseCacheEntry).filter(
+                    LLMResponseCacheEntry.cache_key == key,
+                    LLMResponseCacheEntry.expires_at > now,
+                ).first()
+                if row is None:
+                    return None
+                expires_at = row.expires_at
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                return row.content, (expires_at - now).total_seconds()
+        except Exception as e:
+            logger.warning("LLM cache read failed: %s", e)
+            return None
+
+    def _set_persistent(self, key: str, content: str, ttl: float, task: str, model: str | None) -> None:
+        from app.models import LLMResponseCacheEntry
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        try:
+            with self._sessions()() as db:
+                db.merge(LLMResponseCacheEntry(
+                    cache_key=key, task=task, model=model, content=content, expires_at=expires_at,
+                ))
+                db.commit()
+        except Exception as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    # -- public API ---------------------------------------------------------------------
+
+    def get(self, key: str, task: str = "") -> str | None:
+        content = self._get_memory(key)
+        if content is not None:
+            self._record(task, "hit_memory")
+            return content
+        if self.persistent:
+            found = self._get_persistent(key)
+            if found is not None:
+                content, remaining = found
+                self._set_memory(key, content, remaining)
+                self._record(task, "hit_db")
+                return content
+        self._record(task, "miss")
+        return None
+
+    def set(self, key: str, content: str, ttl: float, task: str = "", model: str | None = None) -> None:
+        if ttl <= 0 or not content:
+            return
+        self._set_memory(key, content, ttl)
+        if self.persistent:
+            self._set_persistent(key, content, ttl, task, model)
+
+    async def aget(self, key: str, task: str = "") -> str | None:
+        """Async lookup: the memory tier is checked inline, the DB tier in a worker thread."""
+        content = self._get_memory(key)
+        if content is not None:
+            self._record(task, "hit_memory")
+            return content
+        if self.persistent:
+            found = await asyncio.to_thread(self._get_persistent, key)
+            if found is not None:
+                content, remaining = found
+                self._set_memory(key, content, remaining)
+                self._record(task, "hit_db")
+                return content
+        self._record(task, "miss")
+        return None
+
+    async def aset(self, key: str, content: str, ttl: float, task: str = "", model: str | None = None) -> None:
+        if ttl <= 0 or not content:
+            return
+        self._set_memory(key, content, ttl)
+        if self.persistent:
+            await asyncio.to_thread(self._set_persistent, key, content, ttl, task, model)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,302 @@
+"""Priority-aware admission control in front of every LLM call.
+
+Each model gets a `ModelScheduler` with a requests-per-minute and a tokens-per-minute token
+bucket, a cap on in-flight calls and a bounded wait queue. Waiting calls are admitted strictly
+by priority class, then arrival order, so a burst of plan generation queues behind interactive
+chat instead of pushing it into provider rate limits. Sync callers (threads) and async callers
+share the same queue; the state is guarded by a thread lock and waiters are woken through a
+`threading.Event` or their event loop.
+
+A call that cannot be admitted (queue full, or its deadline runs out while waiting) raises
+`LLMUnavailableError`, which the app turns into a 503.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from app.ai.chat_context import estimate_tokens
+from app.ai.resilience import LLMUnavailableError
+from app.config import settings
+from app.utils.metrics import metrics
+
+metrics.describe("llm_queue_depth", "LLM calls waiting for admission, by model and priority class")
+metrics.describe("llm_queue_wait_seconds", "Time LLM calls spent waiting for admission")
+metrics.describe("llm_queue_rejections_total", "LLM calls rejected by the scheduler (queue full or wait timeout)")
+metrics.describe("llm_in_flight", "LLM calls currently admitted, by model")
+
+# Lower value = served first
+PRIORITY_CLASSES = ["interactive", "validation", "calorie", "generation", "background"]
+TASK_PRIORITIES = {
+    "chat": 0,
+    "exercise_detect": 1,
+    "calorie_detect": 2,
+    "diet": 3,
+    "custom_diet": 3,
+    "workout": 3,
+    "weekly_analysis": 4,
+    "chat_summary": 4,
+}
+DEFAULT_PRIORITY = 3
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def task_priority(task: str) -> int:
+    return TASK_PRIORITIES.get(task, DEFAULT_PRIORITY)
+
+
+def estimate_request_tokens(request: dict) -> int:
+    """Rough token cost of a completion request: prompt text plus the reserved completion.
+
+    Image parts are not counted; the provider bills them separately from the text limit.
+    """
+    prompt = 0
+    for message in request.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            prompt += estimate_tokens(content)
+        elif isinstance(content, list):
+            prompt += sum(estimate_tokens(part.get("text") or "") for part in content if part.get("type") == "text")
+    return prompt + int(request.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """Classic token bucket holding up to one minute's worth of capacity; 0 disables it."""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "granted", "cancelled", "wake")
+
+    def __init__(self, priority: int, seq: int, tokens: int, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.granted = False
+        self.cancelled = False
+        self.wake = wake
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ModelScheduler:
+    """Admission queue and rate limits for one model."""
+
+    def __init__(self, model: str, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 max_in_flight: int | None = None, max_queue: int | None = None, clock=time.monotonic):
+        self.model = model
+        self.requests = TokenBucket(
+            settings.LLM_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute, clock,
+        )
+        self.token_budget = TokenBucket(
+            settings.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute, clock,
+        )
+        self.max_in_flight = settings.LLM_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.max_queue = settings.LLM_QUEUE_MAX if max_queue is None else max_queue
+        self._lock = threading.Lock()
+        self._queue: list[_Waiter] = []
+        self._depth = [0] * len(PRIORITY_CLASSES)
+        self._seq = itertools.count()
+        self.in_flight = 0
+
+    # -- bookkeeping (call with the lock held) --------------------------------------------
+
+    def _set_depth(self, priority: int, delta: int) -> None:
+        self._depth[priority] += delta
+        metrics.set_gauge("llm_queue_depth", self._depth[priority],
+                          {"model": self.model, "priority": PRIORITY_CLASSES[priority]})
+
+    def _set_in_flight(self, delta: int) -> None:
+        self.in_flight += delta
+        metrics.set_gauge("llm_in_flight", self.in_flight, {"model": self.model})
+
+    def _dispatch(self) -> float | None:
+        """Admit waiters from the head of the queue while capacity allows.
+
+        Returns how long the head waiter must wait for the buckets to refill, or None when it
+        is blocked on in-flight capacity (a release will wake it) or the queue is empty.
+        """
+        while self._queue:
+            head = self._queue[0]
+            if head.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                return None
+            wait = max(self.requests.wait_time(1), self.token_budget.wait_time(head.tokens))
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.token_budget.take(head.tokens)
+            self._set_depth(head.priority, -1)
+            self._set_in_flight(1)
+            head.granted = True
+            head.wake()
+        return None
+
+    def _enqueue(self, task: str, tokens: int, wake) -> _Waiter:
+        priority = task_priority(task)
+        with self._lock:
+            if self.max_queue > 0 and sum(self._depth) >= self.max_queue:
+                metrics.inc("llm_queue_rejections_total",
+                            {"model": self.model, "priority": PRIORITY_CLASSES[priority], "reason": "full"})
+                raise LLMUnavailableError(f"AI request queue for {self.model} is full", retry_after=1.0)
+            waiter = _Waiter(priority, next(self._seq), tokens, wake)
+            heapq.heappush(self._queue, waiter)
+            self._set_depth(priority, 1)
+            self._dispatch()
+        return waiter
+
+    def _poll(self, waiter: _Waiter) -> float | None:
+        """Retry admission for a waiter whose refill wait elapsed."""
+        with self._lock:
+            return None if waiter.granted else self._dispatch()
+
+    def _abandon(self, waiter: _Waiter, reason: str) -> None:
+        with self._lock:
+            if waiter.granted:
+                # Admitted at the last moment: hand the slot straight back
+                self._set_in_flight(-1)
+                self._dispatch()
+                return
+            waiter.cancelled = True
+            self._set_depth(waiter.priority, -1)
+            self._dispatch()
+        if reason:
+            metrics.inc("llm_queue_rejections_total",
+                        {"model": self.model, "priority": PRIORITY_CLASSES[waiter.priority], "reason": reason})
+
+    def release(self) -> None:
+        with self._lock:
+            self._set_in_flight(-1)
+            self._dispatch()
+
+    def _observe_wait(self, waiter: _Waiter, waited: float) -> None:
+        metrics.observe("llm_queue_wait_seconds", waited,
+                        {"model": self.model, "priority": PRIORITY_CLASSES[waiter.priority]}, buckets=WAIT_BUCKETS)
+
+    def _timeout_error(self, waited: float) -> LLMUnavailableError:
+        return LLMUnavailableError(
+            f"AI request waited {waited:.1f}s for capacity on {self.model}", retry_after=max(1.0, math.ceil(waited)),
+        )
+
+    # -- admission ------------------------------------------------------------------------
+
+    def acquire(self, task: str, tokens: int, timeout: float) -> float:
+        """Block until admitted; returns the seconds spent waiting. Pair with `release()`."""
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(task, tokens, event.set)
+        while not waiter.granted:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                self._abandon(waiter, "timeout")
+                if waiter.granted:
+                    break
+                raise self._timeout_error(time.monotonic() - started)
+            refill = self._poll(waiter)
+            if waiter.granted:
+                break
+            event.wait(min(remaining, refill) if refill else remaining)
+        waited = time.monotonic() - started
+        self._observe_wait(waiter, waited)
+        return waited
+
+    async def aacquire(self, task: str, tokens: int, timeout: float) -> float:
+        """Async variant of `acquire`; waits on the event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        event = asyncio.Event()
+        waiter = self._enqueue(task, tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while not waiter.granted:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._abandon(waiter, "timeout")
+                    if waiter.granted:
+                        break
+                    raise self._timeout_error(time.monotonic() - started)
+                refill = self._poll(waiter)
+                if waiter.granted:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, refill) if refill else remaining)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except asyncio.CancelledError:
+            self._abandon(waiter, "")
+            raise
+        waited = time.monotonic() - started
+        self._observe_wait(waiter, waited)
+        return waited
+
+
+class LLMScheduler:
+    """Registry of per-model schedulers plus context managers for one admitted call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: dict[str, ModelScheduler] = {}
+
+    def for_model(self, model: str) -> ModelScheduler:
+        with self._lock:
+            scheduler = self._models.get(model)
+            if scheduler is None:
+                scheduler = self._models[model] = ModelScheduler(model)
+            return scheduler
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    @contextmanager
+    def slot(self, model: str, task: str, tokens: int, timeout: float):
+        """Hold an admission slot for the duration of the block; yields the queue wait in seconds."""
+        scheduler = self.for_model(model)
+        waited = scheduler.acquire(task, tokens, timeout)
+        try:
+            yield waited
+        finally:
+            scheduler.release()
+
+    @asynccontextmanager
+    async def aslot(self, model: str, task: str, tokens: int, timeout: float):
+        scheduler = self.for_model(model)
+        waited = await scheduler.aacquire(task, tokens, timeout)
+        try:
+            yield waited
+        finally:
+            scheduler.release()
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,234 @@
+"""Offline stand-in for the Groq chat-completions API, for load tests and local development.
+
+Selected with LLM_PROVIDER=stub. The stub answers every `chat.completions.create` call with a
+canned, schema-valid reply for the calling assistant's task (diet, workout, calorie, exercise
+detection, ...). It needs no network access and spends no tokens. Latency is drawn from
+LLM_STUB_LATENCY and a fraction LLM_STUB_ERROR_RATE of calls fail with a retryable provider
+error, so the rest of the stack (scheduler, retries, breaker, parsing) behaves as it would in
+production. Set LLM_STUB_SEED for reproducible runs.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from app.ai.chat_context import estimate_tokens
+from app.ai.llm_client import current_task
+from app.config import settings
+
+MEAL = {
+    "items": ["2 boiled eggs", "1 cup oats with banana"],
+    "total": {"calories": 450, "protein": "25g", "carbs": "55g", "fat": "12g"},
+    "recipe": "Boil the eggs; cook the oats in milk and top with sliced banana.",
+}
+
+WORKOUT_DAY = {
+    "focus": "Full body",
+    "exercises": [
+        {"name": "Squat", "sets": 3, "reps": 10, "rest": "90s"},
+        {"name": "Push-up", "sets": 3, "reps": 12, "rest": "60s"},
+        {"name": "Plank", "sets": 3, "reps": "45s", "rest": "45s"},
+    ],
+}
+
+CANNED_REPLIES = {
+    "diet": {"breakfast": MEAL, "lunch": MEAL, "dinner": MEAL},
+    "custom_diet": {"breakfast": MEAL, "lunch": MEAL, "dinner": MEAL},
+    "workout": {
+        "monday": WORKOUT_DAY, "tuesday": WORKOUT_DAY, "wednesday": WORKOUT_DAY,
+        "thursday": WORKOUT_DAY, "friday": WORKOUT_DAY, "saturday": WORKOUT_DAY,
+    },
+    "calorie_detect": {
+        "dish_name": "Vegetable poha",
+        "description": "Flattened rice with peas, onion and peanuts",
+        "estimated_calories": 320,
+        "calorie_range": "280-360",
+        "ingredients": [{"item": "poha", "estimated_calories": 200}, {"item": "peanuts", "estimated_calories": 90}],
+        "macronutrients": {"protein": 8, "carbs": 52, "fat": 9},
+        "health_rating": 7,
+        "advice": "Add a side of curd for extra protein.",
+    },
+    "exercise_detect": {
+        "is_exercise": True,
+        "confidence": 0.92,
+        "label": "exercise",
+        "explanation": "A person performing a bodyweight squat.",
+    },
+    "weekly_analysis": {"advice": "Good consistency this week; add one more mobility session."},
+    "chat": "Stick to your plan today: hit your protein target and get 7-8 hours of sleep.",
+    "chat_summary": "The user is following a muscle-gain plan and asked about meal timing.",
+}
+DEFAULT_REPLY = "OK"
+
+
+def reply_for(task: str) -> str:
+    reply = CANNED_REPLIES.get(task, DEFAULT_REPLY)
+    return reply if isinstance(reply, str) else json.dumps(reply)
+
+
+class StubAPIError(Exception):
+    """Simulated provider error; carries `status_code` like the SDK's APIStatusError."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Stub provider error {status_code}")
+        self.status_code = status_code
+        self.response = None
+        self.body = None
+
+
+class LatencyModel:
+    """Draw call latencies (seconds) from an LLM_STUB_LATENCY spec.
+
+    Specs are in milliseconds: "fixed:200", "uniform:100,400" or "lognormal:300,0.5" (median
+    and sigma, which gives a realistic long tail).
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip() or "fixed"
+        self.params = [float(p) for p in params.split(",") if p.strip()] or [0.0]
+        if self.kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown LLM_STUB_LATENCY distribution: {kind!r}")
+        self._rng = rng
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            low, high = self.params[0], self.params[-1]
+            ms = self._rng.uniform(low, high)
+        elif self.kind == "lognormal":
+            median = self.params[0]
+            sigma = self.params[1] if len(self.params) > 1 else 0.5
+            ms = median * self._rng.lognormvariate(0, sigma)
+        else:
+            ms = self.params[0]
+        return max(0.0, ms) / 1000.0
+
+
+class _StubBackend:
+    """Shared state of the sync and async stub clients."""
+
+    def __init__(self, latency: str | None = None, error_rate: float | None = None, seed: int | None = None):
+        seed = settings.LLM_STUB_SEED if seed is None else seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.latency = LatencyModel(settings.LLM_STUB_LATENCY if latency is None else latency, self._rng)
+        self.error_rate = settings.LLM_STUB_ERROR_RATE if error_rate is None else error_rate
+        self.calls = 0
+
+    def plan(self, timeout: float | None) -> tuple[float, Exception | None]:
+        """Pick this call's latency and (maybe) its error."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample()
+            fails = self.error_rate > 0 and self._rng.random() < self.error_rate
+            status = self._rng.choice((429, 500, 503)) if fails else None
+        if timeout is not None and delay > timeout:
+            return timeout, TimeoutError(f"Stub provider did not answer within {timeout:.2f}s")
+        return delay, StubAPIError(status) if status else None
+
+    @staticmethod
+    def _usage(kwargs: dict, content: str) -> SimpleNamespace:
+        prompt = sum(
+            estimate_tokens(m["content"]) if isinstance(m.get("content"), str)
+            else sum(estimate_tokens(p.get("text") or "") for p in m.get("content") or [])
+            for m in kwargs.get("messages") or []
+        )
+        completion = estimate_tokens(content)
+        return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
+
+    def response(self, kwargs: dict):
+        content = reply_for(current_task.get())
+        return SimpleNamespace(
+            id=f"stub-{self.calls}",
+            model=kwargs.get("model"),
+            choices=[SimpleNamespace(
+                index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=content),
+            )],
+            usage=self._usage(kwargs, content),
+        )
+
+    def chunks(self, kwargs: dict) -> list:
+        content = reply_for(current_task.get())
+        words = content.split(" ")
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(
+                index=0, finish_reason=None, delta=SimpleNamespace(content=word if i == 0 else " " + word),
+            )], x_groq=None)
+            for i, word in enumerate(words)
+        ]
+        chunks.append(SimpleNamespace(
+            choices=[SimpleNamespace(index=0, finish_reason="stop", delta=SimpleNamespace(content=None))],
+            x_groq=SimpleNamespace(usage=self._usage(kwargs, content)),
+        ))
+        return chunks
+
+
+class _Completions:
+    def __init__(self, backend: _StubBackend):
+        self._backend = backend
+
+    def create(self, timeout: float | None = None, **kwargs):
+        delay, error = self._backend.plan(timeout)
+        if kwargs.get("stream"):
+            # Half the latency before the first token, the rest spread over the chunks
+            time.sleep(delay / 2)
+            if error is not None:
+                raise error
+            return self._stream(self._backend.chunks(kwargs), delay / 2)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return self._backend.response(kwargs)
+
+    @staticmethod
+    def _stream(chunks: list, remaining: float):
+        for chunk in chunks:
+            yield chunk
+            time.sleep(remaining / len(chunks))
+
+
+class _AsyncCompletions:
+    def __init__(self, backend: _StubBackend):
+        self._backend = backend
+
+    async def create(self, timeout: float | None = None, **kwargs):
+        delay, error = self._backend.plan(timeout)
+        if kwargs.get("stream"):
+            await asyncio.sleep(delay / 2)
+            if error is not None:
+                raise error
+            return self._stream(self._backend.chunks(kwargs), delay / 2)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return self._backend.response(kwargs)
+
+    @staticmethod
+    async def _stream(chunks: list, remaining: float):
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(remaining / len(chunks))
+
+
+class StubClient:
+    """Drop-in for `Groq`: exposes `chat.completions.create` and `close()`."""
+
+    def __init__(self, backend: _StubBackend | None = None):
+        self.backend = backend or _StubBackend()
+        self.chat = SimpleNamespace(completions=_Completions(self.backend))
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncStubClient:
+    """Drop-in for `AsyncGroq`."""
+
+    def __init__(self, backend: _StubBackend | None = None):
+        self.backend = backend or _StubBackend()
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self.backend))
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,213 @@
+"""Per-call LLM telemetry: latency, time to first token, token usage, finish reason, parse outcome.
+
+`LLMAssistant` opens a `CallRecord` for every completion call and closes it with the response
+(or the error). Closed records feed the `/metrics` histograms and counters. A fraction of them
+(LLM_TELEMETRY_SAMPLE_RATE) is also written to the `llm_call_samples` table on a background
+thread, for per-prompt cost and tail-latency analysis in SQL.
+
+Calls made while parsing a structured reply (`parse_scope`) are held back until the parse
+outcome is known, so sampled rows carry it too.
+"""
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from app.ai.model_router import model_router
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_call_seconds", "LLM call latency by task, model and outcome (includes retries and queueing)")
+metrics.describe("llm_ttft_seconds", "Time to first streamed token by task and model")
+metrics.describe("llm_tokens_total", "Tokens reported by the provider, by task, model and kind (prompt, completion)")
+metrics.describe("llm_finish_reasons_total", "Completion finish reasons by task and model")
+metrics.describe("llm_parse_total", "Structured output parse outcomes by task (ok, repaired, failed)")
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+_scope: ContextVar[list | None] = ContextVar("llm_parse_scope", default=None)
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-telemetry")
+
+
+@dataclass
+class CallRecord:
+    task: str
+    model: str
+    started: float = field(default_factory=time.monotonic)
+    outcome: str = "ok"
+    latency: float = 0.0
+    ttft: float | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    finish_reason: str | None = None
+    parse_result: str | None = None
+
+
+def _usage(obj):
+    """Token usage from a completion or a final stream chunk (Groq puts it under `x_groq`)."""
+    usage = getattr(obj, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(obj, "x_groq", None), "usage", None)
+    return usage
+
+
+def _read_usage(record: CallRecord, obj) -> None:
+    usage = _usage(obj)
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if isinstance(prompt, int):
+        record.prompt_tokens = prompt
+    if isinstance(completion, int):
+        record.completion_tokens = completion
+
+
+def _read_finish_reason(record: CallRecord, obj) -> None:
+    choices = getattr(obj, "choices", None) or []
+    reason = getattr(choices[0], "finish_reason", None) if choices else None
+    if isinstance(reason, str):
+        record.finish_reason = reason
+
+
+def _labels(record: CallRecord) -> dict:
+    return {"task": record.task, "model": record.model}
+
+
+def _finish(record: CallRecord) -> None:
+    record.latency = time.monotonic() - record.started
+    labels = _labels(record)
+    metrics.observe("llm_call_seconds", record.latency, {**labels, "outcome": record.outcome}, buckets=LATENCY_BUCKETS)
+    if record.ttft is not None:
+        metrics.observe("llm_ttft_seconds", record.ttft, labels, buckets=LATENCY_BUCKETS)
+    if record.prompt_tokens is not None:
+        metrics.inc("llm_tokens_total", {**labels, "kind": "prompt"}, record.prompt_tokens)
+    if record.completion_tokens is not None:
+        metrics.inc("llm_tokens_total", {**labels, "kind": "completion"}, record.completion_tokens)
+    if record.finish_reason:
+        metrics.inc("llm_finish_reasons_total", {**labels, "reason": record.finish_reason})
+    if record.outcome == "ok":
+        # Streams are judged on time to first token, everything else on total latency
+        model_router.observe(record.task, record.model, record.ttft if record.ttft is not None else record.latency)
+
+    pending = _scope.get()
+    if pending is not None:
+        pending.append(record)
+    else:
+        sample(record)
+
+
+def start(task: str, model: str) -> CallRecord:
+    return CallRecord(task=task, model=model)
+
+
+def succeeded(record: CallRecord, response) -> None:
+    _read_usage(record, response)
+    _read_finish_reason(record, response)
+    _finish(record)
+
+
+def failed(record: CallRecord, exc: BaseException) -> None:
+    record.outcome = type(exc).__name__
+    _finish(record)
+
+
+def _on_chunk(record: CallRecord, chunk) -> None:
+    choices = getattr(chunk, "choices", None) or []
+    if record.ttft is None and choices and getattr(getattr(choices[0], "delta", None), "content", None):
+        record.ttft = time.monotonic() - record.started
+    _read_finish_reason(record, chunk)
+    _read_usage(record, chunk)
+
+
+def wrap_stream(record: CallRecord, stream):
+    """Pass stream chunks through, recording time to first token and the final usage."""
+    try:
+        for chunk in stream:
+            _on_chunk(record, chunk)
+            yield chunk
+    except Exception as e:
+        failed(record, e)
+        raise
+    except GeneratorExit:
+        # Consumer stopped reading (client disconnected)
+        record.outcome = "cancelled"
+        _finish(record)
+        raise
+    _finish(record)
+
+
+async def awrap_stream(record: CallRecord, stream):
+    """Async variant of `wrap_stream`."""
+    try:
+        async for chunk in stream:
+            _on_chunk(record, chunk)
+            yield chunk
+    except Exception as e:
+        failed(record, e)
+        raise
+    except GeneratorExit:
+        # Consumer stopped reading (client disconnected)
+        record.outcome = "cancelled"
+        _finish(record)
+        raise
+    _finish(record)
+
+
+class ParseScope:
+    result: str | None = None
+
+
+@contextmanager
+def parse_scope(task: str):
+    """Collect the calls made while producing one parsed reply; set `.result` to the outcome."""
+    pending: list[CallRecord] = []
+    token = _scope.set(pending)
+    scope = ParseScope()
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+        if scope.result:
+            metrics.inc("llm_parse_total", {"task": task, "result": scope.result})
+        for record in pending:
+            record.parse_result = scope.result
+            sample(record)
+
+
+# -- DB sampling ----------------------------------------------------------------------------
+
+def _write(record: CallRecord, session_factory) -> None:
+    from app.models import LLMCallSample
+
+    try:
+        with session_factory() as db:
+            db.add(LLMCallSample(
+                task=record.task,
+                model=record.model,
+                outcome=record.outcome,
+                latency_ms=round(record.latency * 1000, 1),
+                ttft_ms=round(record.ttft * 1000, 1) if record.ttft is not None else None,
+                prompt_tokens=record.prompt_tokens,
+                completion_tokens=record.completion_tokens,
+                finish_reason=record.finish_reason,
+                parse_result=record.parse_result,
+            ))
+            db.commit()
+    except Exception as e:
+        logger.warning("LLM telemetry sample write failed: %s", e)
+
+
+def sample(record: CallRecord, session_factory=None) -> bool:
+    """Queue `record` for the llm_call_samples table with probability LLM_TELEMETRY_SAMPLE_RATE."""
+    rate = settings.LLM_TELEMETRY_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate:
+        return False
+    if session_factory is None:
+        from app.database import SessionLocal
+        session_factory = SessionLocal
+    _writer.submit(_write, record, session_factory)
+    return True
@@ -1,29 +1,19 @@
-import re
-import json
-import os
-from groq import Groq
-from app.config import settings
-
-class WorkoutAssistant:
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
-        self.model_name = "meta-llama/llama-4-scout-17b-16e-instruct"
-
-    def get_workout_suggestion(self, user_data: dict) -> dict:
-        """
-        Generate a weekly workout plan (Mon-Sat).
-        """
-        
-        # Read prompt from file
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        prompt_path = os.path.join(base_dir, "prompt", "workout_prompt.txt")
-        
-        try:
-            with open(prompt_path, "r") as f:
-                prompt_template = f.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Prompt file not found at {prompt_path}")
-
+from app.ai.base import LLMAssistant
+from app.ai.output_parser import parse_json_output
+from app.ai.prompt_registry import prompts
+from app.schemas.llm_schema import WorkoutPlanOutput
+
+WORKOUT_PROMPT_KEYS = {
+    "age", "gender", "height", "weight", "goal", "activity_level",
+    "medical_conditions", "injuries", "workout_time", "budget",
+}
+prompts.register("workout_prompt", WORKOUT_PROMPT_KEYS)
+
+class WorkoutAssistant(LLMAssistant):
+    task = "workout"
+    output_schema = WorkoutPlanOutput
+
+    def _build_request(self, user_data: dict) -> dict:
         # Prepare data for formatting
         format_data = {
             "age": user_data.get('age', 25),
@@ -38,9 +28,9 @@ class WorkoutAssistant:
             "budget": user_data.get('budget', 'low'),
         }
 
-        prompt = prompt_template.format(**format_data)
+        prompt = prompts.render("workout_prompt", **format_data)
 
-        response = self.client.chat.completions.create(
+        return dict(
             model=self.model_name,
             messages=[
                 {"role": "system", "content": "You are a certified personal trainer AI."},
@@ -50,28 +40,15 @@ class WorkoutAssistant:
             temperature=0.7
         )
 
-        raw_output = response.choices[0].message.content
-        
-        if not raw_output or not isinstance(raw_output, str):
-            raise ValueError("LLM returned empty or invalid content")
-
-        # Cleaning and Parsing Logic (Same as DietAssistant)
-        cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
-        
-        if not match:
-             # If regex fails, try returning the whole cleaned string if it looks like JSON
-            if cleaned.startswith("{") and cleaned.endswith("}"):
-                json_data = cleaned
-            else:
-                raise ValueError("No JSON found in LLM output")
-        else:
-            json_data = match.group()
+    def _parse(self, response) -> dict:
+        return parse_json_output(response.choices[0].message.content, WorkoutPlanOutput)
 
-        json_data = json_data.replace("'", '"')
+    def get_workout_suggestion(self, user_data: dict) -> dict:
+        """
+        Generate a weekly workout plan (Mon-Sat).
+        """
+        return self._run(self._build_request(user_data), self._parse)
 
-        try:
-            return json.loads(json_data)
-        except json.JSONDecodeError as e:
-            print("❌ JSONDecodeError:", e)
-            raise ValueError("Failed to parse AI output as JSON")
+    async def get_workout_suggestion_async(self, user_data: dict) -> dict:
+        """Async variant of `get_workout_suggestion`."""
+        return await self._arun(self._build_request(user_data), self._parse)
@@ -1,12 +1,27 @@
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+
+def _parse_task_map(raw: str) -> dict:
+    """Parse "task=value,task2=value2" env strings into {task: float}."""
+    out = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        out[key.strip()] = float(value)
+    return out
+
+
 class Settings:
     APP_NAME: str = os.getenv("APP_NAME", "FitnessAI")
     BASE_URL: str = os.getenv("BASE_URL", "")
+    # IANA zone that "today" and profile clock times (wake-up, meals) are read in, see app/utils/dates.py
+    APP_TIMEZONE: str = os.getenv("APP_TIMEZONE", "UTC")
 
     # JWT
     # JWT config (defaults are development-friendly; set via environment in production)
@@ -19,6 +34,146 @@ class Settings:
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     # GROQ_MODEL: str = os.getenv("GROQ_MODEL")
 
+    # LLM provider: "groq" (default) or "stub" (offline canned replies for load tests, app/ai/stub_provider.py)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "groq")
+    # Stub latency in ms: "fixed:200", "uniform:100,400" or "lognormal:<median>,<sigma>"
+    LLM_STUB_LATENCY: str = os.getenv("LLM_STUB_LATENCY", "lognormal:300,0.4")
+    # Fraction of stub calls failing with a retryable 429/500/503
+    LLM_STUB_ERROR_RATE: float = float(os.getenv("LLM_STUB_ERROR_RATE", 0))
+    LLM_STUB_SEED: int | None = int(os.environ["LLM_STUB_SEED"]) if os.getenv("LLM_STUB_SEED") else None
+
+    # Shared LLM client (one pooled HTTP client per process, see app/ai/llm_client.py)
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+    # Timeouts in seconds
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", 60))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+    # SDK-level retries; kept at 0 because app/ai/resilience.py retries within the task deadline
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 0))
+
+    # Resilience (app/ai/resilience.py): overall per-task deadline in seconds (LLM_TIMEOUT when unset)
+    LLM_DEADLINES: dict = _parse_task_map(os.getenv(
+        "LLM_DEADLINES",
+        "exercise_detect=15,calorie_detect=30,chat=30,chat_summary=30,weekly_analysis=60,"
+        "diet=90,custom_diet=90,workout=90",
+    ))
+    # Total attempts per call, with full-jitter exponential backoff between them
+    LLM_RETRY_ATTEMPTS: int = int(os.getenv("LLM_RETRY_ATTEMPTS", 3))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))
+    # Send a second request when the first hasn't answered after N seconds (async calls only)
+    LLM_HEDGE_AFTER: dict = _parse_task_map(os.getenv("LLM_HEDGE_AFTER", "exercise_detect=4"))
+    # Open the circuit after N consecutive retryable failures; probe again after the reset timeout
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+    LLM_BREAKER_RESET_TIMEOUT: float = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", 30))
+
+    # Scheduler (app/ai/scheduler.py), applied per model: rate limits to stay under the provider's
+    # (0 = unlimited, e.g. 30 and 30000 for a Groq free-tier key), max concurrent calls and queue size
+    LLM_REQUESTS_PER_MINUTE: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+    LLM_TOKENS_PER_MINUTE: float = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", 32))
+    LLM_QUEUE_MAX: int = int(os.getenv("LLM_QUEUE_MAX", 200))
+
+    # Model routing (app/ai/model_router.py): JSON overriding the per-task route list, e.g.
+    # {"chat": [{"model": "llama-3.3-70b-versatile", "max_tokens": 800}, {"model": "llama-3.1-8b-instant"}]}
+    LLM_MODEL_ROUTES: dict = json.loads(os.getenv("LLM_MODEL_ROUTES", "{}"))
+    # p95 latency SLO per task in seconds; a route breaking it falls through to the next model
+    LLM_LATENCY_SLOS: dict = _parse_task_map(os.getenv(
+        "LLM_LATENCY_SLOS",
+        "exercise_detect=3,calorie_detect=6,chat=5,chat_summary=15,weekly_analysis=10,"
+        "diet=25,custom_diet=25,workout=25",
+    ))
+    # p95 is computed over this many seconds of calls, once at least LLM_ROUTE_MIN_SAMPLES were seen
+    LLM_ROUTE_WINDOW: float = float(os.getenv("LLM_ROUTE_WINDOW", 300))
+    LLM_ROUTE_MIN_SAMPLES: int = int(os.getenv("LLM_ROUTE_MIN_SAMPLES", 20))
+
+    # Fraction of LLM calls also written to the llm_call_samples table (0 = metrics only)
+    LLM_TELEMETRY_SAMPLE_RATE: float = float(os.getenv("LLM_TELEMETRY_SAMPLE_RATE", 0))
+
+    # LLM response cache: per-task opt-in TTLs in seconds, e.g. "workout=86400,weekly_analysis=21600".
+    # Tasks: exercise_detect, calorie_detect, chat, diet, custom_diet, workout, weekly_analysis
+    LLM_CACHE_TTLS: dict = _parse_task_map(os.getenv("LLM_CACHE_TTLS", ""))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+    # Also persist cached responses in the llm_response_cache table (shared across workers/restarts)
+    LLM_CACHE_PERSISTENT: bool = os.getenv("LLM_CACHE_PERSISTENT", "true").lower() == "true"
+
+    # How long a request waits for another worker generating the same diet/workout plan (seconds)
+    SINGLE_FLIGHT_LOCK_TIMEOUT: float = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", 120))
+
+    # Background generation workers started inside each API process (0 = only standalone workers)
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", 2))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", 1))
+    # Jobs still "running" after this many seconds are assumed orphaned and re-queued at worker start
+    JOB_STALE_AFTER: float = float(os.getenv("JOB_STALE_AFTER", 600))
+
+    # Pre-generate today's diet plan for active users shortly before their wake-up time
+    DIET_PREGEN_ENABLED: bool = os.getenv("DIET_PREGEN_ENABLED", "false").lower() == "true"
+    DIET_PREGEN_LEAD_MINUTES: float = float(os.getenv("DIET_PREGEN_LEAD_MINUTES", 180))
+    DIET_PREGEN_ACTIVE_DAYS: int = int(os.getenv("DIET_PREGEN_ACTIVE_DAYS", 7))
+    # Global cap on generation jobs queued per minute (shared with on-demand async requests)
+    DIET_PREGEN_MAX_PER_MINUTE: int = int(os.getenv("DIET_PREGEN_MAX_PER_MINUTE", 30))
+    DIET_PREGEN_INTERVAL: float = float(os.getenv("DIET_PREGEN_INTERVAL", 60))
+    # Pre-generate next week's workout plan over the weekend for users active in the last N weeks.
+    # Each user's slot is spread over SPREAD_HOURS from LEAD_HOURS before Monday 00:00
+    WORKOUT_PREGEN_ENABLED: bool = os.getenv("WORKOUT_PREGEN_ENABLED", "false").lower() == "true"
+    WORKOUT_PREGEN_LEAD_HOURS: float = float(os.getenv("WORKOUT_PREGEN_LEAD_HOURS", 48))
+    WORKOUT_PREGEN_SPREAD_HOURS: float = float(os.getenv("WORKOUT_PREGEN_SPREAD_HOURS", 36))
+    WORKOUT_PREGEN_ACTIVE_WEEKS: int = int(os.getenv("WORKOUT_PREGEN_ACTIVE_WEEKS", 2))
+    # Separate from DIET_PREGEN_MAX_PER_MINUTE: counts workout jobs only
+    WORKOUT_PREGEN_MAX_PER_MINUTE: int = int(os.getenv("WORKOUT_PREGEN_MAX_PER_MINUTE", 10))
+    WORKOUT_PREGEN_INTERVAL: float = float(os.getenv("WORKOUT_PREGEN_INTERVAL", 60))
+
+    # Serve a workout plan generated for a near-identical profile (nearest neighbour within
+    # this distance; one unit ~ 10 years / 10 cm / 10 kg / 15 minutes) instead of generating one
+    WORKOUT_LIBRARY_ENABLED: bool = os.getenv("WORKOUT_LIBRARY_ENABLED", "false").lower() == "true"
+    WORKOUT_LIBRARY_MAX_DISTANCE: float = float(os.getenv("WORKOUT_LIBRARY_MAX_DISTANCE", 1.0))
+
+    # Reuse the analysis of a near-identical food photo (dHash Hamming distance, out of 64 bits):
+    # the user's own photos within MAX_DISTANCE, anyone's within GLOBAL_MAX_DISTANCE (-1 disables)
+    CALORIE_CACHE_ENABLED: bool = os.getenv("CALORIE_CACHE_ENABLED", "true").lower() == "true"
+    CALORIE_CACHE_MAX_DISTANCE: int = int(os.getenv("CALORIE_CACHE_MAX_DISTANCE", 6))
+    CALORIE_CACHE_GLOBAL_MAX_DISTANCE: int = int(os.getenv("CALORIE_CACHE_GLOBAL_MAX_DISTANCE", 2))
+    # Photos with a lower grayscale standard deviation (0-255) are too flat to match and are always analysed
+    CALORIE_CACHE_MIN_CONTRAST: float = float(os.getenv("CALORIE_CACHE_MIN_CONTRAST", 12))
+    # Share of cache hits re-analysed in the background to measure false matches
+    CALORIE_CACHE_VERIFY_RATE: float = float(os.getenv("CALORIE_CACHE_VERIFY_RATE", 0.02))
+
+    # Uploaded images: larger files are rejected with 413; streamed to disk in chunks of this many bytes
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))
+
+    # Photos sent to vision models are EXIF-rotated, downscaled to this longest edge (px) and re-encoded as JPEG
+    VISION_IMAGE_PREP_ENABLED: bool = os.getenv("VISION_IMAGE_PREP_ENABLED", "true").lower() == "true"
+    VISION_IMAGE_MAX_EDGE: int = int(os.getenv("VISION_IMAGE_MAX_EDGE", 1024))
+    VISION_IMAGE_QUALITY: int = int(os.getenv("VISION_IMAGE_QUALITY", 85))
+
+    # /profile/exercise/validate-batch: images per request and how many are validated at once
+    EXERCISE_BATCH_MAX_FILES: int = int(os.getenv("EXERCISE_BATCH_MAX_FILES", 20))
+    EXERCISE_BATCH_CONCURRENCY: int = int(os.getenv("EXERCISE_BATCH_CONCURRENCY", 4))
+    # /profile/calorie/detect-meal: photos per meal and how many are analysed at once
+    CALORIE_MEAL_MAX_FILES: int = int(os.getenv("CALORIE_MEAL_MAX_FILES", 8))
+    CALORIE_MEAL_CONCURRENCY: int = int(os.getenv("CALORIE_MEAL_CONCURRENCY", 4))
+
+    # Weekly analysis advice is regenerated in the background this many seconds after the week's stats last changed
+    ANALYSIS_REFRESH_DEBOUNCE: float = float(os.getenv("ANALYSIS_REFRESH_DEBOUNCE", 30))
+
+    # Chatbot prompt: estimated-token budget for plans + history, and how many history rows to consider
+    CHAT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", 1200))
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 20))
+    # Rolling summary: fold older messages in the background every N turns, keeping the newest few verbatim
+    CHAT_SUMMARY_ENABLED: bool = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() == "true"
+    CHAT_SUMMARY_EVERY_TURNS: int = int(os.getenv("CHAT_SUMMARY_EVERY_TURNS", 4))
+    CHAT_SUMMARY_KEEP_RECENT: int = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", 6))
+
+    # Structured output: request JSON mode for assistants with an output schema, and send a
+    # targeted repair prompt for the broken part of malformed replies instead of regenerating
+    LLM_JSON_MODE: bool = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+    LLM_OUTPUT_REPAIR: bool = os.getenv("LLM_OUTPUT_REPAIR", "true").lower() == "true"
+
+    # Prompt templates are re-checked for changes at most this often (seconds); negative disables hot reload
+    PROMPT_RELOAD_INTERVAL: float = float(os.getenv("PROMPT_RELOAD_INTERVAL", 2))
+
     #Google Api
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     # Database
@@ -1,5 +1,10 @@
-from fastapi import FastAPI,Depends
+from contextlib import asynccontextmanager
+
+import math
+
+from fastapi import FastAPI,Depends,Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.database import Base, engine
 from app.routers.profile import router as profile_router
@@ -12,11 +17,40 @@ from app.routers.custom_diet import router as custom_diet_router
 from app.routers.exercise import router as exercise_router
 from app.routers.analysis import router as analysis_router
 from app.routers.auth import router as auth_router
+from app.routers.metrics import router as metrics_router
+from app.routers.jobs import router as jobs_router
+from app.routers.dashboard import router as dashboard_router
 from app.routers.auth import get_current_user
+from app.ai.llm_client import llm_clients
+from app.ai.resilience import LLMUnavailableError
+from app.services.job_queue import start_workers, stop_workers
+from app.services.pregeneration import start_scheduler
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the shared LLM clients so the first AI request doesn't pay for pool setup
+    llm_clients.get_client()
+    llm_clients.get_async_client()
+    # Background plan generation workers (JOB_WORKER_CONCURRENCY, 0 disables)
+    workers = start_workers()
+    # Wake-time-aware diet and weekend workout pre-generation (DIET_/WORKOUT_PREGEN_ENABLED)
+    workers += start_scheduler()
+    yield
+    await stop_workers(workers)
+    await llm_clients.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    # Provider degraded (circuit open, retries or deadline exhausted): tell clients to come back later
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
 
 # Serve static files (images)
 from fastapi.staticfiles import StaticFiles
@@ -41,7 +75,10 @@ app.include_router(gym_router, dependencies=[Depends(get_current_user)])
 app.include_router(custom_diet_router, dependencies=[Depends(get_current_user)])
 app.include_router(exercise_router, dependencies=[Depends(get_current_user)])
 app.include_router(analysis_router, dependencies=[Depends(get_current_user)])
+app.include_router(jobs_router, dependencies=[Depends(get_current_user)])
+app.include_router(dashboard_router, dependencies=[Depends(get_current_user)])
 app.include_router(auth_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 def home():
@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Date, Text
+from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, ForeignKey, Date, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from .database import Base
@@ -30,6 +30,8 @@ class UserProfile(Base):
     pincode = Column(String)
     city = Column(String)
     budget = Column(String)
+    # Don't serve this user plans generated for others, nor share theirs (app/services/plan_library.py)
+    plan_reuse_opt_out = Column(Boolean, nullable=True, default=False)
 
 class UserDiet(Base):
     __tablename__ = "user_diets"
@@ -37,8 +39,12 @@ class UserDiet(Base):
     diet_planid = Column(Integer, primary_key=True, index=True)
     user_email = Column(String, ForeignKey("user_profiles.email"))  # link via email
     diet_plan = Column(JSONB)
+    # Day the plan is for; one plan per user per day
+    plan_date = Column(Date, nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (UniqueConstraint("user_email", "plan_date", name="uq_user_diets_email_plan_date"),)
+
 class UserWorkout(Base):
     __tablename__ = "user_workouts"
 
@@ -52,6 +58,9 @@ class UserWorkout(Base):
     week_number = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # One plan per user per calendar week
+    __table_args__ = (UniqueConstraint("user_email", "week_start", name="uq_user_workouts_email_week_start"),)
+
 class UserExerciseFollowUp(Base):
     __tablename__ = "user_exercise_followups"
 
@@ -78,6 +87,8 @@ class UserExerciseAnalysis(Base):
     week_end = Column(Date, nullable=False)
     daily_stats = Column(JSONB, nullable=True)
     advice = Column(String, nullable=True)
+    # Hash of the daily stats the advice was generated from
+    followup_fingerprint = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class UserFoodLog(Base):
@@ -87,6 +98,8 @@ class UserFoodLog(Base):
     user_email = Column(String, ForeignKey("user_profiles.email"))
     image_path = Column(String)  # Path to stored image
     food_analysis = Column(JSONB) # AI Output: {"food_name": "...", "calories": 500, ...}
+    # Perceptual hash of the photo, 16 hex chars (see app/services/calorie_cache.py)
+    image_hash = Column(String(16), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -147,3 +160,83 @@ class UserAuth(Base):
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+
+class LLMResponseCacheEntry(Base):
+    """Persistent tier of the LLM response cache (see app/ai/response_cache.py)."""
+
+    __tablename__ = "llm_response_cache"
+
+    # sha256 of (model, rendered messages, temperature, max_tokens)
+    cache_key = Column(String(64), primary_key=True)
+    task = Column(String, index=True)
+    model = Column(String)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+
+
+class GenerationJob(Base):
+    """Queued plan generation request, processed by the workers in app/services/job_queue.py."""
+
+    __tablename__ = "generation_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    # "diet" | "workout" | "custom_diet"
+    kind = Column(String, nullable=False)
+    user_email = Column(String, ForeignKey("user_profiles.email"), index=True)
+    payload = Column(JSONB, nullable=True)
+    # "queued" | "running" | "succeeded" | "failed" | "superseded" (inputs changed before it finished)
+    status = Column(String, nullable=False, default="queued", index=True)
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ChatSummary(Base):
+    """Rolling summary of a user's older chat messages (see app/ai/chat_memory.py)."""
+
+    __tablename__ = "chat_summaries"
+
+    user_email = Column(String, ForeignKey("user_profiles.email"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    # Highest ChatHistory.id folded into `summary`; newer rows are sent to the model verbatim
+    last_message_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LLMCallSample(Base):
+    """Sampled LLM call telemetry (see app/ai/telemetry.py, LLM_TELEMETRY_SAMPLE_RATE)."""
+
+    __tablename__ = "llm_call_samples"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task = Column(String, index=True)
+    model = Column(String)
+    # "ok" or the exception class name
+    outcome = Column(String, nullable=False)
+    latency_ms = Column(Float, nullable=False)
+    ttft_ms = Column(Float, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    finish_reason = Column(String, nullable=True)
+    # "ok" | "repaired" | "failed"; empty for calls whose reply isn't parsed (chat)
+    parse_result = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class WorkoutPlanLibraryEntry(Base):
+    """Generated workout plan available for reuse by similar profiles (see app/services/plan_library.py)."""
+
+    __tablename__ = "workout_plan_library"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_email = Column(String, ForeignKey("user_profiles.email"), index=True)
+    # Normalised prompt inputs and their encoding used for the nearest-neighbour search
+    features = Column(JSONB, nullable=False)
+    vector = Column(JSONB, nullable=False)
+    workout_plan = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import Any
+from typing import Any, List
 from app.database import SessionLocal
 from app.models import UserProfile, UserFoodLog
 from app.ai.calorie_detector import CalorieDetector
-import shutil
+from app.ai.resilience import LLMUnavailableError
+from app.config import settings
+from app.services.calorie_cache import dhash, image_index, maybe_verify
+from app.services.meals import merge_meal
+from app.utils.uploads import IngestedUpload, ingest_upload
+import asyncio
+import functools
 import os
-import uuid
 from datetime import datetime
 
 router = APIRouter(prefix="/profile/calorie", tags=["Calorie Detection"])
@@ -50,8 +56,66 @@ def get_db():
     finally:
         db.close()
 
+
+def _find_profile(db: Session, name: str, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(
+        UserProfile.name == name,
+        UserProfile.email == email
+    ).first()
+
+
+def _save_log(db: Session, email: str, image_path: str, analysis: dict, image_hash: str | None = None) -> UserFoodLog:
+    new_log = UserFoodLog(
+        user_email=email,
+        image_path=image_path,
+        food_analysis=analysis,
+        image_hash=image_hash,
+    )
+    db.add(new_log)
+    db.commit()
+    db.refresh(new_log)
+    return new_log
+
+
+async def _ingest(file: UploadFile) -> IngestedUpload:
+    try:
+        return await ingest_upload(file, UPLOAD_DIR)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
+
+
+def _find_cached(db: Session, email: str, image_hash: str | None) -> tuple[dict, int, str] | None:
+    """(analysis, distance, scope) of the closest stored photo, read in a worker thread."""
+    cached = image_index.lookup(db, email, image_hash)
+    if cached is None:
+        return None
+    log, distance, scope = cached
+    return dict(log.food_analysis), distance, scope
+
+
+async def _analyse(detector: CalorieDetector, db: Session, email: str, upload: IngestedUpload,
+                   db_lock: asyncio.Lock | None = None) -> tuple[dict, str | None, bool]:
+    """Analysis of an ingested photo: reused from a near-identical earlier photo, else from the AI.
+
+    Returns (analysis, image hash, whether it came from the cache). Callers analysing several
+    photos concurrently pass a shared `db_lock`, since the request's session is not thread-safe.
+    """
+    # Both work on the bytes already in memory; the saved file is only served back
+    image_hash = await run_in_threadpool(dhash, upload.content)
+    detect = functools.partial(detector.detect_calories_async, mime_type=upload.content_type)
+    async with db_lock or asyncio.Lock():
+        cached = await run_in_threadpool(_find_cached, db, email, image_hash)
+    if cached:
+        analysis_result, distance, scope = cached
+        maybe_verify(detect, upload.content, analysis_result, distance, scope)
+        return analysis_result, image_hash, True
+    return await detect(upload.content), image_hash, False
+
+
 @router.post("/detect", response_model=dict)
-def detect_calories(
+async def detect_calories(
     request: Request,
     name: str = Form(...),
     email: str = Form(...),
@@ -62,49 +126,30 @@ def detect_calories(
     Upload an image -> Detect Calories -> Save Log -> Return JSON.
     """
     # 1. Verify User
-    profile = db.query(UserProfile).filter(
-        UserProfile.name == name,
-        UserProfile.email == email
-    ).first()
+    profile = await run_in_threadpool(_find_profile, db, name, email)
 
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # 2. Save Image Locally
-    filename = file.filename or "unknown.jpg"
-    file_extension = filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    # 2. Save Image Locally (streamed, size-capped and type-checked)
+    upload = await _ingest(file)
+    file_path = upload.path
 
+    # 3. Reuse the analysis of a near-identical photo, else detect calories using AI
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
-
-    # 3. Detect Calories using AI
-    detector = CalorieDetector()
-    try:
-        # We pass the absolute path to the AI
-        abs_path = os.path.abspath(file_path)
-        analysis_result = detector.detect_calories(abs_path)
+        analysis_result, image_hash, cached = await _analyse(CalorieDetector(), db, email, upload)
     except Exception as e:
         # Clean up file if detection fails
         if os.path.exists(file_path):
             os.remove(file_path)
+        if isinstance(e, LLMUnavailableError):
+            raise
         raise HTTPException(status_code=500, detail=f"AI Detection failed: {str(e)}")
 
     # 4. Save to DB
     # We store the relative path or a URL-accessible path
     # For this setup, we store the relative path 'app/static/images/...'
-    new_log = UserFoodLog(
-        user_email=email,
-        image_path=file_path,
-        food_analysis=analysis_result
-    )
-    db.add(new_log)
-    db.commit()
-    db.refresh(new_log)
+    new_log = await run_in_threadpool(_save_log, db, email, file_path, analysis_result, image_hash)
 
     # 5. Return formatted response
     return {
@@ -119,9 +164,93 @@ def detect_calories(
         "macronutrients": analysis_result.get("macronutrients"),
         "health_rating": analysis_result.get("health_rating"),
         "advice": analysis_result.get("advice"),
+        "cached": cached,
+    }
+
+
+@router.post("/detect-meal", response_model=dict)
+async def detect_meal(
+    request: Request,
+    name: str = Form(...),
+    email: str = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload all photos of one meal (main dish, sides, drink) -> analyse them concurrently ->
+    save ONE log with a per-photo breakdown (`items`) and the combined calorie total.
+    If any photo can't be analysed nothing is saved, so a meal is never logged half.
+    """
+    profile = await run_in_threadpool(_find_profile, db, name, email)
+
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    if len(files) > settings.CALORIE_MEAL_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CALORIE_MEAL_MAX_FILES} photos per meal")
+
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await _ingest(file))
+    except HTTPException:
+        _remove_files([upload.path for upload in uploads])
+        raise
+    file_paths = [upload.path for upload in uploads]
+
+    detector = CalorieDetector()
+    semaphore = asyncio.Semaphore(max(settings.CALORIE_MEAL_CONCURRENCY, 1))
+    db_lock = asyncio.Lock()
+
+    async def analyse_one(upload: IngestedUpload):
+        async with semaphore:
+            return await _analyse(detector, db, email, upload, db_lock)
+
+    try:
+        outcomes = await asyncio.gather(*(analyse_one(upload) for upload in uploads))
+    except Exception as e:
+        _remove_files(file_paths)
+        if isinstance(e, LLMUnavailableError):
+            raise
+        raise HTTPException(status_code=500, detail=f"AI Detection failed: {str(e)}")
+
+    items = [
+        {**analysis, "image_path": file_path, "cached": cached}
+        for file_path, (analysis, _, cached) in zip(file_paths, outcomes)
+    ]
+    meal = merge_meal(items)
+
+    # One row per meal; the per-photo hashes aren't stored (a meal isn't a single photo)
+    new_log = await run_in_threadpool(_save_log, db, email, file_paths[0], meal)
+
+    return {
+        "id": str(new_log.log_id),
+        "created_at": new_log.created_at.isoformat(),
+        "image_path": get_image_url(file_paths[0], request),
+        "dish_name": meal["dish_name"],
+        "estimated_calories": meal["estimated_calories"],
+        "calorie_range": meal["calorie_range"],
+        "macronutrients": meal["macronutrients"],
+        "items": [
+            {
+                "image_path": get_image_url(item["image_path"], request),
+                "dish_name": item.get("dish_name"),
+                "estimated_calories": item.get("estimated_calories"),
+                "ingredients": item.get("ingredients"),
+                "macronutrients": item.get("macronutrients"),
+                "health_rating": item.get("health_rating"),
+                "cached": item["cached"],
+            }
+            for item in items
+        ],
     }
 
 
+def _remove_files(paths: list[str]) -> None:
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
 @router.post("/history", response_model=list)
 def get_calorie_history(data: dict, request: Request, db: Session = Depends(get_db)):
     """
@@ -180,13 +309,16 @@ def delete_calorie_log(data: dict, db: Session = Depends(get_db)):
     if not log_entry:
         raise HTTPException(status_code=404, detail="Calorie log not found")
 
-    # Remove the image file if it exists
-    image_path_str = str(log_entry.image_path) # Ensure it's a string
-    if image_path_str and os.path.exists(image_path_str):
-        try:
-            os.remove(image_path_str)
-        except Exception:
-            pass  # Log deletion shouldn't fail if file is already gone
+    # Remove the image file(s) if they exist; meal logs also list one photo per item
+    image_paths = {str(log_entry.image_path)} # Ensure it's a string
+    items = (log_entry.food_analysis or {}).get("items") or []
+    image_paths.update(str(item["image_path"]) for item in items if isinstance(item, dict) and item.get("image_path"))
+    for image_path_str in image_paths:
+        if image_path_str and os.path.exists(image_path_str):
+            try:
+                os.remove(image_path_str)
+            except Exception:
+                pass  # Log deletion shouldn't fail if file is already gone
 
     # Delete from DB
     db.delete(log_entry)
@@ -1,11 +1,18 @@
+import json
+import time
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.ai.chatbot import ChatbotAssistant
 from app.models import UserProfile
+from app.utils.metrics import metrics
 
 router = APIRouter(prefix="/profile/chat", tags=["Chatbot"])
 
+metrics.describe("chat_stream_ttfb_seconds", "Time from request to the first streamed chat token")
+
 def get_db():
     db = SessionLocal()
     try:
@@ -13,12 +20,9 @@ def get_db():
     finally:
         db.close()
 
-@router.post("/")
-def chat_with_ai(data: dict, db: Session = Depends(get_db)):
-    """
-    Chatbot endpoint.
-    Input: {"email": "user@example.com", "message": "..."} OR {"user_id": 1, "message": "..."}
-    """
+
+def _resolve_chat_request(data: dict, db: Session):
+    """Validate a chat payload and return (email, message)."""
     email = data.get("email")
     user_id = data.get("user_id")
     message = data.get("message")
@@ -38,7 +42,61 @@ def chat_with_ai(data: dict, db: Session = Depends(get_db)):
     if not email:
          raise HTTPException(status_code=400, detail="Email is required")
 
+    return email, message
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/")
+async def chat_with_ai(data: dict, db: Session = Depends(get_db)):
+    """
+    Chatbot endpoint.
+    Input: {"email": "user@example.com", "message": "..."} OR {"user_id": 1, "message": "..."}
+    """
+    email, message = await run_in_threadpool(_resolve_chat_request, data, db)
+
     assistant = ChatbotAssistant()
-    response = assistant.get_chat_response(email, message, db)
-    
+    response = await assistant.get_chat_response_async(email, message, db)
+
     return {"response": response}
+
+
+@router.post("/stream")
+async def chat_with_ai_stream(data: dict, db: Session = Depends(get_db)):
+    """
+    Streaming chatbot endpoint (Server-Sent Events).
+    Input: same as POST /profile/chat/.
+
+    Emits `data: {"delta": "..."}` events as tokens arrive, then a final `event: done` with the
+    full response and the time-to-first-byte in ms. Failures are reported as `event: error`.
+    """
+    started = time.perf_counter()
+    email, message = await run_in_threadpool(_resolve_chat_request, data, db)
+    assistant = ChatbotAssistant()
+
+    async def event_stream():
+        parts = []
+        ttfb = None
+        try:
+            async for delta in assistant.stream_chat_response_async(email, message, db):
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                    metrics.observe("chat_stream_ttfb_seconds", ttfb)
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            yield _sse({"detail": f"AI Service Error: {str(e)}"}, event="error")
+            return
+        yield _sse(
+            {"response": "".join(parts), "ttfb_ms": round((ttfb or 0.0) * 1000, 1)},
+            event="done",
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
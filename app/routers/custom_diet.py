@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import date
-import json
 
 from app.database import SessionLocal
-from app.models import UserProfile, UserCustomDiet, UserDiet
-from app.ai.custom_diet import CustomDietAssistant
+from app.models import UserProfile
+from app.routers.jobs import accepted_response, wants_background
+from app.services import job_queue, plans
+from app.utils.dates import app_today
 
 router = APIRouter(prefix="/profile", tags=["Custom Diet"])
 
@@ -18,93 +18,36 @@ def get_db():
         db.close()
 
 
+def _find_profile(db: Session, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(UserProfile.email == email).first()
+
+
 @router.post("/custom-diet", response_model=dict)
-def custom_diet_plan(data: dict, db: Session = Depends(get_db)):
+async def custom_diet_plan(data: dict, db: Session = Depends(get_db)):
     email = data.get("email")
     ingredients = data.get("ingredients")
 
     if not email or ingredients is None:
         raise HTTPException(status_code=400, detail="email and ingredients are required")
 
-    profile = db.query(UserProfile).filter(UserProfile.email == email).first()
+    # Queries run in the threadpool so they don't block the event loop
+    profile = await run_in_threadpool(_find_profile, db, email)
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
 
-    today = date.today()
+    today = app_today()
 
     # Check if today's plan exists
-    existing = (
-        db.query(UserCustomDiet)
-        .filter(
-            UserCustomDiet.user_email == email,
-            func.date(UserCustomDiet.created_at) == today
-        )
-        .first()
-    )
+    existing = await run_in_threadpool(plans.find_custom_diet, db, email, today)
 
     if existing:
-        return {
-            "date": today,
-            "custom_diet_id": existing.custom_diet_id,
-            "ingredients": existing.ingredients,
-            "diet_plan": existing.diet_plan,
-        }
+        return plans.custom_diet_response(today, existing)
 
-    # Fetch YESTERDAY'S custom plan
-    yesterday_custom = (
-        db.query(UserCustomDiet)
-        .filter(
-            UserCustomDiet.user_email == email,
-            func.date(UserCustomDiet.created_at) < today
+    if wants_background(data):
+        job = await run_in_threadpool(
+            job_queue.enqueue, db, "custom_diet", email, {"date": today, "ingredients": ingredients}
         )
-        .order_by(UserCustomDiet.created_at.desc())
-        .first()
-    )
-
-    previous_date = "N/A"
-    yesterday_plan = "None"
-
-    if yesterday_custom:
-        previous_date = str(yesterday_custom.created_at.date())
-        yesterday_plan = json.dumps(yesterday_custom.diet_plan)
-
-    # Prepare user data including yesterday plan for LLM
-    user_data = {
-        "name": profile.name,
-        "email": profile.email,
-        "age": profile.age,
-        "gender": profile.gender,
-        "height": profile.height,
-        "weight": profile.weight,
-        "goal": profile.goal,
-        "activity_level": profile.activity_level,
-        "diet_type": profile.diet_type,
-        "food_allergies": profile.food_allergies,
-        "food_dislikes": profile.food_dislikes,
-        "previous_date": previous_date,
-        "yesterday_plan": yesterday_plan,
-    }
-
-    # Generate new custom plan
-    assistant = CustomDietAssistant()
-    plan = assistant.get_custom_plan(user_data, ingredients, current_date=today)
-
-    # Normalize ingredients
-    if isinstance(ingredients, str):
-        ingredients = [i.strip() for i in ingredients.split(",")]
-
-    new = UserCustomDiet(
-        user_email=email,
-        ingredients=ingredients,
-        diet_plan=plan
-    )
-    db.add(new)
-    db.commit()
-    db.refresh(new)
+        return accepted_response(job)
 
-    return {
-        "date": today,
-        "custom_diet_id": new.custom_diet_id,
-        "ingredients": new.ingredients,
-        "diet_plan": new.diet_plan,
-    }
+    # Generate new custom plan (uses yesterday's plan for variety)
+    return await plans.ensure_custom_diet(db, profile, ingredients, today)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.database import SessionLocal
+from app.models import UserAuth
+from app.routers.auth import get_current_user
+from app.services.dashboard import load_dashboard
+from app.utils.dates import app_today
+
+router = APIRouter(prefix="/profile", tags=["Dashboard"])
+
+
+def get_session_factory():
+    """Sessions for the dashboard queries (one per worker thread)."""
+    return SessionLocal
+
+
+@router.get("/dashboard", response_model=dict)
+async def get_dashboard(
+    current_user: UserAuth = Depends(get_current_user),
+    session_factory=Depends(get_session_factory),
+):
+    """
+    Home screen in one call: profile basics, today's diet and workout, today's calorie
+    total and the latest weekly analysis. Sections with no stored data are null.
+    """
+    dashboard = await load_dashboard(current_user.email, app_today(), session_factory)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    return dashboard
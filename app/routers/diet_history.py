@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import date
 from app.database import SessionLocal
 from app.models import UserProfile, UserDiet
+from app.utils.dates import app_today
 
 router = APIRouter(prefix="/profile/diet-history", tags=["Diet History"])
 
@@ -35,7 +35,7 @@ def get_diet_history(data: dict, db: Session = Depends(get_db)):
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
 
-    today = date.today()
+    today = app_today()
     
     # Query past diets (excluding today)
     history = db.query(UserDiet).filter(
@@ -1,13 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import Any
+from typing import Any, List
 from app.database import SessionLocal
 from app.models import UserProfile, UserExerciseFollowUp
 from app.schemas.exercise_schema import FollowUpPayload, FollowUpResponse
 from app.ai.exercise_detector import ExerciseDetector
-import shutil
+from app.ai.resilience import LLMUnavailableError
+from app.config import settings
+from app.utils.uploads import IngestedUpload, ingest_upload
+import asyncio
 import os
 import uuid
+from datetime import datetime
 
 router = APIRouter(prefix="/profile/exercise", tags=["Exercise Validation"])
 
@@ -46,8 +51,21 @@ def get_db():
         db.close()
 
 
+def _find_profile(db: Session, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(UserProfile.email == email).first()
+
+
+async def _ingest(file: UploadFile) -> IngestedUpload:
+    try:
+        return await ingest_upload(file, UPLOAD_DIR)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
+
+
 @router.post("/validate", response_model=dict)
-def validate_exercise(
+async def validate_exercise(
     request: Request,
     email: str = Form(...),
     file: UploadFile = File(...),
@@ -59,39 +77,33 @@ def validate_exercise(
     """
 
     # 1. Verify User exists
-    profile = db.query(UserProfile).filter(UserProfile.email == email).first()
+    profile = await run_in_threadpool(_find_profile, db, email)
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # 2. Save Image Locally
-    filename = file.filename or "unknown.jpg"
-    file_extension = filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    # 2. Save Image Locally (streamed, size-capped and type-checked)
+    upload = await _ingest(file)
+    file_path = upload.path
 
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
-
-    # 3. Validate image using AI
+    # 3. Validate image using AI, from the bytes already in memory
     detector = ExerciseDetector()
     try:
-        abs_path = os.path.abspath(file_path)
-        result = detector.validate_image(abs_path)
+        result = await detector.validate_image_async(upload.content, upload.content_type)
     except Exception as e:
         if os.path.exists(file_path):
             os.remove(file_path)
+        if isinstance(e, LLMUnavailableError):
+            raise
         raise HTTPException(status_code=500, detail=f"AI Validation failed: {str(e)}")
 
     # 4. We will NOT persist this result to the DB — the endpoint is stateless for this task.
     # Return a transient id and timestamp so callers can track the response easily.
-    from datetime import datetime
-    import uuid as _uuid
+    return _validation_payload(result, file_path, request)
 
-    response_payload = {
-        "id": str(_uuid.uuid4()),
+
+def _validation_payload(result: dict, file_path: str, request: Request) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
         "created_at": datetime.utcnow().isoformat() + "Z",
         "image_path": get_image_url(file_path, request),
         "is_exercise": result.get("is_exercise"),
@@ -100,7 +112,92 @@ def validate_exercise(
         "explanation": result.get("explanation"),
     }
 
-    return response_payload
+
+@router.post("/validate-batch", response_model=dict)
+async def validate_exercise_batch(
+    request: Request,
+    email: str = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+):
+    """
+    Validate a whole session's photos in one request.
+
+    Images are validated concurrently (at most EXERCISE_BATCH_CONCURRENCY at a time) and
+    byte-identical images are validated once. `results` has one entry per uploaded file, in
+    upload order, each with `status` "ok" (plus the same fields as /validate) or "error"
+    (plus `error`). A failing image, including one that is too large or not an image,
+    doesn't fail the batch; only when every image failed because the AI provider is
+    unavailable is the 503 passed through.
+    """
+    profile = await run_in_threadpool(_find_profile, db, email)
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    if len(files) > settings.EXERCISE_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.EXERCISE_BATCH_MAX_FILES} images per batch")
+
+    # Group uploads by content hash so each distinct image is kept and validated once
+    digests: list[str | None] = []
+    rejected: dict[int, HTTPException] = {}
+    first_index: dict[str, int] = {}
+    uploads: dict[str, IngestedUpload] = {}
+    for index, file in enumerate(files):
+        try:
+            upload = await _ingest(file)
+        except HTTPException as e:
+            digests.append(None)
+            rejected[index] = e
+            continue
+        digests.append(upload.sha256)
+        if upload.sha256 in first_index:
+            await run_in_threadpool(os.remove, upload.path)
+            continue
+        first_index[upload.sha256] = index
+        uploads[upload.sha256] = upload
+
+    detector = ExerciseDetector()
+    semaphore = asyncio.Semaphore(max(settings.EXERCISE_BATCH_CONCURRENCY, 1))
+
+    async def validate_one(upload: IngestedUpload):
+        async with semaphore:
+            try:
+                result = await detector.validate_image_async(upload.content, upload.content_type)
+            except Exception as e:
+                if os.path.exists(upload.path):
+                    os.remove(upload.path)
+                return e
+        return _validation_payload(result, upload.path, request)
+
+    outcomes = dict(zip(uploads, await asyncio.gather(*(validate_one(u) for u in uploads.values()))))
+
+    # Only a batch where every file reached the AI and it was unavailable for all of them is a 503;
+    # otherwise rejected files and other failures are reported per file
+    failures = [o for o in outcomes.values() if isinstance(o, Exception)]
+    if (failures and not rejected and len(failures) == len(outcomes)
+            and all(isinstance(e, LLMUnavailableError) for e in failures)):
+        raise failures[0]
+
+    results = []
+    for index, (file, digest) in enumerate(zip(files, digests)):
+        entry = {
+            "index": index,
+            "filename": file.filename,
+            "duplicate_of": first_index[digest] if digest and first_index[digest] != index else None,
+        }
+        outcome = outcomes[digest] if digest else None
+        if index in rejected:
+            entry.update(status="error", error=rejected[index].detail)
+        elif isinstance(outcome, Exception):
+            entry.update(status="error", error=f"AI Validation failed: {outcome}")
+        else:
+            entry.update(status="ok", **outcome)
+        results.append(entry)
+
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+    }
 
 
 @router.post("/follow-up", response_model=FollowUpResponse)
@@ -5,7 +5,7 @@ from sqlalchemy import func
 from app.database import SessionLocal
 from app.models import UserProfile, GymSuggestion
 from app.ai.gym_suggestion import GymAssistant
-from datetime import date
+from app.utils.dates import app_today
 
 router = APIRouter(prefix="/profile", tags=["Gym"])
 
@@ -27,7 +27,7 @@ def create_gym_suggestion(data: dict, db: Session = Depends(get_db)):
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
 
-    today = date.today()
+    today = app_today()
 
     # Check if suggestion exists for today's date
     existing_suggestion = (
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import GenerationJob, UserAuth
+from app.routers.auth import get_current_user
+from app.services.job_queue import job_response
+
+router = APIRouter(prefix="/profile/jobs", tags=["Jobs"])
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def wants_background(data: dict) -> bool:
+    """Generation endpoints queue the work and answer 202 when the body has `"async": true`."""
+    return data.get("async") is True
+
+
+def accepted_response(job: GenerationJob) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder({
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/profile/jobs/{job.job_id}",
+        }),
+        headers={"Location": f"/profile/jobs/{job.job_id}"},
+    )
+
+
+@router.get("/{job_id}", response_model=dict)
+def get_job(
+    job_id: int,
+    current_user: UserAuth = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Poll a queued generation job.
+    `status` is one of queued, running, succeeded, failed or superseded (the profile changed
+    before the job finished and a new job was queued); `result` holds the same body the
+    synchronous endpoint would have returned once the job succeeded.
+    """
+    job = db.query(GenerationJob).filter(GenerationJob.job_id == job_id).first()
+    # Other users' jobs are reported as missing rather than forbidden
+    if not job or job.user_email != current_user.email:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
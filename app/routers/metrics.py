@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.utils.metrics import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Process-local metrics in Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
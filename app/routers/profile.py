@@ -1,15 +1,15 @@
 # app/routers/profile.py
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
-from datetime import date
-from app.ai.diet_suggestion import DietAssistant
 from app.database import SessionLocal
 from app.models import UserProfile, UserDiet, UserWorkout, UserAuth
 from app.schemas.profile_schema import ProfileCreate, ProfileResponse, ProfileUpdate
 from sqlalchemy import text
 from app.routers.auth import get_current_user
+from app.routers.jobs import accepted_response, wants_background
+from app.services import job_queue, plans, pregeneration
+from app.utils.dates import app_today
 
 router = APIRouter(prefix="/profile", tags=["Profile"])
 
@@ -20,15 +20,24 @@ def get_db():
     finally:
         db.close()
 
+def _changes_workout(profile: UserProfile, changes: dict) -> bool:
+    return any(
+        key in plans.WORKOUT_PROFILE_FIELDS and getattr(profile, key) != value
+        for key, value in changes.items()
+    )
+
 # profile creation endpoint
 @router.post("/", response_model=ProfileResponse)
 def create_or_update_profile(data: ProfileCreate, db: Session = Depends(get_db)):
     # Check if profile already exists
     profile = db.query(UserProfile).filter(UserProfile.email == data.email).first()
     
+    workout_changed = False
     if profile:
         # Update existing profile instead of creating new
-        for key, value in data.dict(exclude_unset=True).items():
+        changes = data.dict(exclude_unset=True)
+        workout_changed = _changes_workout(profile, changes)
+        for key, value in changes.items():
             setattr(profile, key, value)
     else:
         # Create new profile
@@ -41,11 +50,19 @@ def create_or_update_profile(data: ProfileCreate, db: Session = Depends(get_db))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Profile creation failed: {str(e)}")
+    if workout_changed:
+        pregeneration.invalidate_upcoming_workouts(db, profile.email)
     return profile
 
+def _find_profile(db: Session, name: str, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(
+        UserProfile.name == name,
+        UserProfile.email == email
+    ).first()
+
 # diet-plan endpoint 
 @router.post("/diet-plan", response_model=dict)
-def get_diet(
+async def get_diet(
     data: dict,
     current_user: UserAuth = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -58,10 +75,8 @@ def get_diet(
         raise HTTPException(status_code=400, detail="Name and email are required")
 
     # Fetch user profile from DB using requested email
-    profile = db.query(UserProfile).filter(
-        UserProfile.name == name,
-        UserProfile.email == email
-    ).first()
+    # (queries run in the threadpool so they don't block the event loop)
+    profile = await run_in_threadpool(_find_profile, db, name, email)
 
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
@@ -70,60 +85,22 @@ def get_diet(
     if email != current_user.email:
         raise HTTPException(status_code=401, detail="Unauthorized request")
 
-    today = date.today()
+    today = app_today()
 
     # Check if today's diet already exists
-    existing_diet = db.query(UserDiet).filter(
-        UserDiet.user_email == email,
-        func.date(UserDiet.created_at) == today
-    ).first()
-
+    existing_diet = await run_in_threadpool(plans.find_diet, db, email, today)
     if existing_diet:
-        return {
-            "date": today,
-            "diet_plan_id": existing_diet.diet_planid,
-            "diet_plan": existing_diet.diet_plan
-        }
+        return plans.diet_response(today, existing_diet)
 
-    # Fetch previous plan for context
-    latest_past_diet = db.query(UserDiet).filter(
-        UserDiet.user_email == email
-    ).order_by(UserDiet.created_at.desc()).first()
-
-    previous_date = str(latest_past_diet.created_at.date()) if latest_past_diet else "N/A"
-    yesterday_plan = latest_past_diet.diet_plan if latest_past_diet else "None"
-
-    # Send full user profile data to AI
-    user_data = {
-        "name": profile.name,
-        "email": profile.email,
-        "age": profile.age,
-        "gender": profile.gender,
-        "height": profile.height,
-        "weight": profile.weight,
-        "goal": profile.goal,
-        "activity_level": profile.activity_level,
-        "diet_type": profile.diet_type,
-        "food_allergies": profile.food_allergies,
-        "food_dislikes": profile.food_dislikes,
-        "previous_date": previous_date,
-        "yesterday_plan": yesterday_plan
-    }
-
-    assistant = DietAssistant()
-    diet_plan = assistant.get_diet_suggestion(user_data, current_date=today)
+    if wants_background(data):
+        job = await run_in_threadpool(job_queue.enqueue, db, "diet", email, {"date": today})
+        return accepted_response(job)
 
-    # Store new diet plan
-    user_diet = UserDiet(user_email=email, diet_plan=diet_plan)
-    db.add(user_diet)
-    db.commit()
-    db.refresh(user_diet)
-
-    return {
-        "date": today,
-        "diet_plan_id": user_diet.diet_planid,
-        "diet_plan": diet_plan
-    }
+    # Concurrent requests for the same (user, day) wait for one generation
+    try:
+        return await plans.ensure_diet(db, profile, today)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Diet plan generation is already in progress, retry shortly")
 
 
 @router.patch("/update", response_model=ProfileResponse)
@@ -136,11 +113,16 @@ def update_profile(
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
 
-    for key, value in data.dict(exclude_unset=True).items():
+    changes = data.dict(exclude_unset=True)
+    workout_changed = _changes_workout(profile, changes)
+    for key, value in changes.items():
         setattr(profile, key, value)
 
     db.commit()
     db.refresh(profile)
+    if workout_changed:
+        # Pre-generated plans for weeks that haven't started were built from the old profile
+        pregeneration.invalidate_upcoming_workouts(db, profile.email)
     return profile
 
 # Profile Summary Endpoint
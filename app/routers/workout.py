@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import date, timedelta
 from app.database import SessionLocal
 from app.models import UserProfile, UserWorkout
-from app.ai.workout_suggestion import WorkoutAssistant
 from fastapi.responses import StreamingResponse
+from app.utils.dates import app_today
 from app.utils.pdf import workout_plan_to_pdf_bytes
+from app.ai.resilience import LLMUnavailableError
+from app.routers.jobs import accepted_response, wants_background
+from app.services import job_queue, plans
 import io
 from datetime import datetime
 
@@ -19,8 +22,15 @@ def get_db():
     finally:
         db.close()
 
+def _find_profile(db: Session, name: str, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(
+        UserProfile.name == name,
+        UserProfile.email == email
+    ).first()
+
+
 @router.post("", response_model=dict)
-def get_workout_plan(data: dict, db: Session = Depends(get_db)):
+async def get_workout_plan(data: dict, db: Session = Depends(get_db)):
     """
     Get or generate a weekly workout plan (Mon-Sat).
     Returns existing plan if valid for current week, else generates new one.
@@ -31,109 +41,57 @@ def get_workout_plan(data: dict, db: Session = Depends(get_db)):
     if not name or not email:
         raise HTTPException(status_code=400, detail="Name and email are required")
 
-    # 1. Verify User
-    profile = db.query(UserProfile).filter(
-        UserProfile.name == name,
-        UserProfile.email == email
-    ).first()
+    # 1. Verify User (queries run in the threadpool so they don't block the event loop)
+    profile = await run_in_threadpool(_find_profile, db, name, email)
 
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
 
     # 2. Calculate Week Details (Calendar based for consistency)
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())  # Monday
-    end_of_week = start_of_week + timedelta(days=6)          # Sunday
-
-    # 3. Determine User-Specific Week Number
-    # Find the user's very first workout plan start date
-    first_workout = db.query(UserWorkout).filter(
-        UserWorkout.user_email == email
-    ).order_by(UserWorkout.week_start.asc()).first()
-
-    if not first_workout:
-        # This is the user's first ever plan
-        user_week_number = 1
-    else:
-        # Calculate week number relative to the first plan
-        # If the first plan started on Jan 1st, and today is Jan 8th, that's Week 2.
-        delta_days = (start_of_week - first_workout.week_start).days
-        # Ensure we don't get negative or zero if something is weird, though delta should be >= 0
-        if delta_days < 0:
-            user_week_number = 1 # Should not happen if logic is correct
-        else:
-            user_week_number = (delta_days // 7) + 1
-
-    # 4. Check for existing plan for THIS specific user week number
-    # We check if a plan exists with the calculated user_week_number OR the current calendar start_of_week
-    # Using week_start is safer to avoid duplicates if user generates multiple times in one week
-    existing_plan = db.query(UserWorkout).filter(
-        UserWorkout.user_email == email,
-        UserWorkout.week_start == start_of_week
-    ).first()
+    today = app_today()
+    start_of_week, _ = plans.week_bounds(today)
 
-    # Helper function to sort plan days
-    def sort_plan(plan):
-        ordered_days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
-        sorted_dict = {}
-        for day in ordered_days:
-            if day in plan:
-                sorted_dict[day] = plan[day]
-        # Include any extra keys (like if Sunday was accidentally returned)
-        for k, v in plan.items():
-            if k not in ordered_days:
-                sorted_dict[k] = v
-        return sorted_dict
+    # 3. Check for existing plan for the current calendar week
+    # Using week_start is safer to avoid duplicates if user generates multiple times in one week
+    existing_plan = await run_in_threadpool(plans.find_workout, db, email, start_of_week)
 
     if existing_plan:
-        # If plan exists, return its stored week number (which should match our calculation)
+        # If plan exists, return its stored week number
         return {
-            "status": "existing",
-            "week_start": existing_plan.week_start,
-            "week_end": existing_plan.week_end,
-            "week_number": existing_plan.week_number,
+            **plans.workout_response("existing", existing_plan),
             "workout_plan": sort_plan(existing_plan.workout_plan)
         }
 
-    # 5. Generate New Plan
-    user_data = {
-        "age": profile.age,
-        "gender": profile.gender,
-        "height": profile.height,
-        "weight": profile.weight,
-        "goal": profile.goal,
-        "activity_level": profile.activity_level,
-        "medical_conditions": profile.medical_conditions,
-        "injuries": profile.injuries,
-        "workout_time": profile.workout_time,
-        "budget": profile.budget
-    }
-
-    assistant = WorkoutAssistant()
+    if wants_background(data):
+        job = await run_in_threadpool(job_queue.enqueue, db, "workout", email, {"date": today})
+        return accepted_response(job)
+
+    # 4. Generate New Plan; week number is relative to the user's first plan
+    # (concurrent requests for the same user/week wait for one generation)
     try:
-        workout_plan = assistant.get_workout_suggestion(user_data)
+        result = await plans.ensure_workout(db, profile, today)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Workout plan generation is already in progress, retry shortly")
+    except LLMUnavailableError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI Generation failed: {str(e)}")
 
-    # 6. Save to DB with User-Based Week Number
-    new_workout = UserWorkout(
-        user_email=email,
-        workout_plan=workout_plan,
-        week_start=start_of_week,
-        week_end=end_of_week,
-        week_number=user_week_number
-    )
-    db.add(new_workout)
-    db.commit()
-    db.refresh(new_workout)
-
-    return {
-        "status": "created",
-        "week_start": new_workout.week_start,
-        "week_end": new_workout.week_end,
-        "week_number": new_workout.week_number,
-        "workout_plan": sort_plan(workout_plan)
-    }
+    return {**result, "workout_plan": sort_plan(result["workout_plan"])}
+
+
+def sort_plan(plan):
+    """Order plan days Monday..Saturday, keeping any extra keys after them."""
+    ordered_days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
+    sorted_dict = {}
+    for day in ordered_days:
+        if day in plan:
+            sorted_dict[day] = plan[day]
+    # Include any extra keys (like if Sunday was accidentally returned)
+    for k, v in plan.items():
+        if k not in ordered_days:
+            sorted_dict[k] = v
+    return sorted_dict
 
 
 @router.post('/pdf-download')
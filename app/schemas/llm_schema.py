@@ -0,0 +1,92 @@
+"""Expected shapes of the JSON the assistants ask the LLM for.
+
+Used by app/ai/output_parser.py to validate model output before it is stored or returned.
+Kept lenient on purpose (numbers may arrive as "20g", unknown keys are allowed) so only
+structurally broken output is rejected and sent for repair.
+"""
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, RootModel
+
+Number = Union[int, float, str]
+
+
+class LLMOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+class MealTotals(LLMOutput):
+    fat: Optional[Number] = None
+    carbs: Optional[Number] = None
+    protein: Optional[Number] = None
+    calories: Optional[Number] = None
+
+
+class Meal(LLMOutput):
+    items: List[str]
+    total: Optional[MealTotals] = None
+    recipe: Optional[str] = None
+
+
+class DietPlanOutput(LLMOutput):
+    breakfast: Meal
+    lunch: Meal
+    dinner: Meal
+
+
+class CustomDietOutput(DietPlanOutput):
+    date: Optional[str] = None
+
+
+class WorkoutExercise(LLMOutput):
+    name: str
+    sets: Optional[Number] = None
+    reps: Optional[Number] = None
+    rest: Optional[Number] = None
+    notes: Optional[str] = None
+
+
+class WorkoutDay(LLMOutput):
+    focus: Optional[str] = None
+    exercises: List[WorkoutExercise] = Field(default_factory=list)
+
+
+class WorkoutPlanOutput(RootModel[Dict[str, Union[WorkoutDay, str]]]):
+    """Day name -> plan for the day (a plain string such as "Rest" is accepted)."""
+
+
+class IngredientEstimate(LLMOutput):
+    item: str
+    estimated_calories: Optional[Number] = None
+
+
+class CalorieOutput(LLMOutput):
+    dish_name: str
+    description: Optional[str] = None
+    estimated_calories: Number
+    calorie_range: Optional[str] = None
+    ingredients: List[IngredientEstimate] = Field(default_factory=list)
+    macronutrients: Optional[Dict[str, Number]] = None
+    health_rating: Optional[Number] = None
+    advice: Optional[str] = None
+
+
+class ExerciseDetectOutput(LLMOutput):
+    is_exercise: bool
+    confidence: float = Field(default=0.0, ge=0.0, le=1.0)
+    label: Optional[str] = None
+    explanation: Optional[str] = None
+
+
+class DailyStat(LLMOutput):
+    day: Optional[str] = None
+    date: str
+    total_exercises: int = 0
+    completed_exercises: int = 0
+
+
+class WeeklyAnalysisOutput(LLMOutput):
+    advice: Optional[str] = None
+    week_start: Optional[str] = None
+    week_end: Optional[str] = None
+    daily_stats: Optional[List[DailyStat]] = None
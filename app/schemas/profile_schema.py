@@ -31,6 +31,7 @@ class ProfileCreate(BaseModel):
     pincode: str
     city: str
     budget: str | None = None
+    plan_reuse_opt_out: bool | None = None
 
 class ProfileResponse(BaseModel):
     userid: int
@@ -57,6 +58,7 @@ class ProfileResponse(BaseModel):
     pincode: Optional[str] = None
     city: Optional[str] = None
     budget: Optional[str] = None
+    plan_reuse_opt_out: Optional[bool] = None
 
     class Config:
         from_attributes = True
@@ -84,3 +86,4 @@ class ProfileUpdate(BaseModel):
     pincode: str | None = None
     city: str | None = None
     budget: str | None = None
+    plan_reuse_opt_out: bool | None = None
@@ -0,0 +1,192 @@
+"""Perceptual-hash cache of calorie detection results.
+
+Every analysed food photo gets a 64-bit difference hash (dHash: grayscale, 9x8 thumbnail, one
+bit per horizontally adjacent pixel pair), stored on its `UserFoodLog` row. Re-uploads of the
+same photo, or near-identical burst shots, hash to within a few bits of each other.
+A new upload is compared against the user's own logs (`CALORIE_CACHE_MAX_DISTANCE` bits)
+and then against everyone's logs with a stricter `CALORIE_CACHE_GLOBAL_MAX_DISTANCE`. On a
+hit the stored `food_analysis` is reused and no LLM call is made.
+
+Low-texture photos (dark, blurry or close-up plate shots) all hash to (nearly) the same value
+no matter what food is in them, so they are never hashed. A photo whose grayscale contrast is
+below `CALORIE_CACHE_MIN_CONTRAST`, or whose hash has fewer than `MIN_HASH_BITS` bits set (or
+cleared), is always analysed and never enters the index.
+
+To tune the thresholds, hits are counted by scope together with their Hamming distance.
+A sample of hits (`CALORIE_CACHE_VERIFY_RATE`) is also re-analysed in the background and
+compared with the cached result, and `calorie_cache_verifications_total{result="mismatch"}`
+counts false matches.
+"""
+import asyncio
+import io
+import logging
+import random
+import threading
+
+import numpy as np
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import UserFoodLog
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("calorie_cache_lookups_total", "Calorie photo hash lookups, by outcome and scope")
+metrics.describe("calorie_cache_hit_distance", "Hamming distance between an upload and the cached photo it matched")
+metrics.describe("calorie_cache_verifications_total", "Sampled cache hits re-analysed by the LLM, by result")
+
+DISTANCE_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+# Calorie estimates further apart than this (relative) count as a false match
+CALORIE_TOLERANCE = 0.25
+# Hashes with fewer set (or cleared) bits than this say more about lighting than about the food
+MIN_HASH_BITS = 8
+
+_tasks: set[asyncio.Task] = set()
+
+
+def informative(image_hash: str) -> bool:
+    """Whether a hash has enough structure to identify a photo (not all-dark, flat or blurred)."""
+    return MIN_HASH_BITS <= int(image_hash, 16).bit_count() <= 64 - MIN_HASH_BITS
+
+
+def dhash(image: str | bytes) -> str | None:
+    """64-bit difference hash (of a file path or image bytes) as 16 hex chars.
+
+    None if it isn't a readable image or is too low-texture to be matched reliably.
+    """
+    try:
+        with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as opened:
+            gray = opened.convert("L")
+            contrast = float(np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float32).std())
+            pixels = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    except Exception as e:
+        logger.info("Could not hash image: %s", e)
+        return None
+    if contrast < settings.CALORIE_CACHE_MIN_CONTRAST:
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    image_hash = f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+    return image_hash if informative(image_hash) else None
+
+
+def hamming(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+class ImageHashIndex:
+    """In-process copy of all stored photo hashes, synced from `user_food_logs` by log_id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._last_id = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._owners = np.zeros(0, dtype=object)
+        self._hashes = np.zeros(0, dtype=np.uint64)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _sync(self, db: Session) -> None:
+        rows = db.query(UserFoodLog.log_id, UserFoodLog.user_email, UserFoodLog.image_hash).filter(
+            UserFoodLog.log_id > self._last_id,
+            UserFoodLog.image_hash.isnot(None),
+        ).order_by(UserFoodLog.log_id).all()
+        if not rows:
+            return
+        last_id = rows[-1].log_id
+        # Hashes stored before low-texture photos were excluded
+        rows = [r for r in rows if informative(r.image_hash)]
+        if not rows:
+            self._last_id = last_id
+            return
+        self._ids = np.concatenate([self._ids, np.asarray([r.log_id for r in rows], dtype=np.int64)])
+        self._owners = np.concatenate([self._owners, np.asarray([r.user_email for r in rows], dtype=object)])
+        self._hashes = np.concatenate([self._hashes, np.asarray([int(r.image_hash, 16) for r in rows], dtype=np.uint64)])
+        self._last_id = last_id
+
+    def _distances(self, image_hash: str) -> np.ndarray:
+        xor = np.bitwise_xor(self._hashes, np.uint64(int(image_hash, 16)))
+        return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+    def candidates(self, db: Session, email: str, image_hash: str) -> list[tuple[int, int, str]]:
+        """(log_id, distance, scope) within the thresholds, the user's own logs first, nearest first."""
+        with self._lock:
+            self._sync(db)
+            if not len(self._ids):
+                return []
+            distances = self._distances(image_hash)
+            own = self._owners == email
+            found = []
+            for scope, mask, limit in (
+                ("user", own, settings.CALORIE_CACHE_MAX_DISTANCE),
+                ("global", ~own, settings.CALORIE_CACHE_GLOBAL_MAX_DISTANCE),
+            ):
+                idx = np.flatnonzero(mask & (distances <= limit))
+                for i in idx[np.argsort(distances[idx], kind="stable")]:
+                    found.append((int(self._ids[i]), int(distances[i]), scope))
+            return found
+
+    def lookup(self, db: Session, email: str, image_hash: str | None) -> tuple[UserFoodLog, int, str] | None:
+        """Closest stored log for this photo (user's own first), or None."""
+        if not settings.CALORIE_CACHE_ENABLED or image_hash is None:
+            metrics.inc("calorie_cache_lookups_total", {"outcome": "skipped", "scope": "none"})
+            return None
+        for log_id, distance, scope in self.candidates(db, email, image_hash):
+            log = db.get(UserFoodLog, log_id)
+            # Deleted logs stay in the in-memory index until the next restart
+            if log is None or not log.food_analysis:
+                continue
+            metrics.inc("calorie_cache_lookups_total", {"outcome": "hit", "scope": scope})
+            metrics.observe("calorie_cache_hit_distance", distance, {"scope": scope}, buckets=DISTANCE_BUCKETS)
+            return log, distance, scope
+        metrics.inc("calorie_cache_lookups_total", {"outcome": "miss", "scope": "none"})
+        return None
+
+
+def _calories(analysis: dict) -> float | None:
+    try:
+        return float(str(analysis.get("estimated_calories")).split()[0])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def same_result(cached: dict, fresh: dict) -> bool:
+    """Whether a fresh analysis agrees with the cached one (same dish, calories within tolerance)."""
+    if str(cached.get("dish_name", "")).strip().lower() != str(fresh.get("dish_name", "")).strip().lower():
+        return False
+    a, b = _calories(cached), _calories(fresh)
+    if a is None or b is None:
+        return a == b
+    return abs(a - b) <= CALORIE_TOLERANCE * max(a, b, 1.0)
+
+
+async def _verify(detect, image: str | bytes, cached: dict, distance: int, scope: str) -> None:
+    try:
+        fresh = await detect(image)
+    except Exception as e:
+        logger.info("Calorie cache verification skipped: %s", e)
+        return
+    result = "match" if same_result(cached, fresh) else "mismatch"
+    metrics.inc("calorie_cache_verifications_total", {"result": result, "scope": scope})
+    if result == "mismatch":
+        logger.warning("Calorie cache false match at distance %d (%s): cached %r, fresh %r",
+                       distance, scope, cached.get("dish_name"), fresh.get("dish_name"))
+
+
+def maybe_verify(detect, image: str | bytes, cached: dict, distance: int, scope: str) -> asyncio.Task | None:
+    """Re-analyse a sampled cache hit in the background to measure the false-match rate."""
+    if random.random() >= settings.CALORIE_CACHE_VERIFY_RATE:
+        return None
+    task = asyncio.get_running_loop().create_task(_verify(detect, image, cached, distance, scope))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+image_index = ImageHashIndex()
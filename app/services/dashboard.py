@@ -0,0 +1,113 @@
+"""Home-screen dashboard: everything the app's first screen needs in one round trip.
+
+The profile is loaded first (a missing profile means there is nothing to show); the four
+sections (today's diet, today's workout, today's calorie total, latest weekly analysis) are
+then read concurrently. Every read runs in a worker thread with its own session, since a
+SQLAlchemy session must not be shared between threads and must not block the event loop.
+Nothing is generated here: a section without stored data comes back as null and the client
+can call the generation endpoint for it.
+"""
+import asyncio
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import UserExerciseAnalysis, UserFoodLog, UserProfile
+from app.services import plans
+from app.services.meals import to_number
+from app.utils.dates import WEEKDAYS
+
+
+def profile_basics(db: Session, email: str) -> dict | None:
+    profile = db.query(UserProfile).filter(UserProfile.email == email).first()
+    if profile is None:
+        return None
+    return {
+        "name": profile.name,
+        "goal": profile.goal,
+        "weight": profile.weight,
+        "height": profile.height,
+        "diet_type": profile.diet_type,
+    }
+
+
+def today_diet(db: Session, email: str, today: date) -> dict | None:
+    diet = plans.find_diet(db, email, today)
+    if diet is None:
+        return None
+    meals = diet.diet_plan if isinstance(diet.diet_plan, dict) else {}
+    # Items and totals only; recipes stay behind /profile/diet-plan
+    return {
+        "diet_plan_id": diet.diet_planid,
+        "meals": {
+            name: {"items": meal.get("items"), "total": meal.get("total")} if isinstance(meal, dict) else meal
+            for name, meal in meals.items()
+        },
+    }
+
+
+def today_workout(db: Session, email: str, today: date) -> dict | None:
+    start_of_week, _ = plans.week_bounds(today)
+    workout = plans.find_workout(db, email, start_of_week)
+    if workout is None:
+        return None
+    day = WEEKDAYS[today.weekday()]
+    by_day = {k.lower(): v for k, v in (workout.workout_plan or {}).items()} if isinstance(workout.workout_plan, dict) else {}
+    return {
+        "week_number": workout.week_number,
+        "week_start": workout.week_start,
+        "day": day,
+        "plan": by_day.get(day, "Rest day"),
+    }
+
+
+def calories_today(db: Session, email: str, today: date) -> dict:
+    analyses = db.query(UserFoodLog.food_analysis).filter(
+        UserFoodLog.user_email == email,
+        func.date(UserFoodLog.created_at) == today,
+    ).all()
+    total = sum(to_number((analysis or {}).get("estimated_calories")) for (analysis,) in analyses)
+    return {"total_calories": round(total), "meals_logged": len(analyses)}
+
+
+def latest_analysis(db: Session, email: str) -> dict | None:
+    analysis = db.query(UserExerciseAnalysis).filter(
+        UserExerciseAnalysis.user_email == email
+    ).order_by(UserExerciseAnalysis.created_at.desc()).first()
+    if analysis is None:
+        return None
+    stats = analysis.daily_stats or []
+    return {
+        "week_start": analysis.week_start,
+        "week_end": analysis.week_end,
+        "advice": analysis.advice,
+        "completed_exercises": sum(int(s.get("completed_exercises") or 0) for s in stats if isinstance(s, dict)),
+        "total_exercises": sum(int(s.get("total_exercises") or 0) for s in stats if isinstance(s, dict)),
+    }
+
+
+def _with_session(session_factory, loader, *args):
+    with session_factory() as db:
+        return loader(db, *args)
+
+
+async def load_dashboard(email: str, today: date, session_factory) -> dict | None:
+    """Returns None when the user has no profile yet."""
+    profile = await asyncio.to_thread(_with_session, session_factory, profile_basics, email)
+    if profile is None:
+        return None
+    diet, workout, calories, analysis = await asyncio.gather(
+        asyncio.to_thread(_with_session, session_factory, today_diet, email, today),
+        asyncio.to_thread(_with_session, session_factory, today_workout, email, today),
+        asyncio.to_thread(_with_session, session_factory, calories_today, email, today),
+        asyncio.to_thread(_with_session, session_factory, latest_analysis, email),
+    )
+    return {
+        "date": today,
+        "profile": profile,
+        "diet": diet,
+        "workout": workout,
+        "calories": calories,
+        "analysis": analysis,
+    }
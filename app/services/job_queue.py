@@ -0,0 +1,243 @@
+"""DB-backed queue for long-running plan generation.
+
+Endpoints enqueue a `GenerationJob` row and answer `202 Accepted`; workers claim rows with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of worker tasks (in the API process or in
+standalone `python -m app.services.job_queue` processes) can share one table without
+double-processing. Results are stored as JSON on the row and read back via `/profile/jobs/{id}`.
+Claiming, loading the profile and recording the outcome run in worker threads, so a worker
+task only holds the event loop while it awaits the handler.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import GenerationJob, UserProfile, UserWorkout
+from app.services import plans
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+metrics.describe("generation_jobs_total", "Generation jobs finished, by kind and status")
+metrics.describe("generation_job_seconds", "Time from claiming a generation job to finishing it")
+
+
+# -- handlers ---------------------------------------------------------------------------
+
+async def _run_diet(db: Session, profile: UserProfile, payload: dict) -> dict:
+    return await plans.ensure_diet(db, profile, date.fromisoformat(payload["date"]))
+
+
+async def _run_workout(db: Session, profile: UserProfile, payload: dict) -> dict:
+    return await plans.ensure_workout(db, profile, date.fromisoformat(payload["date"]))
+
+
+async def _run_custom_diet(db: Session, profile: UserProfile, payload: dict) -> dict:
+    return await plans.ensure_custom_diet(db, profile, payload["ingredients"], date.fromisoformat(payload["date"]))
+
+
+JOB_HANDLERS = {
+    "diet": _run_diet,
+    "workout": _run_workout,
+    "custom_diet": _run_custom_diet,
+}
+
+
+# -- producer side ----------------------------------------------------------------------
+
+def enqueue(db: Session, kind: str, user_email: str, payload: dict) -> GenerationJob:
+    """Queue a job, reusing an identical job for the user that is still queued or running."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    payload = jsonable_encoder(payload)
+    active = db.query(GenerationJob).filter(
+        GenerationJob.kind == kind,
+        GenerationJob.user_email == user_email,
+        GenerationJob.status.in_(ACTIVE_STATUSES),
+    ).all()
+    for job in active:
+        if job.payload == payload:
+            return job
+
+    job = GenerationJob(kind=kind, user_email=user_email, payload=payload, status="queued", attempts=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def job_response(job: GenerationJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# -- consumer side ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    """The fields of a claimed job, read before the claim commits expires the row."""
+    job_id: int
+    kind: str
+    user_email: str
+    payload: dict
+    attempts: int
+
+
+def claim_next(db: Session) -> ClaimedJob | None:
+    """Atomically move the oldest queued job to running. Locked rows are skipped, not waited on."""
+    job = (
+        db.query(GenerationJob)
+        .filter(GenerationJob.status == "queued")
+        .order_by(GenerationJob.job_id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc)
+    job.attempts = (job.attempts or 0) + 1
+    claimed = ClaimedJob(job.job_id, job.kind, job.user_email, job.payload or {}, job.attempts)
+    db.commit()
+    return claimed
+
+
+def _load_profile(db: Session, email: str) -> UserProfile | None:
+    return db.query(UserProfile).filter(UserProfile.email == email).first()
+
+
+def _finish_job(db: Session, job_id: int, result: dict | None, error: str | None) -> str:
+    # The handler may have committed or rolled back, so the job row is re-read
+    db.rollback()
+    job = db.get(GenerationJob, job_id)
+    if job.status == "superseded":
+        return _finish_superseded(db, job, result)
+    if error is None:
+        job.status = "succeeded"
+        job.result = result
+    else:
+        job.status = "failed"
+        job.error = error
+    job.finished_at = datetime.now(timezone.utc)
+    status = job.status
+    db.commit()
+    return status
+
+
+def _finish_superseded(db: Session, job: GenerationJob, result: dict | None) -> str:
+    """The profile changed while the job ran (see `pregeneration.invalidate_upcoming_workouts`).
+
+    A workout week it created was built from the old profile: drop it and queue the week again.
+    """
+    created = job.kind == "workout" and (result or {}).get("status") == "created"
+    if created:
+        db.query(UserWorkout).filter(
+            UserWorkout.user_email == job.user_email,
+            UserWorkout.week_start == date.fromisoformat(result["week_start"]),
+        ).delete(synchronize_session=False)
+    job.finished_at = datetime.now(timezone.utc)
+    kind, user_email, payload = job.kind, job.user_email, job.payload
+    db.commit()
+    if created:
+        enqueue(db, kind, user_email, payload)
+    return "superseded"
+
+
+async def run_job(db: Session, job: ClaimedJob) -> None:
+    started = time.perf_counter()
+    result, error = None, None
+    try:
+        profile = await asyncio.to_thread(_load_profile, db, job.user_email)
+        if not profile:
+            raise LookupError("User not found")
+        result = jsonable_encoder(await JOB_HANDLERS[job.kind](db, profile, job.payload))
+    except Exception as e:
+        logger.warning("Generation job %s (%s) failed: %s", job.job_id, job.kind, e)
+        error = str(e)
+    status = await asyncio.to_thread(_finish_job, db, job.job_id, result, error)
+    metrics.inc("generation_jobs_total", {"kind": job.kind, "status": status})
+    metrics.observe("generation_job_seconds", time.perf_counter() - started, {"kind": job.kind})
+
+
+async def run_once(session_factory=SessionLocal) -> bool:
+    """Claim and process a single job. Returns False when the queue was empty."""
+    db = session_factory()
+    try:
+        job = await asyncio.to_thread(claim_next, db)
+        if job is None:
+            return False
+        await run_job(db, job)
+        return True
+    finally:
+        await asyncio.to_thread(db.close)
+
+
+def requeue_stale(db: Session, older_than: float | None = None) -> int:
+    """Put jobs left `running` by a crashed worker back in the queue."""
+    older_than = settings.JOB_STALE_AFTER if older_than is None else older_than
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+    count = db.query(GenerationJob).filter(
+        GenerationJob.status == "running",
+        GenerationJob.started_at < cutoff,
+    ).update({"status": "queued"}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+async def worker_loop(session_factory=SessionLocal, poll_interval: float | None = None) -> None:
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    while True:
+        try:
+            if await run_once(session_factory):
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # e.g. DB unavailable; keep the worker alive and retry after the poll interval
+            logger.error("Generation worker error: %s", e)
+        await asyncio.sleep(poll_interval)
+
+
+def start_workers(concurrency: int | None = None, session_factory=SessionLocal) -> list[asyncio.Task]:
+    concurrency = settings.JOB_WORKER_CONCURRENCY if concurrency is None else concurrency
+    if concurrency <= 0:
+        return []
+    with session_factory() as db:
+        requeued = requeue_stale(db)
+        if requeued:
+            logger.info("Re-queued %d stale generation jobs", requeued)
+    return [asyncio.create_task(worker_loop(session_factory), name=f"generation-worker-{i}") for i in range(concurrency)]
+
+
+async def stop_workers(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _serve_forever() -> None:
+    tasks = start_workers(max(settings.JOB_WORKER_CONCURRENCY, 1))
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve_forever())
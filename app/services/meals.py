@@ -0,0 +1,56 @@
+"""Merging per-photo calorie analyses into one meal-level analysis.
+
+`POST /profile/calorie/detect-meal` analyses each photo of a meal (main dish, sides, drink)
+separately and stores a single `UserFoodLog` whose `food_analysis` has the usual top-level
+fields (so history, the dashboard and the calorie total treat it like any other log) plus an
+`items` list with the per-photo breakdown.
+"""
+import re
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# A comma between digits that starts a group of three, as in "1,200 kcal"
+_GROUPING = re.compile(r"(?<=\d),(?=\d{3}\b)")
+
+
+def _numbers(value) -> list[float]:
+    return [float(n) for n in _NUMBER.findall(_GROUPING.sub("", str(value or "")))]
+
+
+def to_number(value) -> float:
+    """Numbers as the detector returns them: 320, "320", "300 kcal", "1,200 kcal", "20g" (0 if absent)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    numbers = _numbers(value)
+    return numbers[0] if numbers else 0.0
+
+
+def _range(analysis: dict) -> tuple[float, float]:
+    numbers = _numbers(analysis.get("calorie_range"))
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    calories = to_number(analysis.get("estimated_calories"))
+    return calories, calories
+
+
+def merge_meal(items: list[dict]) -> dict:
+    """Combine per-photo analyses (each may carry an `image_path`) into one meal analysis."""
+    calories = sum(to_number(item.get("estimated_calories")) for item in items)
+    low = sum(_range(item)[0] for item in items)
+    high = sum(_range(item)[1] for item in items)
+
+    macros: dict[str, float] = {}
+    for item in items:
+        for name, value in (item.get("macronutrients") or {}).items():
+            macros[name] = macros.get(name, 0.0) + to_number(value)
+
+    names = [str(item.get("dish_name")) for item in items if item.get("dish_name")]
+    return {
+        "dish_name": " + ".join(names) or None,
+        "description": " ".join(str(item["description"]) for item in items if item.get("description")) or None,
+        "estimated_calories": round(calories),
+        "calorie_range": f"{round(low)}-{round(high)} kcal",
+        "ingredients": [ingredient for item in items for ingredient in item.get("ingredients") or []],
+        "macronutrients": {name: round(value, 1) for name, value in macros.items()} or None,
+        "advice": " ".join(str(item["advice"]) for item in items if item.get("advice")) or None,
+        "items": items,
+    }
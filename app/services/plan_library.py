@@ -0,0 +1,197 @@
+"""Reuse of generated workout plans across users with near-identical profiles.
+
+Every freshly generated workout plan is stored in `workout_plan_library` together with the
+prompt inputs it was generated from, encoded as a vector: scaled numbers (age per 10 years,
+height per 10 cm, weight per 10 kg, session length per 15 minutes) plus one-hot slots for the
+categorical inputs (gender, goal, activity level, budget). Before generating a plan, the
+library looks for the nearest stored vector from another user with NumPy. If it lies within
+`WORKOUT_LIBRARY_MAX_DISTANCE` and its categorical inputs match exactly, that plan is served
+instead of making an LLM call. With one-hot slots a single categorical mismatch already adds
+sqrt(2) to the distance.
+
+Plans are never reused for or from profiles with medical conditions or injuries, or users
+who set `plan_reuse_opt_out`. The source's current profile is re-checked before an entry is
+served, so plans stored before a user opted out or added a condition aren't shared. The vectors are cached per process and synced incrementally
+(rows with a higher id) on each lookup; the plans themselves stay in the database.
+"""
+import copy
+import hashlib
+import logging
+import re
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import UserProfile, WorkoutPlanLibraryEntry
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("workout_library_lookups_total", "Workout plan library lookups, by outcome (hit/miss/skipped)")
+metrics.describe("workout_library_hit_ratio", "Share of eligible workout generations served from the library")
+
+# (field, scale): one unit of distance per `scale` of the raw value
+NUMERIC_FEATURES = (("age", 10.0), ("height", 10.0), ("weight", 10.0), ("session_minutes", 15.0))
+CATEGORICAL_FEATURES = ("gender", "goal", "activity_level", "budget")
+CATEGORICAL_SLOTS = 256
+VECTOR_SIZE = len(NUMERIC_FEATURES) + CATEGORICAL_SLOTS
+# How many nearest candidates are checked for an exact categorical match (hash collisions)
+CANDIDATES = 5
+
+_NO_CONDITION = {"", "none", "no", "nil", "na", "n/a", "nothing", "-", "null"}
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?\b", re.IGNORECASE)
+
+
+def _norm(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def has_condition(value) -> bool:
+    return _norm(value) not in _NO_CONDITION
+
+
+def session_minutes(value) -> float | None:
+    """Session length from free-form text such as "30 mins", "1 hour" or "45-60 min"."""
+    m = _DURATION_RE.search(str(value or ""))
+    if not m:
+        return None
+    amount = float(m.group(1))
+    return amount * 60 if (m.group(2) or "").lower().startswith("h") else amount
+
+
+def features(user_data: dict) -> dict:
+    """Normalised inputs the workout prompt depends on (conditions excluded: never reused)."""
+    out = {field: _norm(user_data.get(field)) for field in CATEGORICAL_FEATURES}
+    for field in ("age", "height", "weight"):
+        value = user_data.get(field)
+        out[field] = float(value) if isinstance(value, (int, float)) else None
+    minutes = session_minutes(user_data.get("workout_time"))
+    out["session_minutes"] = minutes
+    if minutes is None:
+        # Unparseable session length: only reused on an exact text match
+        out["workout_time"] = _norm(user_data.get("workout_time"))
+    return out
+
+
+def _exact_keys(feats: dict) -> dict:
+    keys = {field: feats.get(field) for field in CATEGORICAL_FEATURES}
+    keys["workout_time"] = feats.get("workout_time")
+    # A missing number can't be compared, so it has to be missing on both sides
+    keys.update({field: feats.get(field) is None for field, _ in NUMERIC_FEATURES})
+    return keys
+
+
+def _slot(field: str, value: str) -> int:
+    return int(hashlib.sha1(f"{field}={value}".encode()).hexdigest(), 16) % CATEGORICAL_SLOTS
+
+
+def encode(feats: dict) -> list[float]:
+    vector = [0.0] * VECTOR_SIZE
+    for i, (field, scale) in enumerate(NUMERIC_FEATURES):
+        if feats.get(field) is not None:
+            vector[i] = feats[field] / scale
+    for field in CATEGORICAL_FEATURES:
+        vector[len(NUMERIC_FEATURES) + _slot(field, feats.get(field) or "")] += 1.0
+    return vector
+
+
+def eligible(profile: UserProfile) -> bool:
+    return not (
+        getattr(profile, "plan_reuse_opt_out", False)
+        or has_condition(profile.medical_conditions)
+        or has_condition(profile.injuries)
+    )
+
+
+class PlanLibrary:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._last_id = 0
+        self._ids: list[int] = []
+        self._owners: list[str] = []
+        self._matrix = np.zeros((0, VECTOR_SIZE))
+
+    def clear(self) -> None:
+        """Drop the cached vectors (they are reloaded from the table on the next lookup)."""
+        with self._lock:
+            self._reset()
+
+    def _sync(self, db: Session) -> None:
+        rows = db.query(
+            WorkoutPlanLibraryEntry.id, WorkoutPlanLibraryEntry.source_email, WorkoutPlanLibraryEntry.vector
+        ).filter(WorkoutPlanLibraryEntry.id > self._last_id).order_by(WorkoutPlanLibraryEntry.id).all()
+        if not rows:
+            return
+        self._ids.extend(row.id for row in rows)
+        self._owners.extend(row.source_email for row in rows)
+        self._matrix = np.vstack([self._matrix, np.asarray([row.vector for row in rows], dtype=float)])
+        self._last_id = rows[-1].id
+
+    def nearest(self, db: Session, feats: dict, exclude_email: str | None = None) -> list[tuple[int, float]]:
+        """Up to CANDIDATES (entry id, distance) pairs, closest first, excluding `exclude_email`'s own plans."""
+        with self._lock:
+            self._sync(db)
+            if not self._ids:
+                return []
+            distances = np.linalg.norm(self._matrix - np.asarray(encode(feats)), axis=1)
+            if exclude_email is not None:
+                distances[np.asarray(self._owners) == exclude_email] = np.inf
+            order = np.argsort(distances)[:CANDIDATES]
+            return [(self._ids[i], float(distances[i])) for i in order if np.isfinite(distances[i])]
+
+    def _record(self, outcome: str) -> None:
+        metrics.inc("workout_library_lookups_total", {"outcome": outcome})
+        if outcome == "skipped":
+            return
+        with self._lock:
+            if outcome == "hit":
+                self._hits += 1
+            else:
+                self._misses += 1
+            metrics.set_gauge("workout_library_hit_ratio", self._hits / (self._hits + self._misses))
+
+    @staticmethod
+    def _shareable(db: Session, entry: WorkoutPlanLibraryEntry) -> bool:
+        """Whether the entry's source user still allows (and qualifies for) reuse of their plans."""
+        source = db.query(UserProfile).filter(UserProfile.email == entry.source_email).first()
+        return source is not None and eligible(source)
+
+    def lookup(self, db: Session, profile: UserProfile, user_data: dict) -> dict | None:
+        """A stored plan generated for a near-identical profile, or None."""
+        if not settings.WORKOUT_LIBRARY_ENABLED or not eligible(profile):
+            self._record("skipped")
+            return None
+        feats = features(user_data)
+        wanted = _exact_keys(feats)
+        for entry_id, distance in self.nearest(db, feats, exclude_email=profile.email):
+            if distance > settings.WORKOUT_LIBRARY_MAX_DISTANCE:
+                break
+            entry = db.get(WorkoutPlanLibraryEntry, entry_id)
+            if entry is not None and _exact_keys(entry.features) == wanted and self._shareable(db, entry):
+                self._record("hit")
+                logger.info("Reusing library workout %s for %s (distance %.2f)", entry_id, profile.email, distance)
+                return copy.deepcopy(entry.workout_plan)
+        self._record("miss")
+        return None
+
+    def add(self, db: Session, profile: UserProfile, user_data: dict, workout_plan: dict) -> None:
+        """Stage a freshly generated plan for reuse (committed with the caller's transaction)."""
+        if not settings.WORKOUT_LIBRARY_ENABLED or not eligible(profile):
+            return
+        feats = features(user_data)
+        db.add(WorkoutPlanLibraryEntry(
+            source_email=profile.email,
+            features=feats,
+            vector=encode(feats),
+            workout_plan=workout_plan,
+        ))
+
+
+plan_library = PlanLibrary()
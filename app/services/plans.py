@@ -0,0 +1,349 @@
+"""Diet, workout and custom-diet plan generation shared by the HTTP routers and the job workers.
+
+Each `ensure_*` helper returns the stored plan for the period if there is one, otherwise
+generates and stores it. Concurrent callers for the same user and period share one LLM call
+(in-process via SingleFlight, across workers via a Postgres advisory lock), and the unique
+constraints on the plan tables are the last line of defence.
+
+The queries and commits run in worker threads (`asyncio.to_thread`) and only the LLM call is
+awaited on the event loop. The caller's session is handed from thread to thread but is never
+used by two threads at once. Its read transaction is ended before any long wait (a leader's
+LLM call, or another caller's), so no pooled connection is held through one.
+"""
+import asyncio
+import json
+from datetime import date, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.ai.custom_diet import CustomDietAssistant
+from app.ai.diet_suggestion import DietAssistant
+from app.ai.workout_suggestion import WorkoutAssistant
+from app.models import UserCustomDiet, UserDiet, UserProfile, UserWorkout
+from app.services.plan_library import plan_library
+from app.utils.singleflight import SingleFlight, advisory_lock
+
+# In-process coalescing per (email, date) / (email, week_start)
+diet_flights = SingleFlight()
+workout_flights = SingleFlight()
+custom_diet_flights = SingleFlight()
+
+
+# -- diet -------------------------------------------------------------------------------
+
+def find_diet(db: Session, email: str, day: date):
+    # Indexed lookup on (user_email, plan_date) first; rows created before plan_date
+    # existed only carry created_at
+    diet = db.query(UserDiet).filter(
+        UserDiet.user_email == email,
+        UserDiet.plan_date == day
+    ).first()
+    if diet:
+        return diet
+    return db.query(UserDiet).filter(
+        UserDiet.user_email == email,
+        UserDiet.plan_date.is_(None),
+        func.date(UserDiet.created_at) == day
+    ).first()
+
+
+def diet_response(day: date, diet: UserDiet) -> dict:
+    return {
+        "date": day,
+        "diet_plan_id": diet.diet_planid,
+        "diet_plan": diet.diet_plan
+    }
+
+
+def end_read(db: Session) -> None:
+    """Return the session's connection to the pool before a long wait (expires loaded objects)."""
+    db.rollback()
+
+
+async def ensure_diet(db: Session, profile: UserProfile, today: date) -> dict:
+    email = profile.email
+    existing_diet = await asyncio.to_thread(find_diet, db, email, today)
+    if existing_diet:
+        return diet_response(today, existing_diet)
+    await asyncio.to_thread(end_read, db)
+    return await diet_flights.do((email, today), lambda: _generate_diet(db, profile, email, today))
+
+
+def _diet_user_data(db: Session, profile: UserProfile) -> dict:
+    # Fetch previous plan for context
+    latest_past_diet = db.query(UserDiet).filter(
+        UserDiet.user_email == profile.email
+    ).order_by(UserDiet.created_at.desc()).first()
+
+    previous_date = str(latest_past_diet.created_at.date()) if latest_past_diet else "N/A"
+    yesterday_plan = latest_past_diet.diet_plan if latest_past_diet else "None"
+
+    # Send full user profile data to AI
+    user_data = {
+        "name": profile.name,
+        "email": profile.email,
+        "age": profile.age,
+        "gender": profile.gender,
+        "height": profile.height,
+        "weight": profile.weight,
+        "goal": profile.goal,
+        "activity_level": profile.activity_level,
+        "diet_type": profile.diet_type,
+        "food_allergies": profile.food_allergies,
+        "food_dislikes": profile.food_dislikes,
+        "previous_date": previous_date,
+        "yesterday_plan": yesterday_plan
+    }
+    end_read(db)
+    return user_data
+
+
+def _store_diet(db: Session, email: str, today: date, diet_plan) -> dict:
+    user_diet = UserDiet(user_email=email, diet_plan=diet_plan, plan_date=today)
+    db.add(user_diet)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race against another worker: serve the row it stored
+        db.rollback()
+        existing_diet = find_diet(db, email, today)
+        if not existing_diet:
+            raise
+        return diet_response(today, existing_diet)
+    db.refresh(user_diet)
+    return diet_response(today, user_diet)
+
+
+async def _generate_diet(db: Session, profile: UserProfile, email: str, today: date) -> dict:
+    # Another worker may be generating the same plan; wait for it and re-check
+    async with advisory_lock(db, f"diet:{email}:{today}"):
+        existing_diet = await asyncio.to_thread(find_diet, db, email, today)
+        if existing_diet:
+            return diet_response(today, existing_diet)
+
+        user_data = await asyncio.to_thread(_diet_user_data, db, profile)
+
+        assistant = DietAssistant()
+        diet_plan = await assistant.get_diet_suggestion_async(user_data, current_date=today)
+
+        # Store new diet plan
+        return await asyncio.to_thread(_store_diet, db, email, today, diet_plan)
+
+
+# -- workout ----------------------------------------------------------------------------
+
+# Profile fields the workout prompt is built from; changing one invalidates pre-generated weeks
+WORKOUT_PROFILE_FIELDS = (
+    "age", "gender", "height", "weight", "goal", "activity_level",
+    "medical_conditions", "injuries", "workout_time", "budget",
+)
+
+
+def week_bounds(today: date) -> tuple[date, date]:
+    """Calendar week (Monday..Sunday) containing `today`."""
+    start_of_week = today - timedelta(days=today.weekday())
+    return start_of_week, start_of_week + timedelta(days=6)
+
+
+def user_week_number(db: Session, email: str, start_of_week: date) -> int:
+    """Week number relative to the user's very first workout plan (first plan is week 1)."""
+    first_workout = db.query(UserWorkout).filter(
+        UserWorkout.user_email == email
+    ).order_by(UserWorkout.week_start.asc()).first()
+
+    if not first_workout:
+        return 1
+    # If the first plan started on Jan 1st, and today is Jan 8th, that's Week 2.
+    delta_days = (start_of_week - first_workout.week_start).days
+    if delta_days < 0:
+        return 1
+    return (delta_days // 7) + 1
+
+
+def find_workout(db: Session, email: str, week_start: date):
+    return db.query(UserWorkout).filter(
+        UserWorkout.user_email == email,
+        UserWorkout.week_start == week_start
+    ).first()
+
+
+def workout_response(status: str, workout: UserWorkout) -> dict:
+    return {
+        "status": status,
+        "week_start": workout.week_start,
+        "week_end": workout.week_end,
+        "week_number": workout.week_number,
+        "workout_plan": workout.workout_plan
+    }
+
+
+async def ensure_workout(db: Session, profile: UserProfile, today: date) -> dict:
+    email = profile.email
+    start_of_week, end_of_week = week_bounds(today)
+    existing_plan = await asyncio.to_thread(find_workout, db, email, start_of_week)
+    if existing_plan:
+        return workout_response("existing", existing_plan)
+    await asyncio.to_thread(end_read, db)
+    return await workout_flights.do(
+        (email, start_of_week),
+        lambda: _generate_workout(db, profile, email, start_of_week, end_of_week),
+    )
+
+
+def _workout_user_data(db: Session, profile: UserProfile) -> tuple[dict, dict | None]:
+    """The prompt's profile fields and, if the library has one, a plan for a near-identical profile."""
+    user_data = {field: getattr(profile, field) for field in WORKOUT_PROFILE_FIELDS}
+    reused_plan = plan_library.lookup(db, profile, user_data)
+    end_read(db)
+    return user_data, reused_plan
+
+
+def _store_workout(db: Session, email: str, start_of_week: date, end_of_week: date, workout_plan,
+                   profile: UserProfile | None = None, user_data: dict | None = None) -> dict:
+    # A freshly generated plan (profile and user_data given) is staged in the library and
+    # committed with the week
+    if profile is not None:
+        plan_library.add(db, profile, user_data, workout_plan)
+
+    # Save to DB with User-Based Week Number
+    new_workout = UserWorkout(
+        user_email=email,
+        workout_plan=workout_plan,
+        week_start=start_of_week,
+        week_end=end_of_week,
+        week_number=user_week_number(db, email, start_of_week)
+    )
+    db.add(new_workout)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race against another worker: serve the row it stored
+        db.rollback()
+        existing_plan = find_workout(db, email, start_of_week)
+        if not existing_plan:
+            raise
+        return workout_response("existing", existing_plan)
+    db.refresh(new_workout)
+    return workout_response("created", new_workout)
+
+
+async def _generate_workout(db: Session, profile: UserProfile, email: str, start_of_week: date, end_of_week: date) -> dict:
+    # Another worker may be generating the same week; wait for it and re-check
+    async with advisory_lock(db, f"workout:{email}:{start_of_week}"):
+        existing_plan = await asyncio.to_thread(find_workout, db, email, start_of_week)
+        if existing_plan:
+            return workout_response("existing", existing_plan)
+
+        # A plan generated for a near-identical profile is served instead of a new LLM call
+        user_data, workout_plan = await asyncio.to_thread(_workout_user_data, db, profile)
+        if workout_plan is not None:
+            return await asyncio.to_thread(_store_workout, db, email, start_of_week, end_of_week, workout_plan)
+
+        assistant = WorkoutAssistant()
+        workout_plan = await assistant.get_workout_suggestion_async(user_data)
+        return await asyncio.to_thread(
+            _store_workout, db, email, start_of_week, end_of_week, workout_plan, profile, user_data
+        )
+
+
+# -- custom diet ------------------------------------------------------------------------
+
+def find_custom_diet(db: Session, email: str, day: date):
+    return (
+        db.query(UserCustomDiet)
+        .filter(
+            UserCustomDiet.user_email == email,
+            func.date(UserCustomDiet.created_at) == day
+        )
+        .first()
+    )
+
+
+def custom_diet_response(day: date, custom: UserCustomDiet) -> dict:
+    return {
+        "date": day,
+        "custom_diet_id": custom.custom_diet_id,
+        "ingredients": custom.ingredients,
+        "diet_plan": custom.diet_plan,
+    }
+
+
+async def ensure_custom_diet(db: Session, profile: UserProfile, ingredients, today: date) -> dict:
+    email = profile.email
+    existing = await asyncio.to_thread(find_custom_diet, db, email, today)
+    if existing:
+        return custom_diet_response(today, existing)
+    await asyncio.to_thread(end_read, db)
+    return await custom_diet_flights.do(
+        (email, today),
+        lambda: _generate_custom_diet(db, profile, email, ingredients, today),
+    )
+
+
+def _custom_diet_user_data(db: Session, profile: UserProfile, today: date) -> dict:
+    email = profile.email
+
+    # Fetch YESTERDAY'S custom plan
+    yesterday_custom = (
+        db.query(UserCustomDiet)
+        .filter(
+            UserCustomDiet.user_email == email,
+            func.date(UserCustomDiet.created_at) < today
+        )
+        .order_by(UserCustomDiet.created_at.desc())
+        .first()
+    )
+
+    previous_date = "N/A"
+    yesterday_plan = "None"
+
+    if yesterday_custom:
+        previous_date = str(yesterday_custom.created_at.date())
+        yesterday_plan = json.dumps(yesterday_custom.diet_plan)
+
+    # Prepare user data including yesterday plan for LLM
+    user_data = {
+        "name": profile.name,
+        "email": profile.email,
+        "age": profile.age,
+        "gender": profile.gender,
+        "height": profile.height,
+        "weight": profile.weight,
+        "goal": profile.goal,
+        "activity_level": profile.activity_level,
+        "diet_type": profile.diet_type,
+        "food_allergies": profile.food_allergies,
+        "food_dislikes": profile.food_dislikes,
+        "previous_date": previous_date,
+        "yesterday_plan": yesterday_plan,
+    }
+    end_read(db)
+    return user_data
+
+
+def _store_custom_diet(db: Session, email: str, ingredients, plan, today: date) -> dict:
+    new = UserCustomDiet(
+        user_email=email,
+        ingredients=ingredients,
+        diet_plan=plan
+    )
+    db.add(new)
+    db.commit()
+    db.refresh(new)
+    return custom_diet_response(today, new)
+
+
+async def _generate_custom_diet(db: Session, profile: UserProfile, email: str, ingredients, today: date) -> dict:
+    user_data = await asyncio.to_thread(_custom_diet_user_data, db, profile, today)
+
+    # Generate new custom plan
+    assistant = CustomDietAssistant()
+    plan = await assistant.get_custom_plan_async(user_data, ingredients, current_date=today)
+
+    # Normalize ingredients
+    if isinstance(ingredients, str):
+        ingredients = [i.strip() for i in ingredients.split(",")]
+
+    return await asyncio.to_thread(_store_custom_diet, db, email, ingredients, plan, today)
@@ -0,0 +1,282 @@
+"""Pre-generate plans for active users before they ask for them.
+
+Diet: every `DIET_PREGEN_INTERVAL` seconds the scheduler looks for active users (a diet plan in
+the last `DIET_PREGEN_ACTIVE_DAYS` days) who have no plan for today and whose wake-up time is
+less than `DIET_PREGEN_LEAD_MINUTES` away. It queues diet jobs for them, earliest wake time
+first, on the generation job queue. `DIET_PREGEN_MAX_PER_MINUTE` caps how many generation
+jobs of any kind (including on-demand async requests) may be queued per minute before the pass
+stops adding diet jobs. Budgets are counted from the jobs table, so they hold across processes.
+The morning request is then a plain read of the stored plan.
+
+"Today", wake-up times and the weekend window are all read in `APP_TIMEZONE`
+(app/utils/dates.py), the same calendar the routers hand to `plans.ensure_*`.
+
+Workout: over the weekend, next week's plan is queued for users with a workout plan in the
+last `WORKOUT_PREGEN_ACTIVE_WEEKS` weeks. Each user gets a fixed slot (hash of the email)
+spread over `WORKOUT_PREGEN_SPREAD_HOURS` from the start of the window
+(`WORKOUT_PREGEN_LEAD_HOURS` before Monday 00:00), so the work doesn't all land at once. The
+workout pass has its own budget, `WORKOUT_PREGEN_MAX_PER_MINUTE`, counted over workout jobs
+only, so a busy diet minute doesn't stall the weekend and vice versa. Monday's request is then a read
+instead of a 3000-token LLM call. A profile change that affects the workout prompt deletes
+the weeks that haven't started yet and queues them again.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import GenerationJob, UserDiet, UserProfile, UserWorkout
+from app.services import job_queue, plans
+from app.utils.dates import app_now, app_today
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("diet_pregen_enqueued_total", "Diet plans queued ahead of the user's wake-up time")
+metrics.describe("workout_pregen_enqueued_total", "Next week's workout plans queued over the weekend")
+metrics.describe("workout_pregen_invalidated_total", "Pre-generated workout weeks dropped after a profile change")
+
+_CLOCK_RE = re.compile(r"^\s*(\d{1,2})(?:[:.](\d{2}))?(?::\d{2})?\s*([ap]\.?m\.?)?\s*$", re.IGNORECASE)
+
+
+def parse_clock(value: str | None) -> time | None:
+    """Parse free-form profile times such as "06:30", "6:30 AM", "7am" or "21:15:00"."""
+    if not value:
+        return None
+    m = _CLOCK_RE.match(value)
+    if not m:
+        return None
+    hour, minute = int(m.group(1)), int(m.group(2) or 0)
+    meridiem = (m.group(3) or "").lower().replace(".", "")
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def wake_time(profile: UserProfile) -> time | None:
+    """Earliest moment the user is likely to open the app: wake-up time, else breakfast time."""
+    return parse_clock(profile.wake_up_time) or parse_clock(profile.breakfast_time)
+
+
+def remaining_budget(db: Session, now_utc: datetime, limit: int, kind: str | None = None) -> int:
+    """Jobs still allowed this minute under `limit`, counting jobs of `kind` (or of every kind)."""
+    recent = db.query(func.count(GenerationJob.job_id)).filter(
+        GenerationJob.created_at >= now_utc - timedelta(minutes=1)
+    )
+    if kind is not None:
+        recent = recent.filter(GenerationJob.kind == kind)
+    return max(limit - (recent.scalar() or 0), 0)
+
+
+def due_profiles(db: Session, now: datetime) -> list[UserProfile]:
+    """Active users without today's plan whose pre-generation window is open, earliest wake first.
+
+    `now` is the wall-clock time in `APP_TIMEZONE`, the zone profile wake-up times are given in.
+    """
+    today = now.date()
+    active_since = now - timedelta(days=settings.DIET_PREGEN_ACTIVE_DAYS)
+    lead = timedelta(minutes=settings.DIET_PREGEN_LEAD_MINUTES)
+
+    active = db.query(UserDiet.user_email).filter(UserDiet.created_at >= active_since).distinct()
+    has_today = db.query(UserDiet.user_email).filter(
+        or_(UserDiet.plan_date == today, func.date(UserDiet.created_at) == today)
+    )
+    profiles = db.query(UserProfile).filter(
+        UserProfile.email.in_(active),
+        UserProfile.email.notin_(has_today),
+    ).all()
+
+    due = []
+    for profile in profiles:
+        wake = wake_time(profile)
+        if wake is None:
+            continue
+        wake_at = datetime.combine(today, wake)
+        if wake_at - lead <= now < wake_at:
+            due.append((wake_at, profile))
+    due.sort(key=lambda item: item[0])
+    return [profile for _, profile in due]
+
+
+def enqueue_due_diets(db: Session, now: datetime | None = None) -> int:
+    """Run one scheduling pass. Returns how many new diet jobs were queued."""
+    now = now or app_now()
+    budget = remaining_budget(db, datetime.now(timezone.utc), settings.DIET_PREGEN_MAX_PER_MINUTE)
+    if budget <= 0:
+        return 0
+
+    today = now.date().isoformat()
+    # Users whose plan is already queued or being generated (e.g. by a previous pass)
+    pending = _pending_users(db, "diet", today)
+
+    queued = 0
+    for profile in due_profiles(db, now):
+        if queued >= budget:
+            break
+        if profile.email in pending:
+            continue
+        job_queue.enqueue(db, "diet", profile.email, {"date": today})
+        queued += 1
+    if queued:
+        metrics.inc("diet_pregen_enqueued_total", value=queued)
+        logger.info("Queued %d diet plans ahead of wake-up", queued)
+    return queued
+
+
+def _pending_users(db: Session, kind: str, day: str) -> set[str]:
+    """Users with a `kind` job for `day` that is already queued or being generated."""
+    return {
+        job.user_email
+        for job in db.query(GenerationJob).filter(
+            GenerationJob.kind == kind,
+            GenerationJob.status.in_(job_queue.ACTIVE_STATUSES),
+        )
+        if (job.payload or {}).get("date") == day
+    }
+
+
+# -- workout ----------------------------------------------------------------------------
+
+def workout_slot(email: str) -> timedelta:
+    """Fixed offset of the user's pre-generation slot inside the weekend window."""
+    spread = max(int(settings.WORKOUT_PREGEN_SPREAD_HOURS * 3600), 1)
+    return timedelta(seconds=int(hashlib.sha1(email.encode()).hexdigest(), 16) % spread)
+
+
+def due_workout_profiles(db: Session, now: datetime) -> list[UserProfile]:
+    """Active users without next week's plan whose slot has come, earliest slot first."""
+    next_week = plans.week_bounds(now.date())[0] + timedelta(days=7)
+    week_begins = datetime.combine(next_week, time())
+    window_start = week_begins - timedelta(hours=settings.WORKOUT_PREGEN_LEAD_HOURS)
+    if not window_start <= now < week_begins:
+        return []
+
+    active_since = next_week - timedelta(weeks=settings.WORKOUT_PREGEN_ACTIVE_WEEKS)
+    active = db.query(UserWorkout.user_email).filter(UserWorkout.week_start >= active_since).distinct()
+    has_next = db.query(UserWorkout.user_email).filter(UserWorkout.week_start == next_week)
+    profiles = db.query(UserProfile).filter(
+        UserProfile.email.in_(active),
+        UserProfile.email.notin_(has_next),
+    ).all()
+
+    due = [(window_start + workout_slot(p.email), p) for p in profiles]
+    due = [item for item in due if item[0] <= now]
+    due.sort(key=lambda item: item[0])
+    return [profile for _, profile in due]
+
+
+def enqueue_next_week_workouts(db: Session, now: datetime | None = None) -> int:
+    """Run one weekend scheduling pass. Returns how many new workout jobs were queued."""
+    now = now or app_now()
+    budget = remaining_budget(db, datetime.now(timezone.utc), settings.WORKOUT_PREGEN_MAX_PER_MINUTE, "workout")
+    if budget <= 0:
+        return 0
+
+    next_week = (plans.week_bounds(now.date())[0] + timedelta(days=7)).isoformat()
+    pending = _pending_users(db, "workout", next_week)
+
+    queued = 0
+    for profile in due_workout_profiles(db, now):
+        if queued >= budget:
+            break
+        if profile.email in pending:
+            continue
+        job_queue.enqueue(db, "workout", profile.email, {"date": next_week})
+        queued += 1
+    if queued:
+        metrics.inc("workout_pregen_enqueued_total", value=queued)
+        logger.info("Queued %d workout plans for next week", queued)
+    return queued
+
+
+def invalidate_upcoming_workouts(db: Session, email: str, today: date | None = None) -> int:
+    """Drop the user's workout plans for weeks that haven't started and queue them again.
+
+    Workout jobs for those weeks that are still queued or running were built from the old
+    profile too. They are marked `superseded`, so a queued one never runs and the new request
+    isn't deduplicated onto it. A running one has any plan it creates dropped and queued again
+    when it finishes (see `job_queue._finish_job`).
+
+    Called after a profile change that affects the workout prompt. Failures are logged, not
+    raised: the profile update itself has already been committed.
+    """
+    this_week = plans.week_bounds(today or app_today())[0]
+    try:
+        upcoming = db.query(UserWorkout).filter(
+            UserWorkout.user_email == email,
+            UserWorkout.week_start > this_week,
+        ).all()
+        weeks = {workout.week_start for workout in upcoming}
+        for workout in upcoming:
+            db.delete(workout)
+
+        stale_jobs = []
+        for job in db.query(GenerationJob).filter(
+            GenerationJob.kind == "workout",
+            GenerationJob.user_email == email,
+            GenerationJob.status.in_(job_queue.ACTIVE_STATUSES),
+        ):
+            day = (job.payload or {}).get("date")
+            week_start = plans.week_bounds(date.fromisoformat(day))[0] if day else None
+            if week_start and week_start > this_week:
+                stale_jobs.append(job.job_id)
+                weeks.add(week_start)
+        if stale_jobs:
+            # Conditional, so a job that finished in the meantime keeps its final status
+            db.query(GenerationJob).filter(
+                GenerationJob.job_id.in_(stale_jobs),
+                GenerationJob.status.in_(job_queue.ACTIVE_STATUSES),
+            ).update({"status": "superseded"}, synchronize_session=False)
+        db.commit()
+        for week_start in sorted(weeks):
+            job_queue.enqueue(db, "workout", email, {"date": week_start.isoformat()})
+    except Exception as e:
+        db.rollback()
+        logger.warning("Invalidating upcoming workouts for %s failed: %s", email, e)
+        return 0
+    if weeks:
+        metrics.inc("workout_pregen_invalidated_total", value=len(weeks))
+    return len(weeks)
+
+
+# -- scheduling loop --------------------------------------------------------------------
+
+def _run_pass(session_factory, run_pass) -> int:
+    with session_factory() as db:
+        return run_pass(db)
+
+
+async def scheduler_loop(session_factory=SessionLocal, interval: float | None = None,
+                         run_pass=enqueue_due_diets, name: str = "Diet") -> None:
+    interval = settings.DIET_PREGEN_INTERVAL if interval is None else interval
+    while True:
+        try:
+            # The pass scans profiles and inserts jobs: keep it off the event loop
+            await asyncio.to_thread(_run_pass, session_factory, run_pass)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("%s pre-generation pass failed: %s", name, e)
+        await asyncio.sleep(interval)
+
+
+def start_scheduler(session_factory=SessionLocal) -> list[asyncio.Task]:
+    tasks = []
+    if settings.DIET_PREGEN_ENABLED:
+        tasks.append(asyncio.create_task(scheduler_loop(session_factory), name="diet-pregen-scheduler"))
+    if settings.WORKOUT_PREGEN_ENABLED:
+        tasks.append(asyncio.create_task(
+            scheduler_loop(session_factory, settings.WORKOUT_PREGEN_INTERVAL, enqueue_next_week_workouts, "Workout"),
+            name="workout-pregen-scheduler",
+        ))
+    return tasks
@@ -0,0 +1,201 @@
+"""Weekly exercise analysis: cheap stats on every read, AI advice only when the data changed.
+
+Daily stats are rebuilt from the week's follow-ups on every request (one query, one pass).
+The stored `UserExerciseAnalysis` row keeps the advice together with a fingerprint of the
+stats it was written for. When a read sees a different fingerprint it returns the stored
+advice right away and schedules a background refresh. The refresh is debounced per
+user/week: it runs `ANALYSIS_REFRESH_DEBOUNCE` seconds after the stats last changed, so a
+burst of follow-ups costs one LLM call.
+
+The queries and writes run in worker threads, and no session is held while the LLM writes
+the advice: the stats are read and the read is ended first, then the advice is written back
+in a fresh transaction.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.ai.exercise_analysis import ExerciseAnalysis
+from app.config import settings
+from app.database import SessionLocal
+from app.models import UserExerciseAnalysis, UserExerciseFollowUp, UserProfile
+from app.utils.dates import app_today
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("weekly_analysis_refresh_total", "Background weekly-advice refreshes, by outcome")
+
+# Pending refresh timers by (email, week_start, week_end), with the fingerprint they were scheduled for
+_pending: dict[tuple, tuple[str, asyncio.TimerHandle]] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+def week_dates(week_start: date, week_end: date) -> list[date]:
+    return [week_start + timedelta(days=i) for i in range((week_end - week_start).days + 1)]
+
+
+def load_followups(db: Session, email: str, week_start: date, week_end: date) -> list:
+    # Follow-up dates are stored as 'YYYY-MM-DD' strings, so string comparison works
+    return db.query(UserExerciseFollowUp).filter(
+        UserExerciseFollowUp.user_email == email,
+        UserExerciseFollowUp.date >= week_start.isoformat(),
+        UserExerciseFollowUp.date <= week_end.isoformat()
+    ).all()
+
+
+def build_daily_stats(week_start: date, week_end: date, followups, today: date) -> list[dict]:
+    """One entry per day of the week. Missing days and days after today are zeros."""
+    by_date = {f.date: f for f in followups if getattr(f, "date", None) is not None}
+    daily_stats = []
+    for day in week_dates(week_start, week_end):
+        f = by_date.get(day.isoformat()) if day <= today else None
+        daily_stats.append({
+            "day": day.strftime("%A"),
+            "date": day.isoformat(),
+            "total_exercises": int(getattr(f, "total_exercises", 0) or 0),
+            "completed_exercises": int(getattr(f, "completed_exercises", 0) or 0),
+        })
+    return daily_stats
+
+
+def fingerprint(daily_stats) -> str:
+    """Stable hash of the per-day counts (day names and key order don't matter)."""
+    counts = sorted(
+        (d.get("date"), int(d.get("total_exercises") or 0), int(d.get("completed_exercises") or 0))
+        for d in daily_stats or [] if isinstance(d, dict) and d.get("date")
+        # Zero days are the same as missing days
+        and (d.get("total_exercises") or d.get("completed_exercises"))
+    )
+    return hashlib.sha1(json.dumps(counts).encode()).hexdigest()
+
+
+def stored_fingerprint(analysis: UserExerciseAnalysis) -> str:
+    # Rows written before fingerprints existed: their advice was based on their daily_stats
+    return getattr(analysis, "followup_fingerprint", None) or fingerprint(analysis.daily_stats)
+
+
+def find_analysis(db: Session, email: str, week_start: date, week_end: date) -> UserExerciseAnalysis | None:
+    return db.query(UserExerciseAnalysis).filter(
+        UserExerciseAnalysis.user_email == email,
+        UserExerciseAnalysis.week_start == week_start,
+        UserExerciseAnalysis.week_end == week_end,
+    ).first()
+
+
+def profile_for_ai(profile: UserProfile) -> dict:
+    return {
+        "email": profile.email,
+        "name": getattr(profile, "name", None),
+        "age": getattr(profile, "age", None),
+        "goal": getattr(profile, "goal", None),
+        "activity_level": getattr(profile, "activity_level", None),
+    }
+
+
+async def generate_advice(profile_data: dict, week_start: date, week_end: date, daily_stats: list[dict]) -> str:
+    """Advice for the week; `profile_data` comes from `profile_for_ai`."""
+    ai_out = await ExerciseAnalysis().analyze_week_async(profile_data, {
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        "daily_stats": daily_stats,
+    })
+    if isinstance(ai_out, dict) and ai_out.get("advice"):
+        return ai_out["advice"]
+    return ai_out if isinstance(ai_out, str) else "No advice generated"
+
+
+def _stale_stats(session_factory, email: str, week_start: date, week_end: date) -> tuple[dict, list[dict], str] | None:
+    """(profile data, daily stats, fingerprint) when the stored advice is out of date, else None."""
+    with session_factory() as db:
+        analysis = find_analysis(db, email, week_start, week_end)
+        profile = db.query(UserProfile).filter(UserProfile.email == email).first()
+        if analysis is None or profile is None:
+            return None
+        daily_stats = build_daily_stats(week_start, week_end, load_followups(db, email, week_start, week_end),
+                                        app_today())
+        current = fingerprint(daily_stats)
+        if current == stored_fingerprint(analysis):
+            return None
+        return profile_for_ai(profile), daily_stats, current
+
+
+def _store_advice(session_factory, email: str, week_start: date, week_end: date,
+                  advice: str, daily_stats: list[dict], current: str) -> bool:
+    with session_factory() as db:
+        analysis = find_analysis(db, email, week_start, week_end)
+        if analysis is None:
+            return False
+        analysis.advice = advice
+        analysis.daily_stats = daily_stats
+        analysis.followup_fingerprint = current
+        db.commit()
+        return True
+
+
+async def refresh_advice(email: str, week_start: date, week_end: date, session_factory=SessionLocal) -> bool:
+    """Regenerate the stored advice if the week's stats no longer match it. Returns True if it did."""
+    stale = await asyncio.to_thread(_stale_stats, session_factory, email, week_start, week_end)
+    if stale is None:
+        return False
+    profile_data, daily_stats, current = stale
+    advice = await generate_advice(profile_data, week_start, week_end, daily_stats)
+    return await asyncio.to_thread(
+        _store_advice, session_factory, email, week_start, week_end, advice, daily_stats, current
+    )
+
+
+async def _run_refresh(key: tuple, session_factory) -> None:
+    try:
+        refreshed = await refresh_advice(*key, session_factory=session_factory)
+        metrics.inc("weekly_analysis_refresh_total", {"outcome": "refreshed" if refreshed else "unchanged"})
+    except Exception as e:
+        # The next read with changed stats schedules another attempt
+        metrics.inc("weekly_analysis_refresh_total", {"outcome": "failed"})
+        logger.warning("Weekly analysis refresh failed for %s %s: %s", key[0], key[1], e)
+
+
+def _fire(key: tuple, session_factory) -> None:
+    _pending.pop(key, None)
+    task = asyncio.get_running_loop().create_task(_run_refresh(key, session_factory))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def schedule_refresh(email: str, week_start: date, week_end: date, current: str,
+                     delay: float | None = None, session_factory=SessionLocal) -> bool:
+    """Debounced background refresh for one user/week.
+
+    Re-scheduling with the same fingerprint keeps the pending timer (repeated reads don't
+    postpone it); a new fingerprint restarts it. Outside an event loop this is a no-op and
+    the next async read schedules it.
+    """
+    key = (email, week_start, week_end)
+    pending = _pending.get(key)
+    if pending and pending[0] == current:
+        return False
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    if pending:
+        pending[1].cancel()
+    delay = settings.ANALYSIS_REFRESH_DEBOUNCE if delay is None else delay
+    _pending[key] = (current, loop.call_later(delay, _fire, key, session_factory))
+    return True
+
+
+def analysis_response(analysis: UserExerciseAnalysis, daily_stats: list[dict], advice_status: str) -> dict:
+    return {
+        "id": str(analysis.analysis_id) if analysis.analysis_id is not None else None,
+        "created_at": analysis.created_at.isoformat() if analysis.created_at is not None else None,
+        "week_start": analysis.week_start,
+        "week_end": analysis.week_end,
+        "daily_stats": daily_stats,
+        "advice": analysis.advice,
+        "advice_status": advice_status,
+    }
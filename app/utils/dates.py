@@ -0,0 +1,26 @@
+"""Calendar helpers shared by the routers, the plan services and the schedulers.
+
+"Today" and wake-up times are wall-clock values, so they are read in the configured
+`APP_TIMEZONE` rather than the server's local zone. That way a container running in UTC
+still agrees with its users on when a new day's diet plan starts.
+"""
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+
+# Lower-case day names indexed by `date.weekday()`, as used for the keys of workout plans
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def app_timezone() -> ZoneInfo:
+    return ZoneInfo(settings.APP_TIMEZONE)
+
+
+def app_now() -> datetime:
+    """Current wall-clock time in the app timezone (naive, like the profile's clock times)."""
+    return datetime.now(app_timezone()).replace(tzinfo=None)
+
+
+def app_today() -> date:
+    return app_now().date()
@@ -0,0 +1,115 @@
+"""Tiny in-process metrics registry rendered in Prometheus text format.
+
+Kept dependency-free on purpose: counters, gauges and fixed-bucket histograms keyed by
+metric name plus a sorted label tuple. Everything is process-local; with several workers
+each worker exposes its own numbers on `/metrics`.
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict | None) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    parts = []
+    for k, v in items:
+        value = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, _Histogram]] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: dict | None = None, value: float = 1.0) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: dict | None = None) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: dict | None = None, buckets=DEFAULT_BUCKETS) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def get_counter(self, name: str, labels: dict | None = None) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def get_gauge(self, name: str, labels: dict | None = None) -> float:
+        return self._gauges.get(name, {}).get(_label_key(labels), 0.0)
+
+    def get_histogram(self, name: str, labels: dict | None = None) -> dict:
+        """Return {"count", "sum"} for a histogram series (zeros when never observed)."""
+        hist = self._histograms.get(name, {}).get(_label_key(labels))
+        if hist is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": hist.n, "sum": hist.total}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(store[name].items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(self._histograms[name].items(), key=lambda kv: kv[0]):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {hist.n}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.total}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.n}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
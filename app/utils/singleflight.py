@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Hashable
+
+from sqlalchemy import Connection, Engine, create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+
+class SingleFlight:
+    """Coalesce concurrent async calls that share a key.
+
+    The first caller for a key (the leader) runs `fn`; callers that arrive while it is
+    in flight await the leader's result (or exception) instead of running `fn` again.
+    The key is forgotten as soon as the leader finishes, so later calls run normally.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            # shield: a cancelled follower must not cancel the leader's shared future
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved so a leader-only failure isn't logged twice
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+
+def advisory_lock_id(key: str) -> int:
+    """Map a string key onto the signed 64-bit id space of Postgres advisory locks."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+# Dedicated engines for advisory-lock connections, per database URL
+_lock_engines: dict[str, Engine] = {}
+
+
+def _lock_engine(bind: Engine) -> Engine:
+    """NullPool engine next to `bind`, so a lock held through a long LLM call never takes a
+    connection out of the request pool."""
+    key = bind.url.render_as_string(hide_password=False)
+    engine = _lock_engines.get(key)
+    if engine is None:
+        engine = _lock_engines[key] = create_engine(bind.url, poolclass=NullPool)
+    return engine
+
+
+def _connect(engine: Engine) -> Connection:
+    # Autocommit: the lock is session-level, so no transaction needs to stay open
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _try_lock(conn: Connection, lock_id: int) -> bool:
+    return bool(conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar())
+
+
+def _unlock(conn: Connection, lock_id: int) -> None:
+    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+
+
+@asynccontextmanager
+async def advisory_lock(db: Session, key: str, timeout: float | None = None, poll_interval: float = 0.1):
+    """Serialise a critical section across workers with a Postgres session-level advisory lock.
+
+    The lock is taken with `pg_try_advisory_lock` on a short-lived connection of its own (outside
+    the request pool) and released explicitly when the block exits, i.e. after the new row has
+    been committed. Neither `db` nor the pool has to keep a transaction open while the LLM call
+    runs. Attempts are polled from a worker thread, so waiting never blocks the event loop.
+    A no-op on other databases (e.g. SQLite in tests), where the unique constraints remain the
+    safety net.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        yield
+        return
+
+    lock_id = advisory_lock_id(key)
+    timeout = settings.SINGLE_FLIGHT_LOCK_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    conn = await asyncio.to_thread(_connect, _lock_engine(bind))
+    try:
+        while not await asyncio.to_thread(_try_lock, conn, lock_id):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock {key!r}")
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(_unlock, conn, lock_id)
+    finally:
+        # Closing the connection would also drop the lock if the unlock above failed
+        await asyncio.to_thread(conn.close)
@@ -0,0 +1,97 @@
+"""Shared ingestion stage for uploaded images.
+
+`ingest_upload` streams an `UploadFile` to storage in `UPLOAD_CHUNK_SIZE` chunks, with the
+disk writes done off the event loop. While it streams, it hashes the content (sha256) and
+sniffs the image type from the magic bytes. Uploads over `UPLOAD_MAX_BYTES` are rejected
+with 413 and anything that isn't a supported image with 415. In both cases the partial file
+is removed. The stored file gets the sniffed extension, not the client's. The bytes are kept
+in memory, so the detectors and the photo hash use them directly without reading the file back.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+
+# (prefix, mime type, extension); WEBP and HEIC are matched by `sniff_image_type` below
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF87a", "image/gif", "gif"),
+    (b"GIF89a", "image/gif", "gif"),
+)
+_HEIC_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1"}
+
+
+@dataclass
+class IngestedUpload:
+    path: str
+    content: bytes
+    sha256: str
+    content_type: str
+    size: int
+
+
+def sniff_image_type(head: bytes) -> tuple[str, str] | None:
+    """(mime type, extension) from the first bytes of a file, or None if it isn't a supported image."""
+    for prefix, mime_type, extension in _SIGNATURES:
+        if head.startswith(prefix):
+            return mime_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIC_BRANDS:
+        return "image/heic", "heic"
+    return None
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def ingest_upload(file: UploadFile, upload_dir: str, max_bytes: int | None = None) -> IngestedUpload:
+    """Stream `file` into `upload_dir` and return what the rest of the request needs."""
+    max_bytes = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    too_large = HTTPException(status_code=413, detail=f"Image is larger than {max_bytes} bytes")
+    # Multipart parsing already knows the size: skip the copy when it's over the limit
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    first = await file.read(settings.UPLOAD_CHUNK_SIZE)
+    sniffed = sniff_image_type(first)
+    if sniffed is None:
+        raise HTTPException(status_code=415, detail="Unsupported image type (expected JPEG, PNG, GIF, WEBP or HEIC)")
+    content_type, extension = sniffed
+
+    path = os.path.join(upload_dir, f"{uuid.uuid4()}.{extension}")
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    buffer = await run_in_threadpool(open, path, "wb")
+    try:
+        chunk = first
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large
+            digest.update(chunk)
+            chunks.append(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove, path)
+        raise
+    await run_in_threadpool(buffer.close)
+
+    return IngestedUpload(
+        path=path,
+        content=b"".join(chunks),
+        sha256=digest.hexdigest(),
+        content_type=content_type,
+        size=size,
+    )
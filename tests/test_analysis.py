@@ -52,7 +52,7 @@ def make_fake_db(followups):
     return FakeDB(followups)
 
 
-@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week")
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async")
 def test_analysis_missing_days(mock_analyze, monkeypatch):
     # Single entry on Friday only
     followups = [FakeFollowup("2025-11-28", 3, 1)]
@@ -71,8 +71,7 @@ def test_analysis_missing_days(mock_analyze, monkeypatch):
     payload = {"email": "user@example.com", "week_start": "2025-11-24", "week_end": "2025-11-30"}
     # Simulate today's date as 2025-11-28 so future days (29,30) are zeroed
     from datetime import date as _d
-    FakeDate = type("FakeDate", (), {"today": staticmethod(lambda: _d(2025, 11, 28))})
-    monkeypatch.setattr(analysis_module, "date", FakeDate)
+    monkeypatch.setattr(analysis_module, "app_today", lambda: _d(2025, 11, 28))
 
     resp = client.post("/profile/analysis", json=payload)
 
@@ -104,7 +103,7 @@ def test_analysis_missing_days(mock_analyze, monkeypatch):
     assert "advice" in data and isinstance(data["advice"], str)
 
 
-@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week")
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async")
 def test_analysis_all_days(mock_analyze, monkeypatch):
     followups = [
         FakeFollowup("2025-11-24", 5, 4),
@@ -129,8 +128,7 @@ def test_analysis_all_days(mock_analyze, monkeypatch):
     payload = {"email": "user@example.com", "week_start": "2025-11-24", "week_end": "2025-11-30"}
     # Force today's date to 2025-11-28
     from datetime import date as _d
-    FakeDate = type("FakeDate", (), {"today": staticmethod(lambda: _d(2025, 11, 28))})
-    monkeypatch.setattr(analysis_module, "date", FakeDate)
+    monkeypatch.setattr(analysis_module, "app_today", lambda: _d(2025, 11, 28))
     resp = client.post("/profile/analysis", json=payload)
 
     # Cleanup
@@ -151,7 +149,7 @@ def test_analysis_all_days(mock_analyze, monkeypatch):
     assert n30 is not None and n30["completed_exercises"] == 0 and n30["total_exercises"] == 0
 
 
-@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week")
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async")
 def test_returns_cached_analysis(mock_analyze, monkeypatch):
     # Prepare a stored analysis record (should be returned directly)
     class FakeAnalysisObj:
@@ -219,7 +217,7 @@ def test_returns_cached_analysis(mock_analyze, monkeypatch):
     assert not mock_analyze.called
 
 
-@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week")
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async")
 def test_cached_with_future_entries_trimmed(mock_analyze, monkeypatch):
     # Prepare stored analysis with full week including future days
     class FakeAnalysisObj2:
@@ -274,8 +272,7 @@ def test_cached_with_future_entries_trimmed(mock_analyze, monkeypatch):
 
     # Simulate today as 2025-11-28
     from datetime import date as _d
-    FakeDate = type("FakeDate", (), {"today": staticmethod(lambda: _d(2025, 11, 28))})
-    monkeypatch.setattr(analysis_module, "date", FakeDate)
+    monkeypatch.setattr(analysis_module, "app_today", lambda: _d(2025, 11, 28))
 
     payload = {"email": "user@example.com", "week_start": "2025-11-24", "week_end": "2025-11-30"}
     resp = client.post("/profile/analysis", json=payload)
@@ -289,7 +286,7 @@ def test_cached_with_future_entries_trimmed(mock_analyze, monkeypatch):
     assert not any(d for d in body["daily_stats"] if d["date"] in {"2025-11-29", "2025-11-30"} and d["completed_exercises"] != 0)
 
 
-@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week")
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async")
 def test_cached_zero_but_followups_present(mock_analyze, monkeypatch):
     # Stored analysis is present but contains only zeros (or missing entries)
     class FakeAnalysisZero:
@@ -385,8 +382,7 @@ def test_cached_zero_but_followups_present(mock_analyze, monkeypatch):
     payload = {"email": "user@example.com", "week_start": "2025-11-24", "week_end": "2025-11-30"}
     # Force today's date to 2025-11-28
     from datetime import date as _d
-    FakeDate = type("FakeDate", (), {"today": staticmethod(lambda: _d(2025, 11, 28))})
-    monkeypatch.setattr(analysis_module, "date", FakeDate)
+    monkeypatch.setattr(analysis_module, "app_today", lambda: _d(2025, 11, 28))
 
     resp = client.post("/profile/analysis", json=payload)
 
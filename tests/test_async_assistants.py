@@ -0,0 +1,46 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app.ai.workout_suggestion import WorkoutAssistant
+from app.ai.exercise_analysis import ExerciseAnalysis
+
+
+def _resp(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_async_variant_uses_async_client_only():
+    sync_client = MagicMock()
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(return_value=_resp('{"monday": {"focus": "Legs"}}'))
+    assistant = WorkoutAssistant(client=sync_client, async_client=async_client)
+
+    plan = asyncio.run(assistant.get_workout_suggestion_async({"age": 30}))
+
+    assert plan == {"monday": {"focus": "Legs"}}
+    assert async_client.chat.completions.create.await_count == 1
+    assert not sync_client.chat.completions.create.called
+
+
+def test_async_calls_overlap_instead_of_serialising():
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.2)
+        return _resp('{"advice": "Nice"}')
+
+    async_client = MagicMock()
+    async_client.chat.completions.create = slow_create
+    analyzer = ExerciseAnalysis(client=MagicMock(), async_client=async_client)
+    summary = {"week_start": "2025-11-24", "week_end": "2025-11-30", "daily_stats": []}
+
+    async def run_many():
+        return await asyncio.gather(*(analyzer.analyze_week_async({}, summary) for _ in range(20)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_many())
+    elapsed = time.perf_counter() - started
+
+    assert all(r["advice"] == "Nice" for r in results)
+    # 20 x 0.2s sequentially would be 4s
+    assert elapsed < 1.0
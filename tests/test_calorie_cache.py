@@ -0,0 +1,201 @@
+import asyncio
+import io
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageEnhance
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.main import app
+from app.models import UserFoodLog, UserProfile
+from app.routers import calorie as calorie_module
+from app.routers.auth import get_current_user
+from app.services import calorie_cache
+from app.services.calorie_cache import ImageHashIndex, dhash, hamming, informative, same_result
+from app.utils.metrics import metrics
+
+ANALYSIS = {"dish_name": "Dal rice", "estimated_calories": 520}
+
+
+def _photo(path, seed=0, brightness=1.0, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    # Smooth random blobs: enough structure for a stable hash
+    small = rng.integers(0, 255, (6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize(size, Image.BICUBIC)
+    image = ImageEnhance.Brightness(image).enhance(brightness)
+    image.save(path, "JPEG", quality=90)
+    return str(path)
+
+
+def test_near_duplicates_hash_close_and_different_photos_far(tmp_path):
+    original = dhash(_photo(tmp_path / "a.jpg"))
+    burst = dhash(_photo(tmp_path / "b.jpg", brightness=1.1, size=(640, 480)))
+    other = dhash(_photo(tmp_path / "c.jpg", seed=1))
+
+    assert len(original) == 16
+    assert hamming(original, burst) <= 4
+    assert hamming(original, other) > 12
+
+
+def _flat(path, color):
+    Image.new("RGB", (320, 240), color).save(path, "JPEG", quality=90)
+    return str(path)
+
+
+def test_flat_photos_are_not_hashed(tmp_path):
+    # A near-black and a cream photo would both hash to all zeros
+    assert dhash(_flat(tmp_path / "dark.jpg", (20, 18, 15))) is None
+    assert dhash(_flat(tmp_path / "cream.jpg", (240, 228, 200))) is None
+    assert not informative("0000000000000000") and not informative("ffffffffffffffff")
+    assert informative(dhash(_photo(tmp_path / "meal.jpg")))
+
+
+def test_unreadable_file_has_no_hash(tmp_path):
+    path = tmp_path / "x.jpg"
+    path.write_bytes(b"not an image")
+    assert dhash(str(path)) is None
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CALORIE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "CALORIE_CACHE_MAX_DISTANCE", 6)
+    monkeypatch.setattr(settings, "CALORIE_CACHE_GLOBAL_MAX_DISTANCE", 2)
+    monkeypatch.setattr(settings, "CALORIE_CACHE_VERIFY_RATE", 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'calorie.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[UserProfile.__table__, UserFoodLog.__table__])
+    return sessionmaker(bind=engine)
+
+
+def _log(db, email, image_hash, analysis=ANALYSIS):
+    db.add(UserFoodLog(user_email=email, image_path="x.jpg", food_analysis=analysis, image_hash=image_hash))
+    db.commit()
+
+
+def test_index_prefers_own_logs_and_applies_stricter_global_threshold(session_factory):
+    index = ImageHashIndex()
+    with session_factory() as db:
+        _log(db, "other@x.com", "a5a5a5a5a5a5a5ff", {"dish_name": "global"})
+        _log(db, "me@x.com", "a5a5a5a5a5a5a53f", {"dish_name": "mine"})
+
+        log, distance, scope = index.lookup(db, "me@x.com", "a5a5a5a5a5a5a5ff")
+        assert (log.food_analysis["dish_name"], distance, scope) == ("mine", 2, "user")
+
+        # Another user 3+ bits away from every entry: over the global threshold
+        assert index.lookup(db, "new@x.com", "a5a5a5a5a5a5a4fc") is None
+        log, distance, scope = index.lookup(db, "new@x.com", "a5a5a5a5a5a5a5fe")
+        assert (log.food_analysis["dish_name"], scope) == ("global", "global")
+
+
+def test_same_result_tolerates_small_calorie_drift():
+    assert same_result(ANALYSIS, {"dish_name": "dal rice ", "estimated_calories": "560 kcal"})
+    assert not same_result(ANALYSIS, {"dish_name": "Dal rice", "estimated_calories": 900})
+    assert not same_result(ANALYSIS, {"dish_name": "Khichdi", "estimated_calories": 520})
+
+
+def test_sampled_hits_are_verified(monkeypatch):
+    monkeypatch.setattr(settings, "CALORIE_CACHE_VERIFY_RATE", 1.0)
+    detect = AsyncMock(return_value={"dish_name": "Pizza", "estimated_calories": 900})
+    before = metrics.get_counter("calorie_cache_verifications_total", {"result": "mismatch", "scope": "user"})
+
+    async def main():
+        await calorie_cache.maybe_verify(detect, "x.jpg", ANALYSIS, 3, "user")
+
+    asyncio.run(main())
+    assert metrics.get_counter("calorie_cache_verifications_total", {"result": "mismatch", "scope": "user"}) == before + 1
+
+
+@patch("app.routers.calorie.CalorieDetector.detect_calories_async", new_callable=AsyncMock)
+def test_reupload_is_served_from_cache(mock_detect, session_factory, tmp_path, monkeypatch):
+    mock_detect.return_value = ANALYSIS
+    monkeypatch.setattr(calorie_module, "UPLOAD_DIR", str(tmp_path))
+    index = ImageHashIndex()
+    monkeypatch.setattr(calorie_module, "image_index", index)
+    with session_factory() as db:
+        db.add(UserProfile(name="Cal", email="cal@x.com"))
+        db.commit()
+
+    # The index lookup (and its first full sync) must run in a worker thread, not on the loop
+    on_loop = []
+    lookup = index.lookup
+
+    def recording_lookup(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return lookup(*args)
+
+    monkeypatch.setattr(index, "lookup", recording_lookup)
+
+    def get_db():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_current_user] = lambda: None
+    app.dependency_overrides[calorie_module.get_db] = get_db
+    client = TestClient(app)
+    photo = _photo(tmp_path / "meal.jpg")
+
+    def upload():
+        with open(photo, "rb") as f:
+            return client.post("/profile/calorie/detect", data={"name": "Cal", "email": "cal@x.com"},
+                               files={"file": ("meal.jpg", io.BytesIO(f.read()), "image/jpeg")}).json()
+
+    try:
+        first, second = upload(), upload()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert mock_detect.await_count == 1
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert on_loop == [False, False]
+    assert second["dish_name"] == "Dal rice"
+    with session_factory() as db:
+        assert db.query(UserFoodLog).count() == 2
+
+
+def test_stored_flat_hashes_are_never_matched(session_factory):
+    with session_factory() as db:
+        _log(db, "other@x.com", "0000000000000000", {"dish_name": "dark plate"})
+        assert ImageHashIndex().lookup(db, "new@x.com", "0000000000000000") is None
+
+
+@patch("app.routers.calorie.CalorieDetector.detect_calories_async", new_callable=AsyncMock)
+def test_different_flat_photos_are_each_analysed(mock_detect, session_factory, tmp_path, monkeypatch):
+    mock_detect.return_value = ANALYSIS
+    monkeypatch.setattr(calorie_module, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(calorie_module, "image_index", ImageHashIndex())
+    with session_factory() as db:
+        db.add(UserProfile(name="Cal", email="cal@x.com"))
+        db.commit()
+
+    def get_db():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_current_user] = lambda: None
+    app.dependency_overrides[calorie_module.get_db] = get_db
+    client = TestClient(app)
+
+    def upload(path):
+        with open(path, "rb") as f:
+            return client.post("/profile/calorie/detect", data={"name": "Cal", "email": "cal@x.com"},
+                               files={"file": ("meal.jpg", io.BytesIO(f.read()), "image/jpeg")}).json()
+
+    try:
+        dark = upload(_flat(tmp_path / "dark.jpg", (20, 18, 15)))
+        cream = upload(_flat(tmp_path / "cream.jpg", (240, 228, 200)))
+    finally:
+        app.dependency_overrides.clear()
+
+    assert mock_detect.await_count == 2
+    assert (dark["cached"], cream["cached"]) == (False, False)
+    with session_factory() as db:
+        assert [log.image_hash for log in db.query(UserFoodLog)] == [None, None]
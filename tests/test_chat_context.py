@@ -0,0 +1,104 @@
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.ai.chat_context import (
+    OMITTED, build_chat_context, estimate_tokens, question_topics, select_workout,
+)
+from app.ai.chatbot import ChatbotAssistant, NO_DIET_NOTE
+from app.database import Base
+from app.models import ChatHistory, ChatSummary, UserDiet, UserFoodLog, UserProfile, UserWorkout
+
+MONDAY = date(2025, 3, 10)
+
+DIET = {
+    "breakfast": {"items": ["oats", "banana"], "total": {"calories": 350}},
+    "lunch": {"items": ["rice", "dal"], "total": {"calories": 600}},
+    "dinner": {"items": ["paneer", "salad"], "total": {"calories": 500}},
+}
+WORKOUT = {
+    day: {"focus": focus, "exercises": [{"name": f"{focus} move", "sets": "3", "reps": "12"}] * 4}
+    for day, focus in [("monday", "Legs"), ("tuesday", "Chest"), ("wednesday", "Back"),
+                       ("thursday", "Arms"), ("friday", "Core"), ("saturday", "Cardio")]
+}
+
+
+def _build(question, history=(), budget=1200, diet=DIET, workout=WORKOUT):
+    return build_chat_context(question, diet, workout, list(history), MONDAY,
+                              no_diet_note="no diet", no_workout_note="no workout", budget=budget)
+
+
+def test_topics_follow_the_question():
+    assert question_topics("what should I eat for lunch?") == {"diet"}
+    assert question_topics("how many sets of squats?") == {"workout"}
+    assert question_topics("hi there") == {"diet", "workout"}
+
+
+def test_diet_question_gets_only_the_named_meal_compactly():
+    ctx = _build("What's for lunch?")
+    assert json.loads(ctx.today_diet) == {"lunch": DIET["lunch"]}
+    assert ": " not in ctx.today_diet  # compact separators
+    assert ctx.current_workout == OMITTED
+    assert ctx.sections == ["diet:lunch"]
+
+
+def test_workout_question_gets_todays_day_only():
+    ctx = _build("what's my workout?")
+    assert list(json.loads(ctx.current_workout)) == ["monday"]
+    assert ctx.today_diet == OMITTED
+
+    assert list(select_workout(WORKOUT, "and tomorrow's exercises?", MONDAY)) == ["tuesday"]
+    assert select_workout(WORKOUT, "show my weekly workout", MONDAY) == WORKOUT
+    assert select_workout(WORKOUT, "sunday workout?", MONDAY) == {"sunday": "Rest day (no workout scheduled)"}
+
+
+def test_missing_plans_keep_their_instruction_note():
+    ctx = _build("what should I eat?", diet=None)
+    assert ctx.today_diet == "no diet"
+
+
+def test_history_is_trimmed_to_budget_newest_first():
+    history = [("User", f"message {i} " + "x" * 200) for i in range(30)]
+    ctx = _build("hello", history=history, budget=600)
+
+    assert 0 < ctx.history_messages < 30
+    assert ctx.history.rstrip().endswith("message 29 " + "x" * 200)
+    assert "message 0 " not in ctx.history
+    assert ctx.context_tokens <= 600
+
+
+def test_large_plans_are_clipped_to_their_share():
+    huge = {"breakfast": {"items": ["x" * 50] * 200}}
+    ctx = _build("breakfast?", diet=huge, budget=1000)
+    assert estimate_tokens(ctx.today_diet) <= 300
+    assert ctx.today_diet.endswith("...[truncated]")
+
+
+def test_chatbot_prompt_reports_its_size(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__,
+        UserFoodLog.__table__, ChatHistory.__table__, ChatSummary.__table__,
+    ])
+    db = sessionmaker(bind=engine)()
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    db.add(UserProfile(name="Sam", email="a@b.com", age=30))
+    db.add(UserDiet(user_email="a@b.com", diet_plan=DIET, plan_date=today, created_at=datetime.now()))
+    db.add(UserWorkout(user_email="a@b.com", workout_plan=WORKOUT, week_start=week_start,
+                       week_end=week_start + timedelta(days=6), week_number=1))
+    for i in range(40):
+        db.add(ChatHistory(user_email="a@b.com", role="user" if i % 2 == 0 else "assistant", content=f"turn {i}"))
+    db.commit()
+
+    assistant = ChatbotAssistant(client=object(), async_client=object())
+    prompt = assistant.build_prompt("a@b.com", "what's for dinner?", db)
+
+    ctx = assistant.last_context
+    assert ctx.sections == ["diet:dinner"]
+    assert "paneer" in prompt and "rice" not in prompt
+    assert ctx.history_messages == 20  # CHAT_HISTORY_MAX_MESSAGES
+    assert ctx.prompt_tokens == estimate_tokens(prompt)
+    assert NO_DIET_NOTE not in prompt
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.ai.chat_memory as chat_memory
+from app.ai.chat_memory import ChatSummarizer, load_summary, schedule_summary_refresh
+from app.ai.chatbot import ChatbotAssistant
+from app.config import settings
+from app.database import Base
+from app.models import ChatHistory, ChatSummary, UserDiet, UserFoodLog, UserProfile, UserWorkout
+
+
+def _resp(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def Session(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_EVERY_TURNS", 2)
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_KEEP_RECENT", 4)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[
+        UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__,
+        UserFoodLog.__table__, ChatHistory.__table__, ChatSummary.__table__,
+    ])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(UserProfile(name="Sam", email="a@b.com", age=30))
+        db.commit()
+    return factory
+
+
+def _turns(db, start, n):
+    for i in range(start, start + n):
+        db.add(ChatHistory(user_email="a@b.com", role="user", content=f"question {i}"))
+        db.add(ChatHistory(user_email="a@b.com", role="assistant", content=f"answer {i}"))
+    db.commit()
+
+
+def _summarizer(text="The user is training for a 10k."):
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(return_value=_resp(text))
+    return ChatSummarizer(client=MagicMock(), async_client=async_client)
+
+
+def test_refresh_waits_for_enough_turns_and_keeps_recent_verbatim(Session):
+    summarizer = _summarizer()
+    with Session() as db:
+        _turns(db, 0, 3)  # 6 messages < keep (4) + 2 turns (4)
+        assert asyncio.run(summarizer.refresh_async(db, "a@b.com")) is False
+
+        _turns(db, 3, 1)  # 8 messages: the oldest 4 are due
+        assert asyncio.run(summarizer.refresh_async(db, "a@b.com")) is True
+
+        summary = load_summary(db, "a@b.com")
+        assert summary.summary == "The user is training for a 10k."
+        assert summary.last_message_id == 4
+        prompt = summarizer.async_client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        assert "question 1" in prompt and "question 2" not in prompt
+
+
+def test_refresh_reads_and_writes_off_the_loop_and_releases_the_session_for_the_llm(Session):
+    summarizer = _summarizer()
+    with Session() as db:
+        _turns(db, 0, 4)
+        query_threads = set()
+        event.listen(db.get_bind(), "before_cursor_execute", lambda *a: query_threads.add(threading.get_ident()))
+        in_transaction = []
+
+        async def create(**kwargs):
+            in_transaction.append(db.in_transaction())
+            return _resp("Summary.")
+
+        summarizer.async_client.chat.completions.create = create
+
+        async def run():
+            assert await summarizer.refresh_async(db, "a@b.com") is True
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+        assert in_transaction == [False]
+        assert query_threads and loop_thread not in query_threads
+        assert load_summary(db, "a@b.com").summary == "Summary."
+
+
+def test_prompt_uses_summary_plus_only_unsummarised_messages(Session):
+    with Session() as db:
+        _turns(db, 0, 4)
+        asyncio.run(_summarizer().refresh_async(db, "a@b.com"))
+
+        assistant = ChatbotAssistant(client=MagicMock(), async_client=MagicMock())
+        prompt = assistant.build_prompt("a@b.com", "hi", db)
+
+    assert "The user is training for a 10k." in prompt
+    assert "question 1" not in prompt
+    assert "question 2" in prompt and "answer 3" in prompt
+
+
+def test_prompt_size_stays_flat_as_conversation_grows(Session):
+    sizes = []
+    with Session() as db:
+        for turn in range(0, 60, 3):
+            _turns(db, turn, 3)
+            asyncio.run(_summarizer().refresh_async(db, "a@b.com"))
+            assistant = ChatbotAssistant(client=MagicMock(), async_client=MagicMock())
+            assistant.build_prompt("a@b.com", "hi", db)
+            sizes.append(assistant.last_context.prompt_tokens)
+
+    assert max(sizes[2:]) - min(sizes[2:]) < 40
+
+
+def test_refresh_runs_in_background_once_per_user(Session, monkeypatch):
+    calls = []
+
+    async def fake_refresh(self, db, email):
+        calls.append(email)
+        await asyncio.sleep(0.05)
+        return True
+
+    monkeypatch.setattr(ChatSummarizer, "refresh_async", fake_refresh)
+    monkeypatch.setattr(ChatSummarizer, "__init__", lambda self: None)
+
+    async def run():
+        first = schedule_summary_refresh("a@b.com", session_factory=Session)
+        second = schedule_summary_refresh("a@b.com", session_factory=Session)
+        assert second is None
+        await first
+
+    asyncio.run(run())
+    assert calls == ["a@b.com"]
+    assert "a@b.com" not in chat_memory._refreshing
+
+
+def test_sync_chat_path_refreshes_in_a_background_thread(Session, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ChatSummarizer, "refresh", lambda self, db, email: calls.append(email) or True)
+    monkeypatch.setattr(ChatSummarizer, "__init__", lambda self: None)
+
+    thread = schedule_summary_refresh("a@b.com", session_factory=Session)
+    thread.join(timeout=5)
+
+    assert calls == ["a@b.com"]
+    assert "a@b.com" not in chat_memory._refreshing
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.ai.chatbot import ChatbotAssistant
+from app.routers.auth import get_current_user
+import app.routers.chatbot as chatbot_module
+import app.ai.chatbot as chatbot_ai
+
+client = TestClient(app)
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def _parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event = "message"
+        data = None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_stream_persists_full_answer_after_last_chunk(monkeypatch):
+    fake_client = MagicMock()
+    fake_client.chat.completions.create.return_value = iter([_chunk("Eat "), _chunk(None), _chunk("oats.")])
+    assistant = ChatbotAssistant(client=fake_client)
+    monkeypatch.setattr(assistant, "build_prompt", lambda *a: "prompt")
+    saved = []
+    monkeypatch.setattr(assistant, "save_turn", lambda email, q, a, db: saved.append(a))
+    refreshed = []
+    monkeypatch.setattr(chatbot_ai, "schedule_summary_refresh", refreshed.append)
+
+    gen = assistant.stream_chat_response("a@b.com", "breakfast?", db=None)
+    assert next(gen) == "Eat "
+    # Nothing is persisted until the stream is exhausted
+    assert saved == []
+    assert list(gen) == ["oats."]
+    assert saved == ["Eat oats."]
+    assert refreshed == ["a@b.com"]
+    assert fake_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+
+@patch("app.routers.chatbot.ChatbotAssistant")
+def test_stream_endpoint_emits_sse_and_reports_ttfb(mock_assistant):
+    async def slow_stream(email, message, db):
+        yield "Hello"
+        await asyncio.sleep(0.2)
+        yield " there"
+
+    mock_assistant.return_value.stream_chat_response_async.side_effect = slow_stream
+
+    def fake_get_db():
+        yield MagicMock()
+
+    app.dependency_overrides[chatbot_module.get_db] = fake_get_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(email="user@example.com")
+    try:
+        started = time.perf_counter()
+        resp = client.post("/profile/chat/stream", json={"email": "user@example.com", "message": "hi"})
+        total_ms = (time.perf_counter() - started) * 1000
+    finally:
+        app.dependency_overrides.pop(chatbot_module.get_db, None)
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(resp.text)
+    assert [e for e, _ in events] == ["message", "message", "done"]
+    assert events[0][1] == {"delta": "Hello"}
+    done = events[-1][1]
+    assert done["response"] == "Hello there"
+    # First token went out before the slow second chunk
+    assert done["ttfb_ms"] < 200 <= total_ms
+
+
+@patch("app.routers.chatbot.ChatbotAssistant")
+def test_stream_endpoint_reports_errors_as_event(mock_assistant):
+    async def failing_stream(email, message, db):
+        raise RuntimeError("upstream down")
+        yield  # pragma: no cover
+
+    mock_assistant.return_value.stream_chat_response_async.side_effect = failing_stream
+
+    def fake_get_db():
+        yield MagicMock()
+
+    app.dependency_overrides[chatbot_module.get_db] = fake_get_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(email="user@example.com")
+    try:
+        resp = client.post("/profile/chat/stream", json={"email": "user@example.com", "message": "hi"})
+    finally:
+        app.dependency_overrides.pop(chatbot_module.get_db, None)
+        app.dependency_overrides.pop(get_current_user, None)
+
+    events = _parse_events(resp.text)
+    assert events[-1][0] == "error"
+    assert "upstream down" in events[-1][1]["detail"]
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import app
+from app.models import UserAuth, UserDiet, UserExerciseAnalysis, UserFoodLog, UserProfile, UserWorkout
+from app.routers import dashboard as dashboard_router
+from app.routers.auth import get_current_user
+from app.services.dashboard import load_dashboard
+
+TODAY = date.today()
+EMAIL = "dash@x.com"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dashboard.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[
+        UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__,
+        UserFoodLog.__table__, UserExerciseAnalysis.__table__,
+    ])
+    factory = sessionmaker(bind=engine)
+    app.dependency_overrides[get_current_user] = lambda: UserAuth(email=EMAIL)
+    app.dependency_overrides[dashboard_router.get_session_factory] = lambda: factory
+    yield factory
+    app.dependency_overrides.clear()
+
+
+def test_dashboard_without_profile_is_404(session_factory):
+    assert TestClient(app).get("/profile/dashboard").status_code == 404
+
+
+def test_dashboard_aggregates_todays_data(session_factory):
+    start_of_week = TODAY - timedelta(days=TODAY.weekday())
+    day = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"][TODAY.weekday()]
+    now = datetime.combine(TODAY, datetime.min.time()) + timedelta(hours=9)
+    with session_factory() as db:
+        db.add(UserProfile(name="Dash", email=EMAIL, goal="fat loss", weight=80, height=180, diet_type="veg"))
+        db.add(UserDiet(user_email=EMAIL, plan_date=TODAY, diet_plan={
+            "breakfast": {"items": ["oats"], "total": {"calories": 350}, "recipe": "long text"},
+        }))
+        db.add(UserWorkout(user_email=EMAIL, week_start=start_of_week, week_end=start_of_week + timedelta(days=6),
+                           week_number=3, workout_plan={day.capitalize(): [{"exercise": "Squat"}]}))
+        db.add(UserFoodLog(user_email=EMAIL, food_analysis={"estimated_calories": 420}, created_at=now))
+        db.add(UserFoodLog(user_email=EMAIL, food_analysis={"estimated_calories": "300 kcal"}, created_at=now))
+        db.add(UserFoodLog(user_email=EMAIL, food_analysis={"estimated_calories": 999},
+                           created_at=now - timedelta(days=1)))
+        db.add(UserExerciseAnalysis(user_email=EMAIL, week_start=start_of_week - timedelta(days=7),
+                                    week_end=start_of_week - timedelta(days=1), advice="Keep going",
+                                    daily_stats=[{"completed_exercises": 4, "total_exercises": 5}],
+                                    created_at=now))
+        db.commit()
+
+    body = TestClient(app).get("/profile/dashboard").json()
+
+    assert body["profile"]["name"] == "Dash"
+    assert body["diet"]["meals"] == {"breakfast": {"items": ["oats"], "total": {"calories": 350}}}
+    assert body["workout"]["week_number"] == 3
+    assert body["workout"]["plan"] == [{"exercise": "Squat"}]
+    assert body["calories"] == {"total_calories": 720, "meals_logged": 2}
+    assert body["analysis"]["advice"] == "Keep going"
+    assert body["analysis"]["completed_exercises"] == 4
+
+
+def test_dashboard_missing_sections_are_null(session_factory):
+    with session_factory() as db:
+        db.add(UserProfile(name="New", email=EMAIL))
+        db.commit()
+
+    body = TestClient(app).get("/profile/dashboard").json()
+
+    assert body["diet"] is None and body["workout"] is None and body["analysis"] is None
+    assert body["calories"] == {"total_calories": 0, "meals_logged": 0}
+
+
+def test_dashboard_queries_stay_off_the_event_loop(session_factory):
+    with session_factory() as db:
+        db.add(UserProfile(name="Dash", email=EMAIL))
+        db.commit()
+    query_threads = set()
+    event.listen(session_factory.kw["bind"], "before_cursor_execute",
+                 lambda *a: query_threads.add(threading.get_ident()))
+
+    async def run():
+        return await load_dashboard(EMAIL, TODAY, session_factory), threading.get_ident()
+
+    body, loop_thread = asyncio.run(run())
+
+    assert body["profile"]["name"] == "Dash"
+    assert query_threads and loop_thread not in query_threads
@@ -26,3 +26,10 @@ def test_prompt_file_exists_and_requires_json():
 
     text = open(prompt_path, "r").read()
     assert "ONLY return a single JSON object" in text or "ONLY return" in text
+
+
+def test_build_request_uses_in_memory_bytes_and_type():
+    ed = ExerciseDetector(client=object())
+    request = ed._build_request(b"\x89PNG\r\n\x1a\nabc", "image/png")
+    url = request["messages"][0]["content"][1]["image_url"]["url"]
+    assert url == "data:image/png;base64," + base64.b64encode(b"\x89PNG\r\n\x1a\nabc").decode("utf-8")
@@ -1,12 +1,15 @@
 from fastapi.testclient import TestClient
 from app.main import app
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 import io
 
 
 client = TestClient(app)
 
 
+JPEG = b"\xff\xd8\xff\xe0"
+
+
 def make_upload_file_bytes():
     # produce a tiny image-like byte string
     return io.BytesIO(b"\x89PNG\r\n\x1a\n\x00\x00")
@@ -14,14 +17,14 @@ def make_upload_file_bytes():
 
 @patch("app.routers.exercise.ExerciseDetector")
 def test_validate_exercise_endpoint_stateless(mock_detector):
-    # Mock the detector instance validate_image to return a deterministic result
+    # Mock the detector instance validate_image_async to return a deterministic result
     instance = mock_detector.return_value
-    instance.validate_image.return_value = {
+    instance.validate_image_async = AsyncMock(return_value={
         "is_exercise": True,
         "confidence": 0.95,
         "label": "exercise",
         "explanation": "Person lifting a dumbbell",
-    }
+    })
 
     # Make sure a test user is present — endpoint checks only that user exists by email.
     # If there is no DB user it will return 404; we'll use the same email used in other tests
@@ -48,3 +51,84 @@ def test_validate_exercise_endpoint_stateless(mock_detector):
     assert "image_path" in json
     assert json["is_exercise"] is True
     assert "raw" not in json
+
+
+class _FakeDB:
+    def query(self, model):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return object()
+
+
+def _batch(files, detector_side_effect, monkeypatch, tmp_path):
+    import app.routers.exercise as exercise_module
+    from app.routers.auth import get_current_user
+
+    monkeypatch.setattr(exercise_module, "UPLOAD_DIR", str(tmp_path))
+    app.dependency_overrides[get_current_user] = lambda: None
+    app.dependency_overrides[exercise_module.get_db] = lambda: _FakeDB()
+    try:
+        with patch("app.routers.exercise.ExerciseDetector") as mock_detector:
+            mock_detector.return_value.validate_image_async = AsyncMock(side_effect=detector_side_effect)
+            response = client.post(
+                "/profile/exercise/validate-batch",
+                data={"email": "user@example.com"},
+                files=[("files", (name, io.BytesIO(content), "image/jpeg")) for name, content in files],
+            )
+            return response, mock_detector.return_value.validate_image_async
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_batch_validates_unique_images_and_keeps_order(monkeypatch, tmp_path):
+    def detect(content, mime_type):
+        label = content[len(JPEG):].decode()
+        if label == "broken":
+            raise ValueError("unreadable image")
+        return {"is_exercise": label == "squat", "confidence": 0.9, "label": label}
+
+    response, validate = _batch(
+        [("a.jpg", JPEG + b"squat"), ("b.jpg", JPEG + b"selfie"), ("c.jpg", JPEG + b"squat"),
+         ("d.jpg", JPEG + b"broken"), ("e.txt", b"not an image")],
+        detect, monkeypatch, tmp_path,
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert validate.await_count == 3  # the duplicate squat photo is validated once
+    assert [r["filename"] for r in body["results"]] == ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.txt"]
+    assert [r["status"] for r in body["results"]] == ["ok", "ok", "ok", "error", "error"]
+    assert body["results"][2]["duplicate_of"] == 0 and body["results"][2]["is_exercise"] is True
+    assert body["results"][1]["is_exercise"] is False
+    assert "unreadable image" in body["results"][3]["error"]
+    assert "Unsupported image type" in body["results"][4]["error"]
+    assert (body["succeeded"], body["failed"]) == (3, 2)
+    # Duplicates, failures and rejected files leave nothing behind
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_batch_all_unavailable_is_503(monkeypatch, tmp_path):
+    from app.ai.resilience import LLMUnavailableError
+
+    response, _ = _batch([("a.jpg", JPEG + b"one"), ("b.jpg", JPEG + b"two")],
+                         LLMUnavailableError("circuit open", retry_after=5), monkeypatch, tmp_path)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_batch_with_rejected_file_and_unavailable_ai_reports_per_file(monkeypatch, tmp_path):
+    from app.ai.resilience import LLMUnavailableError
+
+    response, _ = _batch([("a.jpg", JPEG + b"one"), ("b.txt", b"not an image")],
+                         LLMUnavailableError("circuit open", retry_after=5), monkeypatch, tmp_path)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["error", "error"]
+    assert "circuit open" in results[0]["error"]
+    assert "Unsupported image type" in results[1]["error"]
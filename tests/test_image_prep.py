@@ -0,0 +1,70 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.ai.image_prep import prepare_image
+from app.config import settings
+from app.utils.metrics import metrics
+
+
+def _jpeg(size, orientation=None, quality=95):
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality, exif=exif)
+    return out.getvalue()
+
+
+def _size(content):
+    with Image.open(io.BytesIO(content)) as image:
+        return image.size
+
+
+def test_large_photo_is_downscaled_and_saving_recorded(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_IMAGE_MAX_EDGE", 512)
+    original = _jpeg((2000, 1500))
+    saved = metrics.get_counter("vision_image_bytes_saved_total", {"task": "test_large"})
+
+    content, mime_type = prepare_image(original, "image/jpeg", "test_large")
+
+    assert mime_type == "image/jpeg"
+    assert _size(content) == (512, 384)
+    assert len(content) < len(original)
+    assert metrics.get_counter("vision_image_bytes_saved_total", {"task": "test_large"}) == saved + len(original) - len(content)
+    assert metrics.get_counter("vision_image_prep_total", {"task": "test_large", "outcome": "resized"}) == 1
+
+
+def test_exif_orientation_is_applied(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_IMAGE_MAX_EDGE", 1024)
+    content, _ = prepare_image(_jpeg((300, 200), orientation=6), "image/jpeg", "test_rotate")
+    assert _size(content) == (200, 300)
+
+
+def test_png_with_alpha_is_sent_as_jpeg(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_IMAGE_MAX_EDGE", 64)
+    out = io.BytesIO()
+    Image.new("RGBA", (200, 100), (255, 0, 0, 0)).save(out, "PNG")
+
+    content, mime_type = prepare_image(out.getvalue(), "image/png", "test_png")
+
+    assert mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(content)) as image:
+        assert image.format == "JPEG" and image.size == (64, 32)
+        assert image.getpixel((10, 10)) > (240, 240, 240)  # transparent areas become white
+
+
+def test_small_already_compact_photo_is_sent_unchanged(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_IMAGE_MAX_EDGE", 1024)
+    original = _jpeg((64, 48), quality=20)
+    assert prepare_image(original, "image/jpeg", "test_small") == (original, "image/jpeg")
+
+
+def test_undecodable_or_disabled_is_passed_through(monkeypatch):
+    assert prepare_image(b"\x00\x00\x00\x18ftypheic", "image/heic", "test_bad") == (b"\x00\x00\x00\x18ftypheic", "image/heic")
+    monkeypatch.setattr(settings, "VISION_IMAGE_PREP_ENABLED", False)
+    original = _jpeg((2000, 1500))
+    assert prepare_image(original, "image/jpeg", "test_off") == (original, "image/jpeg")
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import app
+from app.models import GenerationJob, UserCustomDiet, UserDiet, UserProfile, UserWorkout
+from app.routers.auth import get_current_user
+import app.routers.jobs as jobs_module
+import app.routers.profile as profile_module
+from app.services import job_queue
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def job_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    tables = [UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__,
+              UserCustomDiet.__table__, GenerationJob.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(UserProfile(name="Sam", email="user@example.com", age=30))
+        db.commit()
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[profile_module.get_db] = override_get_db
+    app.dependency_overrides[jobs_module.get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(email="user@example.com")
+    yield Session
+    app.dependency_overrides.pop(profile_module.get_db, None)
+    app.dependency_overrides.pop(jobs_module.get_db, None)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_diet_request_is_queued_then_served_by_worker(job_db):
+    resp = client.post("/profile/diet-plan", json={"name": "Sam", "email": "user@example.com", "async": True})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+    assert resp.headers["location"] == f"/profile/jobs/{job_id}"
+
+    # A retry while queued reuses the same job
+    again = client.post("/profile/diet-plan", json={"name": "Sam", "email": "user@example.com", "async": True})
+    assert again.json()["job_id"] == job_id
+
+    assert client.get(f"/profile/jobs/{job_id}").json()["status"] == "queued"
+
+    with patch("app.services.plans.DietAssistant") as mock_assistant:
+        mock_assistant.return_value.get_diet_suggestion_async = AsyncMock(return_value={"breakfast": "oats"})
+        assert asyncio.run(job_queue.run_once(job_db)) is True
+        assert asyncio.run(job_queue.run_once(job_db)) is False
+
+    body = client.get(f"/profile/jobs/{job_id}").json()
+    assert body["status"] == "succeeded"
+    assert body["result"]["diet_plan"] == {"breakfast": "oats"}
+
+    # The plan is now stored, so the synchronous path answers straight from the DB
+    resp = client.post("/profile/diet-plan", json={"name": "Sam", "email": "user@example.com", "async": True})
+    assert resp.status_code == 200
+    assert resp.json()["diet_plan_id"] == body["result"]["diet_plan_id"]
+
+
+def test_worker_keeps_queries_off_the_event_loop(job_db):
+    with job_db() as db:
+        job_queue.enqueue(db, "diet", "user@example.com", {"date": "2025-01-06"})
+    query_threads = set()
+    event.listen(job_db.kw["bind"], "before_cursor_execute", lambda *a: query_threads.add(threading.get_ident()))
+
+    async def run():
+        await job_queue.run_once(job_db)
+        return threading.get_ident()
+
+    with patch("app.services.plans.DietAssistant") as mock_assistant:
+        mock_assistant.return_value.get_diet_suggestion_async = AsyncMock(return_value={"breakfast": "oats"})
+        loop_thread = asyncio.run(run())
+
+    assert query_threads and loop_thread not in query_threads
+
+
+def test_failed_job_records_error(job_db):
+    with job_db() as db:
+        job = job_queue.enqueue(db, "workout", "user@example.com", {"date": "2025-01-06"})
+        job_id = job.job_id
+
+    with patch("app.services.plans.WorkoutAssistant") as mock_assistant:
+        mock_assistant.return_value.get_workout_suggestion_async = AsyncMock(side_effect=ValueError("bad json"))
+        asyncio.run(job_queue.run_once(job_db))
+
+    body = client.get(f"/profile/jobs/{job_id}").json()
+    assert body["status"] == "failed"
+    assert "bad json" in body["error"]
+
+
+def test_jobs_of_other_users_are_not_visible(job_db):
+    with job_db() as db:
+        db.add(UserProfile(name="Alex", email="other@example.com"))
+        db.commit()
+        job_id = job_queue.enqueue(db, "diet", "other@example.com", {"date": "2025-01-06"}).job_id
+
+    assert client.get(f"/profile/jobs/{job_id}").status_code == 404
+
+
+def test_stale_running_jobs_are_requeued(job_db):
+    with job_db() as db:
+        job_queue.enqueue(db, "diet", "user@example.com", {"date": "2025-01-06"})
+        claimed = job_queue.claim_next(db)
+        assert claimed.attempts == 1
+        assert db.get(GenerationJob, claimed.job_id).status == "running"
+        assert job_queue.claim_next(db) is None
+
+        assert job_queue.requeue_stale(db, older_than=-1) == 1
+        assert job_queue.claim_next(db).attempts == 2
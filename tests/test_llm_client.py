@@ -0,0 +1,30 @@
+from unittest.mock import MagicMock
+
+from app.ai.llm_client import LLMClientManager, llm_clients
+from app.ai.diet_suggestion import DietAssistant
+from app.ai.workout_suggestion import WorkoutAssistant
+from app.ai.exercise_analysis import ExerciseAnalysis
+
+
+def test_manager_reuses_single_client():
+    manager = LLMClientManager()
+    first = manager.get_client()
+    second = manager.get_client()
+    assert first is second
+    manager.close()
+    # A new client is built after close (e.g. app restarted within the same process)
+    third = manager.get_client()
+    assert third is not first
+    manager.close()
+
+
+def test_assistants_share_the_process_client():
+    shared = llm_clients.get_client()
+    assert DietAssistant().client is shared
+    assert WorkoutAssistant().client is shared
+    assert ExerciseAnalysis().client is shared
+
+
+def test_assistant_accepts_injected_client():
+    fake = MagicMock()
+    assert DietAssistant(client=fake).client is fake
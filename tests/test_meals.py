@@ -0,0 +1,113 @@
+import io
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.main import app
+from app.models import UserFoodLog, UserProfile
+from app.routers import calorie as calorie_module
+from app.routers.auth import get_current_user
+from app.services.calorie_cache import ImageHashIndex
+from app.services.meals import merge_meal, to_number
+
+RICE = {"dish_name": "Rice", "estimated_calories": "300", "calorie_range": "250-350 kcal",
+        "ingredients": [{"item": "rice"}], "macronutrients": {"carbs": "60g", "protein": "6g"}}
+DAL = {"dish_name": "Dal", "estimated_calories": 200, "ingredients": [{"item": "lentils"}],
+       "macronutrients": {"protein": 12}}
+JPEG = b"\xff\xd8\xff\xe0"
+
+
+@pytest.mark.parametrize("value,expected", [
+    (320, 320), ("300 kcal", 300), ("20.5g", 20.5), (None, 0),
+    ("1,200 kcal", 1200), ("1,250.5", 1250.5), ("2,000,000", 2_000_000),
+])
+def test_to_number(value, expected):
+    assert to_number(value) == expected
+
+
+def test_merge_meal_sums_items():
+    meal = merge_meal([RICE, DAL])
+
+    assert meal["dish_name"] == "Rice + Dal"
+    assert meal["estimated_calories"] == 500
+    assert meal["calorie_range"] == "450-550 kcal"
+    assert meal["macronutrients"] == {"carbs": 60.0, "protein": 18.0}
+    assert [i["item"] for i in meal["ingredients"]] == ["rice", "lentils"]
+    assert meal["items"] == [RICE, DAL]
+
+
+def test_merge_meal_reads_thousands_separators():
+    thali = {"dish_name": "Thali", "estimated_calories": "1,100 kcal", "calorie_range": "1,000-1,200 kcal"}
+    meal = merge_meal([thali, RICE])
+
+    assert meal["estimated_calories"] == 1400
+    assert meal["calorie_range"] == "1250-1550 kcal"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CALORIE_CACHE_ENABLED", False)
+    monkeypatch.setattr(calorie_module, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(calorie_module, "image_index", ImageHashIndex())
+    engine = create_engine(f"sqlite:///{tmp_path / 'meals.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[UserProfile.__table__, UserFoodLog.__table__])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(UserProfile(name="Meal", email="meal@x.com"))
+        db.commit()
+
+    def get_db():
+        with factory() as db:
+            yield db
+
+    app.dependency_overrides[get_current_user] = lambda: None
+    app.dependency_overrides[calorie_module.get_db] = get_db
+    yield TestClient(app), factory
+    app.dependency_overrides.clear()
+
+
+def _post(client, *contents):
+    return client.post(
+        "/profile/calorie/detect-meal",
+        data={"name": "Meal", "email": "meal@x.com"},
+        files=[("files", (f"{i}.jpg", io.BytesIO(c), "image/jpeg")) for i, c in enumerate(contents)],
+    )
+
+
+@patch("app.routers.calorie.CalorieDetector.detect_calories_async", new_callable=AsyncMock)
+def test_meal_is_logged_once_with_breakdown(mock_detect, client, tmp_path):
+    client, factory = client
+    by_content = {JPEG + b"rice": RICE, JPEG + b"dal": DAL}
+
+    async def detect(content, mime_type):
+        return dict(by_content[content])
+
+    mock_detect.side_effect = detect
+    response = _post(client, JPEG + b"rice", JPEG + b"dal")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["estimated_calories"] == 500
+    assert [item["dish_name"] for item in body["items"]] == ["Rice", "Dal"]
+    with factory() as db:
+        log = db.query(UserFoodLog).one()
+        assert log.food_analysis["estimated_calories"] == 500
+        assert len(log.food_analysis["items"]) == 2
+
+
+@patch("app.routers.calorie.CalorieDetector.detect_calories_async", new_callable=AsyncMock)
+def test_meal_with_failed_photo_saves_nothing(mock_detect, client, tmp_path):
+    client, factory = client
+    mock_detect.side_effect = [RICE, ValueError("blurry")]
+
+    response = _post(client, JPEG + b"rice", JPEG + b"dal")
+
+    assert response.status_code == 500
+    with factory() as db:
+        assert db.query(UserFoodLog).count() == 0
+    assert not list(tmp_path.glob("*.jpg"))
@@ -0,0 +1,99 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.ai import resilience
+from app.ai.diet_suggestion import DietAssistant
+from app.ai.model_router import DEFAULT_ROUTES, ModelRoute, ModelRouter, load_routes, model_router
+
+ROUTES = {"chat": [ModelRoute("primary", 1000), ModelRoute("fast", 400), ModelRoute("faster", 200)]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clean_breakers():
+    resilience.breakers.clear()
+    yield
+    resilience.breakers.clear()
+
+
+def _router(clock=None):
+    return ModelRouter(ROUTES, {"chat": 2.0}, window=60, min_samples=5, clock=clock or FakeClock())
+
+
+def test_primary_is_used_until_enough_samples():
+    router = _router()
+    for _ in range(4):
+        router.observe("chat", "primary", 10.0)
+    assert router.choose("chat").model == "primary"
+
+
+def test_falls_back_when_p95_breaks_slo_and_returns_after_window():
+    clock = FakeClock()
+    router = _router(clock)
+    for latency in [0.5] * 10 + [5.0] * 10:
+        router.observe("chat", "primary", latency)
+
+    request = router.route("chat", {"model": "x", "max_tokens": 1000, "messages": []})
+    assert request["model"] == "fast" and request["max_tokens"] == 400
+
+    # Slow samples age out of the window: the primary is tried again
+    clock.now = 61
+    assert router.choose("chat").model == "primary"
+
+
+def test_all_routes_slow_picks_fastest():
+    router = _router()
+    for model, latency in [("primary", 9.0), ("fast", 4.0), ("faster", 6.0)]:
+        for _ in range(5):
+            router.observe("chat", model, latency)
+    assert router.choose("chat").model == "fast"
+
+
+def test_open_breaker_skips_model():
+    router = _router()
+    breaker = resilience.breakers.get("primary")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert router.choose("chat").model == "fast"
+
+
+def test_repair_requests_keep_their_max_tokens():
+    router = _router()
+    routed = router.route("chat", {"model": "x", "max_tokens": 256}, keep_max_tokens=True)
+    assert routed == {"model": "primary", "max_tokens": 256}
+
+
+def test_unrouted_task_is_left_alone():
+    assert _router().route("unknown", {"model": "x"}) == {"model": "x"}
+
+
+def test_routes_config_overrides_defaults():
+    routes = load_routes({"chat": [{"model": "llama-3.3-70b-versatile", "max_tokens": 800}, {"model": "small"}]})
+    assert routes["chat"] == [ModelRoute("llama-3.3-70b-versatile", 800), ModelRoute("small", None)]
+    assert routes["workout"] == DEFAULT_ROUTES["workout"]
+
+
+def test_assistant_requests_use_the_routed_model(monkeypatch):
+    meal = {"items": ["oats"]}
+    client = MagicMock()
+    client.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(
+            {"breakfast": meal, "lunch": meal, "dinner": meal})))]
+    )
+    monkeypatch.setitem(model_router.routes, "diet", [ModelRoute("diet-model", 1234)])
+
+    DietAssistant(client=client, async_client=MagicMock()).get_diet_suggestion({"age": 30})
+
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["model"] == "diet-model"
+    assert kwargs["max_tokens"] == 1234
@@ -0,0 +1,106 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.ai.diet_suggestion import DietAssistant
+from app.ai.exercise_analysis import ExerciseAnalysis
+from app.ai.output_parser import OutputParseError, close_truncated, extract_json, parse_json_output
+from app.schemas.llm_schema import DietPlanOutput, ExerciseDetectOutput
+
+MEAL = {"items": ["oats"], "total": {"calories": 300}}
+
+
+def _resp(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_apostrophes_survive_parsing():
+    text = '```json\n{"breakfast": {"items": ["chef\'s salad"]}, "lunch": %s, "dinner": %s}\n```' % (
+        json.dumps(MEAL), json.dumps(MEAL))
+    parsed = parse_json_output(text, DietPlanOutput)
+    assert parsed["breakfast"]["items"] == ["chef's salad"]
+
+
+@pytest.mark.parametrize("text,expected", [
+    ('Here you go: {"a": 1} hope that helps {"b": 2}', {"a": 1}),
+    ('{"a": [1, 2,], "b": {"c": "x",},}', {"a": [1, 2], "b": {"c": "x"}}),
+    ("{'a': \"chef's\", 'b': True, 'c': None}", {"a": "chef's", "b": True, "c": None}),
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": "cut off mid str', {"a": "cut off mid str"}),
+])
+def test_extract_json_tolerates_common_model_mistakes(text, expected):
+    assert extract_json(text) == expected
+
+
+def test_close_truncated_drops_dangling_key():
+    assert json.loads(close_truncated('{"a": 1, "b"')) == {"a": 1}
+
+
+def test_prose_without_json_is_not_repairable():
+    with pytest.raises(OutputParseError) as exc:
+        parse_json_output("Sorry, I can't help with that.")
+    assert not exc.value.repairable
+
+
+def test_broken_member_is_isolated():
+    text = '{"breakfast": %s, "lunch": {"items": ["rice" "dal"]}, "dinner": %s}' % (json.dumps(MEAL), json.dumps(MEAL))
+    with pytest.raises(OutputParseError) as exc:
+        parse_json_output(text, DietPlanOutput)
+    assert exc.value.repairable
+    assert set(exc.value.good) == {"breakfast", "dinner"}
+    assert '"lunch"' in exc.value.broken and "oats" not in exc.value.broken
+
+
+def test_schema_violation_marks_only_the_offending_members():
+    with pytest.raises(OutputParseError) as exc:
+        parse_json_output(json.dumps({"breakfast": MEAL, "lunch": {"items": "rice"}, "dinner": MEAL}), DietPlanOutput)
+    assert set(exc.value.good) == {"breakfast", "dinner"}
+    assert json.loads(exc.value.broken) == {"lunch": {"items": "rice"}}
+
+    with pytest.raises(OutputParseError):
+        parse_json_output('{"is_exercise": true, "confidence": 7}', ExerciseDetectOutput)
+
+
+def test_assistant_repairs_only_the_broken_part():
+    broken = '{"breakfast": %s, "lunch": %s, "dinner": {"items": ["paneer", "salad"' % (
+        json.dumps({"items": ["chef's omelette"]}), json.dumps(MEAL))
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [
+        _resp(broken.replace('"salad"', '"salad" "soup"')),
+        _resp('{"dinner": {"items": ["paneer", "salad", "soup"]}}'),
+    ]
+    assistant = DietAssistant(client=client, async_client=MagicMock())
+
+    plan = assistant.get_diet_suggestion({"age": 30})
+
+    assert plan["breakfast"]["items"] == ["chef's omelette"]
+    assert plan["dinner"]["items"] == ["paneer", "salad", "soup"]
+    first, repair = client.chat.completions.create.call_args_list
+    assert first.kwargs["response_format"] == {"type": "json_object"}
+    repair_prompt = repair.kwargs["messages"][-1]["content"]
+    assert "paneer" in repair_prompt and "chef's omelette" not in repair_prompt
+    assert repair.kwargs["max_tokens"] < first.kwargs["max_tokens"]
+
+
+def test_json_mode_rejection_is_parsed_from_failed_generation():
+    error = Exception("json_validate_failed")
+    error.body = {"error": {"code": "json_validate_failed",
+                            "failed_generation": json.dumps({"breakfast": MEAL, "lunch": MEAL, "dinner": MEAL})}}
+    client = MagicMock()
+    client.chat.completions.create.side_effect = error
+    assistant = DietAssistant(client=client, async_client=MagicMock())
+
+    assert assistant.get_diet_suggestion({"age": 30})["lunch"] == MEAL
+
+
+def test_analysis_keeps_prose_fallback():
+    client = MagicMock()
+    client.chat.completions.create.return_value = _resp("Great week, keep going!")
+    analyzer = ExerciseAnalysis(client=client, async_client=MagicMock())
+    summary = {"week_start": "2025-11-24", "week_end": "2025-11-30", "daily_stats": []}
+
+    result = analyzer.analyze_week({}, summary)
+    assert result["advice"] == "Great week, keep going!"
+    assert client.chat.completions.create.call_count == 1
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.models import UserProfile, UserWorkout, WorkoutPlanLibraryEntry
+from app.services import plans
+from app.services.plan_library import PlanLibrary, features, session_minutes
+from app.utils.metrics import metrics
+
+BASE = dict(age=28, gender="Male", height=175.0, weight=72.0, goal="Muscle Gain",
+            activity_level="moderate", workout_time="45 mins", budget="low",
+            medical_conditions="None", injuries="none")
+PLAN = {"Monday": {"focus": "Push", "exercises": [{"name": "Bench press"}]}}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "WORKOUT_LIBRARY_ENABLED", True)
+    monkeypatch.setattr(settings, "WORKOUT_LIBRARY_MAX_DISTANCE", 1.0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    Base.metadata.create_all(engine, tables=[
+        UserProfile.__table__, UserWorkout.__table__, WorkoutPlanLibraryEntry.__table__,
+    ])
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def _profile(db, email, **overrides):
+    profile = UserProfile(name=email, email=email, **{**BASE, **overrides})
+    db.add(profile)
+    db.commit()
+    return profile
+
+
+def _user_data(profile):
+    return {field: getattr(profile, field) for field in plans.WORKOUT_PROFILE_FIELDS}
+
+
+def _seed(db, library, email="seed@x.com", **overrides):
+    profile = _profile(db, email, **overrides)
+    library.add(db, profile, _user_data(profile), PLAN)
+    db.commit()
+
+
+@pytest.mark.parametrize("text,minutes", [("30 mins", 30), ("1 hour", 60), ("45-60 min", 45), ("1.5 hrs", 90), ("", None)])
+def test_session_minutes(text, minutes):
+    assert session_minutes(text) == minutes
+
+
+def test_similar_profile_reuses_plan(db):
+    library = PlanLibrary()
+    _seed(db, library)
+    profile = _profile(db, "near@x.com", age=31, weight=75.0, gender="male ")
+
+    plan = library.lookup(db, profile, _user_data(profile))
+
+    assert plan == PLAN
+    plan["Monday"]["focus"] = "changed"  # served as a copy
+    assert db.query(WorkoutPlanLibraryEntry).one().workout_plan == PLAN
+
+
+@pytest.mark.parametrize("overrides", [
+    {"goal": "fat loss"},                      # categorical mismatch
+    {"age": 45},                               # too far numerically
+    {"injuries": "knee pain"},                 # conditions are never reused
+    {"medical_conditions": "asthma"},
+    {"plan_reuse_opt_out": True},
+])
+def test_no_reuse(db, overrides):
+    library = PlanLibrary()
+    _seed(db, library)
+    profile = _profile(db, "other@x.com", **overrides)
+    assert library.lookup(db, profile, _user_data(profile)) is None
+
+
+def test_own_plans_and_ineligible_sources_are_not_used(db):
+    library = PlanLibrary()
+    _seed(db, library, email="self@x.com")
+    profile = db.query(UserProfile).filter_by(email="self@x.com").one()
+    assert library.lookup(db, profile, _user_data(profile)) is None
+
+    _seed(db, library, email="hurt@x.com", injuries="shoulder")
+    assert db.query(WorkoutPlanLibraryEntry).count() == 1
+
+
+@pytest.mark.parametrize("change", [
+    {"plan_reuse_opt_out": True},
+    {"injuries": "knee pain"},
+    {"medical_conditions": "asthma"},
+])
+def test_plans_stop_being_shared_once_the_source_becomes_ineligible(db, change):
+    library = PlanLibrary()
+    _seed(db, library)
+    source = db.query(UserProfile).filter_by(email="seed@x.com").one()
+    for key, value in change.items():
+        setattr(source, key, value)
+    db.commit()
+
+    profile = _profile(db, "near@x.com", age=31)
+    assert library.lookup(db, profile, _user_data(profile)) is None
+
+
+def test_plans_of_deleted_profiles_are_not_shared(db):
+    library = PlanLibrary()
+    _seed(db, library)
+    db.delete(db.query(UserProfile).filter_by(email="seed@x.com").one())
+    db.commit()
+
+    profile = _profile(db, "near@x.com", age=31)
+    assert library.lookup(db, profile, _user_data(profile)) is None
+
+
+@patch("app.ai.workout_suggestion.WorkoutAssistant.get_workout_suggestion_async", new_callable=AsyncMock)
+def test_generation_uses_library_and_feeds_it(mock_generate, db, monkeypatch):
+    monkeypatch.setattr(plans, "plan_library", PlanLibrary())
+    mock_generate.return_value = PLAN
+    first = _profile(db, "first@x.com")
+    second = _profile(db, "second@x.com", age=29)
+    hits = metrics.get_counter("workout_library_lookups_total", {"outcome": "hit"})
+
+    asyncio.run(plans.ensure_workout(db, first, date(2025, 3, 10)))
+    result = asyncio.run(plans.ensure_workout(db, second, date(2025, 3, 10)))
+
+    assert mock_generate.await_count == 1
+    assert result["status"] == "created" and result["workout_plan"] == PLAN
+    assert metrics.get_counter("workout_library_lookups_total", {"outcome": "hit"}) == hits + 1
+
+
+@patch("app.ai.workout_suggestion.WorkoutAssistant.get_workout_suggestion_async", new_callable=AsyncMock)
+def test_library_lookup_and_add_run_off_the_event_loop(mock_generate, db, monkeypatch):
+    library = PlanLibrary()
+    monkeypatch.setattr(plans, "plan_library", library)
+    mock_generate.return_value = PLAN
+    emails = [_profile(db, "first@x.com").email, _profile(db, "second@x.com", age=29).email]
+    query_threads = set()
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *a: query_threads.add(threading.get_ident()))
+    synced_on = []
+    sync = library._sync
+    monkeypatch.setattr(library, "_sync", lambda session: synced_on.append(threading.get_ident()) or sync(session))
+
+    async def run():
+        for email in emails:
+            # Loaded the way the routers do, in a worker thread
+            profile = await asyncio.to_thread(lambda: db.query(UserProfile).filter_by(email=email).one())
+            await plans.ensure_workout(db, profile, date(2025, 3, 10))
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert loop_thread not in query_threads
+    assert synced_on and loop_thread not in synced_on
+    assert mock_generate.await_count == 1
+    assert db.query(WorkoutPlanLibraryEntry).count() == 1
+
+
+def test_features_ignore_case_and_spacing():
+    a = features({**BASE, "goal": "Muscle  Gain"})
+    b = features({**BASE, "goal": "muscle gain"})
+    assert a == b
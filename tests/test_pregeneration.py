@@ -0,0 +1,225 @@
+import asyncio
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.models import GenerationJob, UserDiet, UserProfile, UserWorkout
+from app.services import job_queue, pregeneration
+from app.services.pregeneration import (
+    enqueue_due_diets, enqueue_next_week_workouts, invalidate_upcoming_workouts, parse_clock,
+)
+from app.utils.dates import app_now, app_today
+
+NOW = datetime(2025, 3, 10, 4, 0)
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("06:30", time(6, 30)),
+    ("6:30 AM", time(6, 30)),
+    ("7am", time(7, 0)),
+    ("12:15 a.m.", time(0, 15)),
+    ("9:05 PM", time(21, 5)),
+    ("21:15:00", time(21, 15)),
+    ("", None),
+    ("early", None),
+    ("25:00", None),
+])
+def test_parse_clock(value, expected):
+    assert parse_clock(value) == expected
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DIET_PREGEN_LEAD_MINUTES", 180)
+    monkeypatch.setattr(settings, "DIET_PREGEN_ACTIVE_DAYS", 7)
+    monkeypatch.setattr(settings, "DIET_PREGEN_MAX_PER_MINUTE", 30)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pregen.db'}")
+    Base.metadata.create_all(engine, tables=[UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__,
+                                                GenerationJob.__table__])
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def _user(db, email, wake, active=True, plan_today=False):
+    db.add(UserProfile(name=email, email=email, wake_up_time=wake))
+    if active:
+        db.add(UserDiet(user_email=email, diet_plan={}, plan_date=NOW.date() - timedelta(days=1),
+                        created_at=NOW - timedelta(days=1)))
+    if plan_today:
+        db.add(UserDiet(user_email=email, diet_plan={}, plan_date=NOW.date(), created_at=NOW))
+    db.commit()
+
+
+def _queued(db):
+    return [j.user_email for j in db.query(GenerationJob).order_by(GenerationJob.job_id)]
+
+
+def test_queues_users_inside_their_window_earliest_wake_first(db):
+    _user(db, "late@x.com", "6:45 AM")
+    _user(db, "early@x.com", "05:00")
+    _user(db, "far@x.com", "09:00")          # window opens at 06:00
+    _user(db, "woke@x.com", "03:30")         # already awake: served on demand
+    _user(db, "idle@x.com", "05:00", active=False)
+    _user(db, "done@x.com", "05:00", plan_today=True)
+    _user(db, "unknown@x.com", "whenever")
+
+    assert enqueue_due_diets(db, now=NOW) == 2
+    assert _queued(db) == ["early@x.com", "late@x.com"]
+    assert db.query(GenerationJob).first().payload == {"date": "2025-03-10"}
+
+    # Next pass doesn't queue the same users again
+    assert enqueue_due_diets(db, now=NOW + timedelta(minutes=1)) == 0
+
+
+def test_respects_global_rate_budget(db, monkeypatch):
+    monkeypatch.setattr(settings, "DIET_PREGEN_MAX_PER_MINUTE", 2)
+    for i in range(4):
+        _user(db, f"u{i}@x.com", f"0{5 + i % 2}:00")
+    # An on-demand async job created this minute counts against the same budget
+    db.add(GenerationJob(kind="workout", user_email="u0@x.com", payload={}, status="queued", attempts=0))
+    db.commit()
+
+    assert enqueue_due_diets(db, now=NOW) == 1
+    assert pregeneration.remaining_budget(db, datetime.now(timezone.utc), 2) == 0
+
+
+SATURDAY = datetime(2025, 3, 15, 0, 0)   # window opens 48h before Monday 2025-03-17
+NEXT_WEEK = SATURDAY.date() + timedelta(days=2)
+
+
+def _workout_user(db, email, week_start):
+    db.add(UserProfile(name=email, email=email, goal="strength"))
+    db.add(UserWorkout(user_email=email, workout_plan={}, week_start=week_start,
+                       week_end=week_start + timedelta(days=6), week_number=1))
+    db.commit()
+
+
+@pytest.fixture
+def weekend(monkeypatch):
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_LEAD_HOURS", 48)
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_SPREAD_HOURS", 36)
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_ACTIVE_WEEKS", 2)
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_MAX_PER_MINUTE", 100)
+
+
+def test_workouts_spread_over_the_weekend_window(db, weekend):
+    this_week = SATURDAY.date() - timedelta(days=5)
+    for i in range(20):
+        _workout_user(db, f"w{i}@x.com", this_week)
+    _workout_user(db, "lapsed@x.com", this_week - timedelta(weeks=3))
+    _workout_user(db, "done@x.com", NEXT_WEEK)
+
+    # Before the window nothing is due
+    assert enqueue_next_week_workouts(db, now=SATURDAY - timedelta(minutes=1)) == 0
+
+    midway = enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=18))
+    assert 0 < midway < 20
+    assert enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=36)) == 20 - midway
+
+    jobs = db.query(GenerationJob).all()
+    assert {j.payload["date"] for j in jobs} == {NEXT_WEEK.isoformat()}
+    assert "lapsed@x.com" not in {j.user_email for j in jobs}
+    # Monday: the normal on-demand path takes over
+    assert enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=48)) == 0
+
+
+def test_workout_pregen_respects_rate_budget(db, weekend, monkeypatch):
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_MAX_PER_MINUTE", 3)
+    for i in range(5):
+        _workout_user(db, f"w{i}@x.com", SATURDAY.date() - timedelta(days=5))
+    assert enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=40)) == 3
+    assert enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=40)) == 0
+
+
+def test_workout_budget_is_separate_from_the_diet_budget(db, weekend, monkeypatch):
+    monkeypatch.setattr(settings, "DIET_PREGEN_MAX_PER_MINUTE", 1)
+    monkeypatch.setattr(settings, "WORKOUT_PREGEN_MAX_PER_MINUTE", 2)
+    for i in range(3):
+        _workout_user(db, f"w{i}@x.com", SATURDAY.date() - timedelta(days=5))
+    db.add(GenerationJob(kind="diet", user_email="d@x.com", payload={}, status="queued", attempts=0))
+    db.commit()
+
+    assert enqueue_next_week_workouts(db, now=SATURDAY + timedelta(hours=40)) == 2
+
+
+def test_profile_change_invalidates_weeks_not_started(db):
+    this_week = SATURDAY.date() - timedelta(days=5)
+    _workout_user(db, "p@x.com", this_week)
+    db.add(UserWorkout(user_email="p@x.com", workout_plan={}, week_start=NEXT_WEEK,
+                       week_end=NEXT_WEEK + timedelta(days=6), week_number=2))
+    db.commit()
+
+    assert invalidate_upcoming_workouts(db, "p@x.com", today=SATURDAY.date()) == 1
+
+    assert [w.week_start for w in db.query(UserWorkout)] == [this_week]
+    job = db.query(GenerationJob).one()
+    assert (job.kind, job.payload) == ("workout", {"date": NEXT_WEEK.isoformat()})
+
+
+@pytest.mark.parametrize("zone,offset", [("Pacific/Kiritimati", 14), ("Etc/GMT+12", -12)])
+def test_today_is_read_in_the_app_timezone(monkeypatch, zone, offset):
+    monkeypatch.setattr(settings, "APP_TIMEZONE", zone)
+    expected = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=offset)
+    assert abs(app_now() - expected) < timedelta(minutes=1)
+    assert app_today() in {expected.date(), (expected + timedelta(minutes=1)).date()}
+
+
+def test_profile_change_supersedes_a_queued_old_profile_job(db):
+    this_week = SATURDAY.date() - timedelta(days=5)
+    _workout_user(db, "q@x.com", this_week)
+    old = job_queue.enqueue(db, "workout", "q@x.com", {"date": NEXT_WEEK.isoformat()})
+
+    assert invalidate_upcoming_workouts(db, "q@x.com", today=SATURDAY.date()) == 1
+
+    db.refresh(old)
+    assert old.status == "superseded"
+    fresh = db.query(GenerationJob).filter(GenerationJob.status == "queued").one()
+    assert fresh.job_id != old.job_id and fresh.payload == {"date": NEXT_WEEK.isoformat()}
+    # The superseded job is never claimed
+    assert job_queue.claim_next(db).job_id == fresh.job_id
+
+
+def test_running_old_profile_job_has_its_plan_replaced(db):
+    this_week = SATURDAY.date() - timedelta(days=5)
+    _workout_user(db, "r@x.com", this_week)
+    old = job_queue.enqueue(db, "workout", "r@x.com", {"date": NEXT_WEEK.isoformat()})
+    claimed = job_queue.claim_next(db)
+    invalidate_upcoming_workouts(db, "r@x.com", today=SATURDAY.date())
+    replacement = db.query(GenerationJob).filter(GenerationJob.status == "queued").one()
+
+    # The old job stores its plan after the profile change, and then finishes
+    db.add(UserWorkout(user_email="r@x.com", workout_plan={"old": True}, week_start=NEXT_WEEK,
+                       week_end=NEXT_WEEK + timedelta(days=6), week_number=2))
+    db.commit()
+    result = {"status": "created", "week_start": NEXT_WEEK.isoformat()}
+    assert job_queue._finish_job(db, claimed.job_id, result, None) == "superseded"
+
+    assert db.query(UserWorkout).filter(UserWorkout.week_start == NEXT_WEEK).count() == 0
+    # The week is queued again (onto the replacement if it hasn't run yet)
+    assert [j.job_id for j in db.query(GenerationJob).filter(GenerationJob.status == "queued")] == [replacement.job_id]
+    assert db.get(GenerationJob, old.job_id).status == "superseded"
+
+
+def test_scheduler_runs_passes_off_the_event_loop():
+    passes = []
+
+    def run_pass(db):
+        try:
+            asyncio.get_running_loop()
+            passes.append("loop")
+        except RuntimeError:
+            passes.append("thread")
+        raise asyncio.CancelledError  # stop the loop after one pass
+
+    async def run():
+        await pregeneration.scheduler_loop(lambda: nullcontext(), interval=0, run_pass=run_pass)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+    assert passes == ["thread"]
+
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from app.ai.prompt_registry import PromptRegistry, PromptValidationError, prompts
+
+
+def _write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_builtin_prompts_are_preloaded_and_validated():
+    # Registration happens at import time of each assistant
+    import app.ai.diet_suggestion  # noqa: F401
+    import app.ai.chatbot  # noqa: F401
+
+    diet = prompts.get("diet_prompt")
+    assert "current_date" in diet.fields
+    assert prompts.get("chatbot_prompt").fields
+
+
+def test_missing_placeholder_fails_at_registration(tmp_path):
+    _write(tmp_path / "greet.txt", "Hello {name}, you are {age}", 1000)
+    registry = PromptRegistry(prompt_dir=str(tmp_path))
+
+    with pytest.raises(PromptValidationError):
+        registry.register("greet", {"name"})
+
+    registry.register("greet", {"name", "age", "unused"})
+    assert registry.render("greet", name="Ann", age=30, unused=1) == "Hello Ann, you are 30"
+
+
+def test_raw_prompt_with_json_example_is_allowed(tmp_path):
+    _write(tmp_path / "raw.txt", 'Return {"ok": true}', 1000)
+    registry = PromptRegistry(prompt_dir=str(tmp_path))
+    # Registered without keys: sent verbatim, braces are not treated as placeholders
+    template = registry.register("raw")
+    assert template.text == 'Return {"ok": true}'
+
+
+def test_hot_reload_swaps_on_mtime_change(tmp_path):
+    path = tmp_path / "greet.txt"
+    _write(path, "Hi {name}", 1000)
+    registry = PromptRegistry(prompt_dir=str(tmp_path), reload_interval=0)
+    registry.register("greet", {"name"})
+    assert registry.render("greet", name="A") == "Hi A"
+
+    _write(path, "Hey {name}!", 2000)
+    assert registry.render("greet", name="A") == "Hey A!"
+
+
+def test_invalid_reload_keeps_previous_template(tmp_path):
+    path = tmp_path / "greet.txt"
+    _write(path, "Hi {name}", 1000)
+    registry = PromptRegistry(prompt_dir=str(tmp_path), reload_interval=0)
+    registry.register("greet", {"name"})
+
+    _write(path, "Hi {name}, {unknown}", 2000)
+    assert registry.render("greet", name="A") == "Hi A"
@@ -0,0 +1,210 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from groq import APIConnectionError, BadRequestError, RateLimitError
+
+from app.ai import resilience
+from app.ai.exercise_detector import ExerciseDetector
+from app.ai.resilience import CircuitBreaker, LLMUnavailableError
+from app.config import settings
+from app.main import app
+from app.routers.auth import get_current_user
+from app.utils.metrics import metrics
+
+REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+
+def _status_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls("upstream", response=response, body=None)
+
+
+def _resp(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_DELAY", 0.02)
+    resilience.breakers.clear()
+    yield
+    resilience.breakers.clear()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_retries_retryable_errors_then_succeeds():
+    outcomes = [_status_error(RateLimitError, 429), APIConnectionError(request=REQUEST), "ok"]
+    timeouts = []
+
+    def fn(timeout):
+        timeouts.append(timeout)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    before = metrics.get_counter("llm_retries_total", {"task": "chat", "reason": "429"})
+    assert resilience.call(fn, "chat", CircuitBreaker("test")) == "ok"
+    assert len(timeouts) == 3
+    # Every attempt gets what is left of the deadline
+    assert timeouts[0] <= settings.LLM_DEADLINES["chat"] and timeouts[2] < timeouts[0]
+    assert metrics.get_counter("llm_retries_total", {"task": "chat", "reason": "429"}) == before + 1
+
+
+def test_non_retryable_error_is_raised_immediately():
+    fn = MagicMock(side_effect=_status_error(BadRequestError, 400))
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    with pytest.raises(BadRequestError):
+        resilience.call(fn, "chat", breaker)
+    assert fn.call_count == 1
+    assert breaker.state == resilience.CLOSED
+
+
+def test_exhausted_retries_raise_unavailable_with_retry_after():
+    fn = MagicMock(side_effect=_status_error(RateLimitError, 429, {"retry-after": "0"}))
+
+    with pytest.raises(LLMUnavailableError) as info:
+        resilience.call(fn, "chat", CircuitBreaker("test"))
+    assert fn.call_count == settings.LLM_RETRY_ATTEMPTS
+    assert info.value.retry_after == 0
+
+
+def test_retry_after_longer_than_deadline_gives_up(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_DEADLINES", {"chat": 1})
+    fn = MagicMock(side_effect=_status_error(RateLimitError, 429, {"retry-after": "30"}))
+
+    with pytest.raises(LLMUnavailableError):
+        resilience.call(fn, "chat", CircuitBreaker("test"))
+    assert fn.call_count == 1
+
+
+def test_async_attempt_is_cut_off_at_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_DEADLINES", {"chat": 0.1})
+
+    async def hang(timeout):
+        await asyncio.sleep(5)
+
+    before = metrics.get_counter("llm_deadline_exceeded_total", {"task": "chat"})
+    with pytest.raises(LLMUnavailableError, match="deadline"):
+        asyncio.run(resilience.acall(hang, "chat", CircuitBreaker("test")))
+    assert metrics.get_counter("llm_deadline_exceeded_total", {"task": "chat"}) == before + 1
+
+
+def test_circuit_opens_fails_fast_and_recovers_through_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker("cb-test", failure_threshold=2, reset_timeout=30, clock=clock)
+    failing = MagicMock(side_effect=APIConnectionError(request=REQUEST))
+
+    with pytest.raises(LLMUnavailableError):
+        resilience.call(failing, "chat", breaker)
+    assert breaker.state == resilience.OPEN
+    assert metrics.get_gauge("llm_circuit_state", {"breaker": "cb-test"}) == 2
+
+    # Open: no upstream call at all
+    calls = failing.call_count
+    with pytest.raises(LLMUnavailableError, match="circuit"):
+        resilience.call(failing, "chat", breaker)
+    assert failing.call_count == calls
+
+    # After the reset timeout one probe goes through and closes the circuit
+    clock.now = 31
+    assert resilience.call(lambda timeout: "ok", "chat", breaker) == "ok"
+    assert breaker.state == resilience.CLOSED
+    for src, dst in [("closed", "open"), ("open", "half_open"), ("half_open", "closed")]:
+        assert metrics.get_counter("llm_circuit_transitions_total",
+                                   {"breaker": "cb-test", "from": src, "to": dst}) == 1
+
+
+def test_half_open_allows_single_probe_and_reopens_on_failure():
+    clock = FakeClock()
+    breaker = CircuitBreaker("probe-test", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+
+
+def test_hedged_request_wins_when_first_is_slow(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER", {"exercise_detect": 0.05})
+    started = []
+
+    async def fn(timeout):
+        started.append(timeout)
+        if len(started) == 1:
+            await asyncio.sleep(5)
+        return "fast"
+
+    before = metrics.get_counter("llm_hedges_total", {"task": "exercise_detect", "result": "won"})
+    result = asyncio.run(asyncio.wait_for(resilience.acall(fn, "exercise_detect", CircuitBreaker("t")), 1))
+
+    assert result == "fast"
+    assert len(started) == 2
+    assert metrics.get_counter("llm_hedges_total", {"task": "exercise_detect", "result": "won"}) == before + 1
+
+
+def test_no_hedge_when_first_answers_in_time(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER", {"exercise_detect": 0.5})
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        return "ok"
+
+    assert asyncio.run(resilience.acall(fn, "exercise_detect", CircuitBreaker("t"))) == "ok"
+    assert len(calls) == 1
+
+
+def test_assistant_passes_deadline_as_request_timeout(tmp_path):
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"\xff\xd8")
+    client = MagicMock()
+    client.chat.completions.create.return_value = _resp(
+        '{"is_exercise": true, "confidence": 0.9, "label": "exercise", "explanation": "squat"}'
+    )
+    detector = ExerciseDetector(client=client, async_client=MagicMock())
+
+    assert detector.validate_image(str(image))["is_exercise"] is True
+    timeout = client.chat.completions.create.call_args.kwargs["timeout"]
+    assert 0 < timeout <= settings.LLM_DEADLINES["exercise_detect"]
+
+
+@patch("app.routers.workout.plans.ensure_workout")
+def test_unavailable_provider_maps_to_503(mock_ensure):
+    mock_ensure.side_effect = LLMUnavailableError("circuit open", retry_after=12.5)
+    profile = SimpleNamespace(email="user@example.com")
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = profile
+
+    import app.routers.workout as workout_module
+
+    def fake_get_db():
+        yield db
+
+    app.dependency_overrides[workout_module.get_db] = fake_get_db
+    app.dependency_overrides[get_current_user] = lambda: profile
+    try:
+        with patch("app.routers.workout.plans.find_workout", return_value=None):
+            resp = TestClient(app).post("/profile/workout-plan", json={"name": "U", "email": "user@example.com"})
+    finally:
+        app.dependency_overrides.pop(workout_module.get_db, None)
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "13"
@@ -0,0 +1,163 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.ai.base as base_module
+from app.ai.model_router import ModelRoute, model_router
+from app.ai.response_cache import ResponseCache, make_cache_key
+from app.ai.workout_suggestion import WorkoutAssistant
+from app.config import settings
+from app.database import Base
+from app.models import LLMResponseCacheEntry
+
+
+def _resp(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[LLMResponseCacheEntry.__table__])
+    return sessionmaker(bind=engine)
+
+
+def _request(**overrides):
+    request = dict(model="m", messages=[{"role": "user", "content": "hi"}], temperature=0.7, max_tokens=100)
+    request.update(overrides)
+    return request
+
+
+def test_cache_key_covers_model_prompt_temperature_and_max_tokens():
+    key = make_cache_key(_request())
+    assert key == make_cache_key(_request(stream=False))
+    assert key != make_cache_key(_request(model="other"))
+    assert key != make_cache_key(_request(messages=[{"role": "user", "content": "hello"}]))
+    assert key != make_cache_key(_request(temperature=0.2))
+    assert key != make_cache_key(_request(max_tokens=200))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, persistent=False)
+    cache.set("a", "A", ttl=60)
+    cache.set("b", "B", ttl=60)
+    assert cache.get("a") == "A"  # "b" is now least recently used
+    cache.set("c", "C", ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(persistent=False)
+    cache.set("a", "A", ttl=-1)
+    cache._set_memory("b", "B", ttl=0)
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_persistent_tier_survives_a_new_process_cache():
+    factory = _session_factory()
+    ResponseCache(session_factory=factory, persistent=True).set("k", "stored", ttl=60, task="workout", model="m")
+
+    fresh = ResponseCache(session_factory=factory, persistent=True)
+    assert fresh.get("k", "workout") == "stored"
+    # Promoted into memory: a second read does not need the DB
+    assert fresh._get_memory("k") == "stored"
+    assert fresh.stats() == {"hits": 1, "misses": 0, "hit_rate": 1.0, "entries": 1}
+
+
+def test_persistent_tier_errors_degrade_to_miss():
+    def broken_factory():
+        raise RuntimeError("db down")
+
+    cache = ResponseCache(session_factory=broken_factory, persistent=True)
+    cache.set("k", "v", ttl=60)  # write failure is swallowed, memory tier still populated
+    cache._entries.clear()
+    assert cache.get("k") is None
+
+
+def test_assistant_reuses_cached_response_when_task_opted_in(monkeypatch):
+    cache = ResponseCache(persistent=False)
+    monkeypatch.setattr(base_module, "response_cache", cache)
+    monkeypatch.setattr(settings, "LLM_CACHE_TTLS", {"workout": 60})
+    client = MagicMock()
+    client.chat.completions.create.return_value = _resp('{"monday": {"focus": "Legs"}}')
+    assistant = WorkoutAssistant(client=client, async_client=MagicMock())
+
+    first = assistant.get_workout_suggestion({"age": 30})
+    second = assistant.get_workout_suggestion({"age": 30})
+
+    assert first == second == {"monday": {"focus": "Legs"}}
+    assert client.chat.completions.create.call_count == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_async_path_shares_the_cache(monkeypatch):
+    cache = ResponseCache(persistent=False)
+    monkeypatch.setattr(base_module, "response_cache", cache)
+    monkeypatch.setattr(settings, "LLM_CACHE_TTLS", {"workout": 60})
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(return_value=_resp('{"monday": {"focus": "Arms"}}'))
+    assistant = WorkoutAssistant(client=MagicMock(), async_client=async_client)
+
+    async def run_twice():
+        await assistant.get_workout_suggestion_async({"age": 30})
+        return await assistant.get_workout_suggestion_async({"age": 30})
+
+    assert asyncio.run(run_twice()) == {"monday": {"focus": "Arms"}}
+    assert async_client.chat.completions.create.await_count == 1
+
+
+def test_fallback_reply_is_not_served_once_the_primary_is_back(monkeypatch):
+    cache = ResponseCache(persistent=False)
+    monkeypatch.setattr(base_module, "response_cache", cache)
+    monkeypatch.setattr(settings, "LLM_CACHE_TTLS", {"workout": 60})
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [
+        _resp('{"monday": {"focus": "Fallback"}}'),
+        _resp('{"monday": {"focus": "Primary"}}'),
+    ]
+    assistant = WorkoutAssistant(client=client, async_client=MagicMock())
+
+    monkeypatch.setitem(model_router.routes, "workout", [ModelRoute("fallback-model", 500)])
+    assert assistant.get_workout_suggestion({"age": 30}) == {"monday": {"focus": "Fallback"}}
+    assert client.chat.completions.create.call_args.kwargs["model"] == "fallback-model"
+
+    monkeypatch.setitem(model_router.routes, "workout", [ModelRoute("primary-model", 2000)])
+    assert assistant.get_workout_suggestion({"age": 30}) == {"monday": {"focus": "Primary"}}
+    sent = client.chat.completions.create.call_args.kwargs
+    assert sent["model"] == "primary-model" and sent["max_tokens"] == 2000
+    assert cache.stats()["hits"] == 0
+
+
+def test_unparseable_output_is_not_cached(monkeypatch):
+    cache = ResponseCache(persistent=False)
+    monkeypatch.setattr(base_module, "response_cache", cache)
+    monkeypatch.setattr(settings, "LLM_CACHE_TTLS", {"workout": 60})
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [_resp("no json here"), _resp('{"monday": {"focus": "Core"}}')]
+    assistant = WorkoutAssistant(client=client, async_client=MagicMock())
+
+    try:
+        assistant.get_workout_suggestion({"age": 30})
+    except ValueError:
+        pass
+    assert assistant.get_workout_suggestion({"age": 30}) == {"monday": {"focus": "Core"}}
+    assert client.chat.completions.create.call_count == 2
+
+
+def test_cache_disabled_by_default_for_tasks(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_TTLS", {})
+    client = MagicMock()
+    client.chat.completions.create.return_value = _resp('{"monday": {"focus": "Core"}}')
+    assistant = WorkoutAssistant(client=client, async_client=MagicMock())
+
+    assistant.get_workout_suggestion({"age": 30})
+    assistant.get_workout_suggestion({"age": 30})
+    assert client.chat.completions.create.call_count == 2
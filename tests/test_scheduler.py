@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.ai.chatbot import ChatbotAssistant
+from app.ai.model_router import ModelRoute, model_router
+from app.ai.resilience import LLMUnavailableError
+from app.ai.scheduler import ModelScheduler, TokenBucket, estimate_request_tokens, llm_scheduler
+from app.utils.metrics import metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)  # one per second
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now = 2
+    assert bucket.wait_time(1) == 0
+    # Larger than the bucket: waits for a full bucket rather than forever
+    assert TokenBucket(10, clock).wait_time(1000) == 0
+
+
+def test_estimate_request_tokens_counts_text_and_reserved_completion():
+    request = {
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "x" * 40},
+            {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + "A" * 10000}},
+        ]}],
+        "max_tokens": 256,
+    }
+    assert estimate_request_tokens(request) == 10 + 256
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    scheduler = ModelScheduler("prio-model", 0, 0, max_in_flight=1, max_queue=10)
+    order = []
+
+    async def run(task, delay):
+        await asyncio.sleep(delay)
+        await scheduler.aacquire(task, 10, timeout=5)
+        order.append(task)
+        await asyncio.sleep(0.01)
+        scheduler.release()
+
+    async def main():
+        # The first call holds the only slot while the rest queue up behind it
+        await asyncio.gather(
+            run("weekly_analysis", 0),
+            run("workout", 0.005),
+            run("weekly_analysis", 0.005),
+            run("calorie_detect", 0.005),
+            run("chat", 0.006),
+        )
+
+    asyncio.run(main())
+    assert order == ["weekly_analysis", "chat", "calorie_detect", "workout", "weekly_analysis"]
+
+
+def test_request_rate_limit_delays_admission():
+    scheduler = ModelScheduler("rpm-model", requests_per_minute=600, tokens_per_minute=0, max_in_flight=0)
+    scheduler.requests.tokens = 0  # bucket drained: one request per 0.1s
+
+    started = time.monotonic()
+    waited = scheduler.acquire("chat", 10, timeout=2)
+    scheduler.release()
+
+    assert 0.05 < waited < 1.0
+    assert time.monotonic() - started >= 0.05
+    assert metrics.get_histogram("llm_queue_wait_seconds", {"model": "rpm-model", "priority": "interactive"})["count"] == 1
+
+
+def test_wait_past_timeout_is_rejected_and_leaves_queue_clean():
+    scheduler = ModelScheduler("busy-model", 0, 0, max_in_flight=1, max_queue=10)
+    scheduler.acquire("workout", 10, timeout=1)
+
+    with pytest.raises(LLMUnavailableError):
+        scheduler.acquire("diet", 10, timeout=0.05)
+    assert metrics.get_gauge("llm_queue_depth", {"model": "busy-model", "priority": "generation"}) == 0
+
+    scheduler.release()
+    assert scheduler.acquire("chat", 10, timeout=0.1) == pytest.approx(0, abs=0.05)
+
+
+def test_full_queue_fails_fast():
+    scheduler = ModelScheduler("full-model", 0, 0, max_in_flight=1, max_queue=1)
+    scheduler.acquire("chat", 10, timeout=1)
+    waiter = threading.Thread(target=lambda: scheduler.acquire("workout", 10, timeout=0.3))
+    waiter.start()
+    time.sleep(0.05)
+
+    with pytest.raises(LLMUnavailableError, match="full"):
+        scheduler.acquire("chat", 10, timeout=1)
+    scheduler.release()
+    waiter.join()
+
+
+def test_assistant_calls_go_through_the_scheduler(monkeypatch):
+    llm_scheduler.clear()
+    monkeypatch.setitem(model_router.routes, "chat", [ModelRoute("sched-test-model")])
+    client = MagicMock()
+    client.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Hi"))]
+    )
+    assistant = ChatbotAssistant(client=client, async_client=MagicMock())
+
+    assistant._create(model="sched-test-model", messages=[{"role": "user", "content": "hello"}], max_tokens=50)
+
+    scheduler = llm_scheduler.for_model("sched-test-model")
+    assert scheduler.in_flight == 0
+    assert metrics.get_histogram("llm_queue_wait_seconds",
+                                 {"model": "sched-test-model", "priority": "interactive"})["count"] == 1
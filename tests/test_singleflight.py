@@ -0,0 +1,188 @@
+import asyncio
+import threading
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.main import app
+from app.models import UserDiet, UserProfile, UserWorkout
+from app.routers.auth import get_current_user
+import app.routers.profile as profile_module
+import app.routers.workout as workout_module
+from app.services import plans
+from app.utils.singleflight import SingleFlight, advisory_lock, advisory_lock_id
+
+
+def test_followers_share_the_leaders_result():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"plan": calls}
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(10)))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert calls == 1
+    assert all(r == {"plan": 1} for r in results)
+    assert not flights.in_flight("k")
+
+
+def test_followers_see_the_leaders_error_and_next_call_retries():
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ValueError("boom")
+        return "ok"
+
+    async def run():
+        flights = SingleFlight()
+        first = await asyncio.gather(*(flights.do("k", work) for _ in range(3)), return_exceptions=True)
+        second = await flights.do("k", work)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in first)
+    assert second == "ok"
+    assert len(attempts) == 2
+
+
+def test_advisory_lock_is_noop_outside_postgres():
+    engine = create_engine("sqlite://")
+    db = sessionmaker(bind=engine)()
+
+    async def run():
+        async with advisory_lock(db, "diet:a@b.com:2025-01-01"):
+            return "inside"
+
+    assert asyncio.run(run()) == "inside"
+    assert advisory_lock_id("x") == advisory_lock_id("x")
+    assert -(2 ** 63) <= advisory_lock_id("x") < 2 ** 63
+
+
+def test_advisory_lock_uses_own_connection_and_releases_it(monkeypatch):
+    import app.utils.singleflight as singleflight
+
+    class FakeConn:
+        def __init__(self):
+            self.sql, self.closed, self.attempts = [], False, 0
+
+        def execute(self, statement, params):
+            self.sql.append(str(statement))
+            self.attempts += "try" in str(statement)
+            return SimpleNamespace(scalar=lambda: self.attempts > 1)
+
+        def close(self):
+            self.closed = True
+
+    conn = FakeConn()
+    db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+    monkeypatch.setattr(singleflight, "_lock_engine", lambda bind: None)
+    monkeypatch.setattr(singleflight, "_connect", lambda engine: conn)
+
+    async def run():
+        async with advisory_lock(db, "diet:a@b.com:2025-01-01", poll_interval=0.01):
+            return list(conn.sql)
+
+    inside = asyncio.run(run())
+    # Held at session level on the lock's own connection (the request session isn't touched),
+    # released and closed afterwards
+    assert inside == ["SELECT pg_try_advisory_lock(:id)"] * 2
+    assert conn.sql[-1] == "SELECT pg_advisory_unlock(:id)" and conn.closed
+
+
+@pytest.fixture
+def plan_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    Base.metadata.create_all(engine, tables=[UserProfile.__table__, UserDiet.__table__, UserWorkout.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(UserProfile(name="Sam", email="user@example.com", age=30))
+        db.commit()
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[profile_module.get_db] = override_get_db
+    app.dependency_overrides[workout_module.get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(email="user@example.com")
+    yield Session
+    app.dependency_overrides.pop(profile_module.get_db, None)
+    app.dependency_overrides.pop(workout_module.get_db, None)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _post_concurrently(path, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        body = {"name": "Sam", "email": "user@example.com"}
+        return await asyncio.gather(*(ac.post(path, json=body) for _ in range(n)))
+
+
+def test_concurrent_diet_requests_make_one_llm_call(plan_db):
+    async def slow_diet(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return {"breakfast": "oats"}
+
+    with patch("app.services.plans.DietAssistant") as mock_assistant:
+        mock_assistant.return_value.get_diet_suggestion_async = AsyncMock(side_effect=slow_diet)
+        responses = asyncio.run(_post_concurrently("/profile/diet-plan", 5))
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert {r.json()["diet_plan_id"] for r in responses} == {responses[0].json()["diet_plan_id"]}
+    assert mock_assistant.return_value.get_diet_suggestion_async.await_count == 1
+    with plan_db() as db:
+        assert db.query(UserDiet).count() == 1
+
+
+def test_concurrent_workout_requests_make_one_llm_call(plan_db):
+    async def slow_workout(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return {"tuesday": {"focus": "Arms"}, "monday": {"focus": "Legs"}}
+
+    with patch("app.services.plans.WorkoutAssistant") as mock_assistant:
+        mock_assistant.return_value.get_workout_suggestion_async = AsyncMock(side_effect=slow_workout)
+        responses = asyncio.run(_post_concurrently("/profile/workout-plan", 5))
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert list(responses[-1].json()["workout_plan"]) == ["monday", "tuesday"]
+    assert mock_assistant.return_value.get_workout_suggestion_async.await_count == 1
+    with plan_db() as db:
+        assert db.query(UserWorkout).count() == 1
+
+
+def test_plan_generation_keeps_queries_off_the_event_loop(plan_db):
+    engine = plan_db.kw["bind"]
+    query_threads = set()
+    event.listen(engine, "before_cursor_execute", lambda *a: query_threads.add(threading.get_ident()))
+
+    async def run():
+        with plan_db() as db:
+            profile = await asyncio.to_thread(db.get, UserProfile, 1)
+            result = await plans.ensure_diet(db, profile, date(2025, 1, 6))
+        return result, threading.get_ident()
+
+    with patch("app.services.plans.DietAssistant") as mock_assistant:
+        mock_assistant.return_value.get_diet_suggestion_async = AsyncMock(return_value={"breakfast": "oats"})
+        result, loop_thread = asyncio.run(run())
+
+    assert result["diet_plan"] == {"breakfast": "oats"}
+    assert query_threads and loop_thread not in query_threads
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.ai import resilience
+from app.ai.calorie_detector import CalorieDetector
+from app.ai.chatbot import ChatbotAssistant
+from app.ai.diet_suggestion import DietAssistant
+from app.ai.exercise_detector import ExerciseDetector
+from app.ai.llm_client import LLMClientManager, StubProvider, get_provider
+from app.ai.output_parser import parse_json_output
+from app.ai.stub_provider import CANNED_REPLIES, AsyncStubClient, LatencyModel, StubClient, _StubBackend
+from app.ai.workout_suggestion import WorkoutAssistant
+from app.config import settings
+from app.schemas.llm_schema import (
+    CalorieOutput, CustomDietOutput, DietPlanOutput, ExerciseDetectOutput, WeeklyAnalysisOutput, WorkoutPlanOutput,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_breakers():
+    resilience.breakers.clear()
+    yield
+    resilience.breakers.clear()
+
+
+def _stub(**kwargs):
+    backend = _StubBackend(**{"latency": "fixed:0", "error_rate": 0, "seed": 1, **kwargs})
+    return StubClient(backend), AsyncStubClient(backend)
+
+
+@pytest.mark.parametrize("task,schema", [
+    ("diet", DietPlanOutput),
+    ("custom_diet", CustomDietOutput),
+    ("workout", WorkoutPlanOutput),
+    ("calorie_detect", CalorieOutput),
+    ("exercise_detect", ExerciseDetectOutput),
+    ("weekly_analysis", WeeklyAnalysisOutput),
+])
+def test_canned_replies_match_schemas(task, schema):
+    parse_json_output(json.dumps(CANNED_REPLIES[task]), schema)
+
+
+def test_assistants_run_end_to_end_on_the_stub(tmp_path):
+    client, async_client = _stub()
+    image = tmp_path / "meal.jpg"
+    image.write_bytes(b"\xff\xd8")
+
+    plan = DietAssistant(client=client, async_client=async_client).get_diet_suggestion({"age": 30})
+    workout = asyncio.run(
+        WorkoutAssistant(client=client, async_client=async_client).get_workout_suggestion_async({"age": 30})
+    )
+    calories = CalorieDetector(client=client, async_client=async_client).detect_calories(str(image))
+    exercise = asyncio.run(ExerciseDetector(client=client, async_client=async_client).validate_image_async(str(image)))
+
+    assert set(plan) >= {"breakfast", "lunch", "dinner"}
+    assert "monday" in workout
+    assert calories["dish_name"] == CANNED_REPLIES["calorie_detect"]["dish_name"]
+    assert exercise["is_exercise"] is True
+
+
+def test_stub_streams_chat_with_usage():
+    client, _ = _stub()
+    assistant = ChatbotAssistant(client=client, async_client=None)
+
+    chunks = list(assistant._create(model="m", messages=[{"role": "user", "content": "hi"}], stream=True))
+
+    text = "".join(c.choices[0].delta.content or "" for c in chunks)
+    assert text == CANNED_REPLIES["chat"]
+    assert chunks[-1].x_groq.usage.completion_tokens > 0
+
+
+def test_error_rate_produces_retryable_errors(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0)
+    client, async_client = _stub(error_rate=1.0)
+
+    with pytest.raises(resilience.LLMUnavailableError):
+        asyncio.run(DietAssistant(client=client, async_client=async_client).get_diet_suggestion_async({"age": 30}))
+    assert client.backend.calls == settings.LLM_RETRY_ATTEMPTS
+
+
+def test_latency_distributions():
+    import random
+
+    rng = random.Random(7)
+    assert LatencyModel("fixed:200", rng).sample() == pytest.approx(0.2)
+    uniform = [LatencyModel("uniform:100,300", rng).sample() for _ in range(200)]
+    assert 0.1 <= min(uniform) and max(uniform) <= 0.3
+    lognormal = sorted(LatencyModel("lognormal:100,0.5", rng).sample() for _ in range(2000))
+    assert lognormal[1000] == pytest.approx(0.1, rel=0.15)
+    with pytest.raises(ValueError):
+        LatencyModel("gamma:1", rng)
+
+
+def test_slow_stub_honours_request_timeout():
+    client, _ = _stub(latency="fixed:5000")
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.chat.completions.create(model="m", messages=[], timeout=0.05)
+    assert time.monotonic() - started < 1
+
+
+def test_provider_selection(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "stub")
+    manager = LLMClientManager()
+    assert isinstance(manager.provider, StubProvider)
+    assert isinstance(manager.get_client(), StubClient)
+    # Sync and async stub clients share one backend (and its call counter)
+    assert manager.get_async_client().backend is manager.get_client().backend
+    with pytest.raises(ValueError):
+        get_provider("nope")
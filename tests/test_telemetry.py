@@ -0,0 +1,119 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.ai import telemetry
+from app.ai.chatbot import ChatbotAssistant
+from app.ai.diet_suggestion import DietAssistant
+from app.config import settings
+from app.database import Base
+from app.models import LLMCallSample
+from app.utils.metrics import metrics
+
+MEAL = {"items": ["oats"], "calories": 300}
+PLAN = {"breakfast": MEAL, "lunch": MEAL, "dinner": MEAL}
+
+
+def _resp(content, prompt_tokens=120, completion_tokens=80, finish_reason="stop"):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+def _chunk(text, finish_reason=None, usage=None):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=finish_reason)],
+        x_groq=SimpleNamespace(usage=usage) if usage else None,
+    )
+
+
+def _labels(assistant, **extra):
+    return {"task": assistant.task, "model": assistant.model_name, **extra}
+
+
+def test_call_records_latency_tokens_finish_reason_and_parse():
+    client = MagicMock()
+    client.chat.completions.create.return_value = _resp(json.dumps(PLAN), finish_reason="stop")
+    assistant = DietAssistant(client=client, async_client=MagicMock())
+    tokens = _labels(assistant, kind="completion")
+    before = metrics.get_counter("llm_tokens_total", tokens)
+    calls = metrics.get_histogram("llm_call_seconds", _labels(assistant, outcome="ok"))["count"]
+    parsed = metrics.get_counter("llm_parse_total", {"task": "diet", "result": "ok"})
+
+    assistant.get_diet_suggestion({"age": 30})
+
+    assert metrics.get_counter("llm_tokens_total", tokens) == before + 80
+    assert metrics.get_histogram("llm_call_seconds", _labels(assistant, outcome="ok"))["count"] == calls + 1
+    assert metrics.get_counter("llm_finish_reasons_total", _labels(assistant, reason="stop")) >= 1
+    assert metrics.get_counter("llm_parse_total", {"task": "diet", "result": "ok"}) == parsed + 1
+
+
+def test_failed_call_is_recorded_with_error_outcome():
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(side_effect=ValueError("boom"))
+    assistant = DietAssistant(client=MagicMock(), async_client=async_client)
+    labels = _labels(assistant, outcome="ValueError")
+    before = metrics.get_histogram("llm_call_seconds", labels)["count"]
+
+    try:
+        asyncio.run(assistant.get_diet_suggestion_async({"age": 30}))
+    except ValueError:
+        pass
+
+    assert metrics.get_histogram("llm_call_seconds", labels)["count"] == before + 1
+
+
+def test_stream_records_time_to_first_token_and_usage():
+    client = MagicMock()
+    client.chat.completions.create.return_value = iter([
+        _chunk("Eat "), _chunk("oats.", finish_reason="stop",
+                                usage=SimpleNamespace(prompt_tokens=50, completion_tokens=7)),
+    ])
+    assistant = ChatbotAssistant(client=client, async_client=MagicMock())
+    ttft = metrics.get_histogram("llm_ttft_seconds", _labels(assistant))["count"]
+    prompt = metrics.get_counter("llm_tokens_total", _labels(assistant, kind="prompt"))
+
+    chunks = list(assistant._create(model=assistant.model_name, messages=[], stream=True))
+
+    assert len(chunks) == 2
+    assert metrics.get_histogram("llm_ttft_seconds", _labels(assistant))["count"] == ttft + 1
+    assert metrics.get_counter("llm_tokens_total", _labels(assistant, kind="prompt")) == prompt + 50
+
+
+def test_sampled_rows_carry_parse_outcome(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[LLMCallSample.__table__])
+    TestSession = sessionmaker(bind=engine)
+    monkeypatch.setattr("app.database.SessionLocal", TestSession)
+    monkeypatch.setattr(settings, "LLM_TELEMETRY_SAMPLE_RATE", 1.0)
+
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [
+        _resp('{"breakfast": ' + json.dumps(MEAL) + ', "lunch": ' + json.dumps(MEAL) + ', "dinner": {"items": ["x" "y"]}}',
+              finish_reason="length"),
+        _resp('{"dinner": ' + json.dumps(MEAL) + '}', prompt_tokens=40, completion_tokens=20),
+    ]
+    assistant = DietAssistant(client=client, async_client=MagicMock())
+    assistant.get_diet_suggestion({"age": 30})
+    telemetry._writer.submit(lambda: None).result()
+
+    with TestSession() as db:
+        rows = db.query(LLMCallSample).order_by(LLMCallSample.id).all()
+    assert [(r.task, r.finish_reason, r.parse_result) for r in rows] == [
+        ("diet", "length", "repaired"),
+        ("diet", "stop", "repaired"),
+    ]
+    assert rows[1].prompt_tokens == 40 and rows[1].latency_ms >= 0
+
+
+def test_sampling_disabled_writes_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TELEMETRY_SAMPLE_RATE", 0)
+    factory = MagicMock()
+    assert telemetry.sample(telemetry.start("chat", "m"), factory) is False
+    factory.assert_not_called()
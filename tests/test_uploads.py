@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.config import settings
+from app.utils.uploads import ingest_upload, sniff_image_type
+
+JPEG = b"\xff\xd8\xff\xe0" + b"x" * 1000
+
+
+@pytest.mark.parametrize("head,expected", [
+    (JPEG, ("image/jpeg", "jpg")),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", ("image/png", "png")),
+    (b"GIF89a...", ("image/gif", "gif")),
+    (b"RIFF\x10\x00\x00\x00WEBPVP8 ", ("image/webp", "webp")),
+    (b"\x00\x00\x00\x18ftypheic", ("image/heic", "heic")),
+    (b"<?php echo 1;", None),
+])
+def test_sniff_image_type(head, expected):
+    assert sniff_image_type(head) == expected
+
+
+def _ingest(content, tmp_path, size=None, **kwargs):
+    upload = UploadFile(io.BytesIO(content), filename="photo.php", size=size)
+    return asyncio.run(ingest_upload(upload, str(tmp_path), **kwargs))
+
+
+def test_ingest_streams_hashes_and_keeps_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 64)
+
+    upload = _ingest(JPEG, tmp_path)
+
+    assert upload.path.endswith(".jpg")  # sniffed extension, not the client's
+    assert upload.content == JPEG and upload.size == len(JPEG)
+    assert upload.sha256 == hashlib.sha256(JPEG).hexdigest()
+    assert upload.content_type == "image/jpeg"
+    with open(upload.path, "rb") as f:
+        assert f.read() == JPEG
+
+
+def test_oversized_upload_is_rejected_and_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 64)
+
+    with pytest.raises(HTTPException) as exc:
+        _ingest(JPEG, tmp_path, max_bytes=500)
+
+    assert exc.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_declared_size_over_limit_is_rejected_before_reading(tmp_path):
+    with pytest.raises(HTTPException) as exc:
+        _ingest(JPEG, tmp_path, size=len(JPEG), max_bytes=10)
+    assert exc.value.status_code == 413
+
+
+def test_non_image_is_rejected(tmp_path):
+    with pytest.raises(HTTPException) as exc:
+        _ingest(b"<?php echo 1;", tmp_path)
+
+    assert exc.value.status_code == 415
+    assert list(tmp_path.iterdir()) == []
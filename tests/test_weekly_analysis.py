@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import UserExerciseAnalysis, UserExerciseFollowUp, UserProfile
+from app.services import weekly_analysis
+from app.services.weekly_analysis import build_daily_stats, fingerprint, refresh_advice, schedule_refresh
+
+START, END = date(2025, 11, 24), date(2025, 11, 30)
+EMAIL = "week@x.com"
+
+
+class FakeFollowup:
+    def __init__(self, date, total_exercises, completed_exercises):
+        self.date = date
+        self.total_exercises = total_exercises
+        self.completed_exercises = completed_exercises
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'weekly.db'}")
+    Base.metadata.create_all(engine, tables=[
+        UserProfile.__table__, UserExerciseFollowUp.__table__, UserExerciseAnalysis.__table__,
+    ])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(UserProfile(name="W", email=EMAIL))
+        db.add(UserExerciseFollowUp(user_email=EMAIL, date="2025-11-24", total_exercises=5, completed_exercises=4))
+        db.commit()
+    return factory
+
+
+def test_daily_stats_zero_missing_and_future_days():
+    followups = [FakeFollowup("2025-11-25", 4, 3), FakeFollowup("2025-11-29", 5, 5)]
+    stats = build_daily_stats(START, END, followups, today=date(2025, 11, 28))
+
+    assert [d["date"] for d in stats] == [f"2025-11-{d}" for d in range(24, 31)]
+    assert stats[1] == {"day": "Tuesday", "date": "2025-11-25", "total_exercises": 4, "completed_exercises": 3}
+    assert stats[0]["total_exercises"] == 0
+    assert stats[5]["completed_exercises"] == 0  # future follow-up not counted yet
+
+
+def test_fingerprint_ignores_zero_days_and_layout():
+    full = build_daily_stats(START, END, [FakeFollowup("2025-11-25", 4, 3)], today=END)
+    sparse = [{"completed_exercises": 3, "date": "2025-11-25", "total_exercises": 4}]
+    assert fingerprint(full) == fingerprint(sparse)
+    assert fingerprint(full) != fingerprint([{"date": "2025-11-25", "total_exercises": 4, "completed_exercises": 4}])
+
+
+def _store(factory, fp):
+    with factory() as db:
+        db.add(UserExerciseAnalysis(user_email=EMAIL, week_start=START, week_end=END, advice="old",
+                                    daily_stats=[], followup_fingerprint=fp))
+        db.commit()
+
+
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async", new_callable=AsyncMock)
+def test_refresh_queries_off_the_loop_and_holds_no_connection_during_the_llm_call(mock_analyze, session_factory):
+    engine = session_factory.kw["bind"]
+    _store(session_factory, "stale")
+    query_threads = set()
+    event.listen(engine, "before_cursor_execute", lambda *a: query_threads.add(threading.get_ident()))
+    checked_out = []
+
+    async def analyze(*args):
+        checked_out.append(engine.pool.checkedout())
+        return {"advice": "new"}
+
+    mock_analyze.side_effect = analyze
+
+    async def run():
+        assert await refresh_advice(EMAIL, START, END, session_factory) is True
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert checked_out == [0]
+    assert query_threads and loop_thread not in query_threads
+
+
+@patch("app.ai.exercise_analysis.ExerciseAnalysis.analyze_week_async", new_callable=AsyncMock)
+def test_refresh_only_regenerates_when_stats_changed(mock_analyze, session_factory):
+    mock_analyze.return_value = {"advice": "new"}
+    _store(session_factory, "stale")
+
+    assert asyncio.run(refresh_advice(EMAIL, START, END, session_factory)) is True
+    assert asyncio.run(refresh_advice(EMAIL, START, END, session_factory)) is False
+    assert mock_analyze.await_count == 1
+
+    with session_factory() as db:
+        row = db.query(UserExerciseAnalysis).one()
+        assert row.advice == "new"
+        assert row.followup_fingerprint == fingerprint(row.daily_stats)
+
+
+def test_refresh_is_debounced_per_week(monkeypatch):
+    calls = []
+
+    async def fake_refresh(*key, session_factory=None):
+        calls.append(key)
+        return True
+
+    monkeypatch.setattr(weekly_analysis, "refresh_advice", fake_refresh)
+
+    async def main():
+        assert schedule_refresh(EMAIL, START, END, "a", delay=0.05)
+        # Same stats again: the pending timer is kept
+        assert not schedule_refresh(EMAIL, START, END, "a", delay=0.05)
+        await asyncio.sleep(0.03)
+        # Stats changed again: timer restarts
+        assert schedule_refresh(EMAIL, START, END, "b", delay=0.05)
+        await asyncio.sleep(0.04)
+        assert calls == []
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*weekly_analysis._tasks)
+
+    asyncio.run(main())
+    assert calls == [(EMAIL, START, END)]
+    assert weekly_analysis._pending == {}